@@ -0,0 +1,87 @@
+"""Measures search latency of the result archive with thousands of archived analyses.
+
+Usage (from the project root):
+    python -m benchmarks.bench_archive --results 1000,10000
+
+Compares the FTS5 index (best 20 matches, as shown in the UI) with scanning
+the loose analysis_*.json files the "Save Locally" button writes, for a rare
+and a common search term; "matches" is the number of matching results.
+"""
+import os
+import json
+import glob
+import time
+import random
+import logging
+import argparse
+import tempfile
+import statistics
+
+from benchmarks.synthetic_pdf import WORDS
+from src.Utils.result_archive import ResultArchive, DEFAULT_SEARCH_LIMIT
+
+QUERIES = {"rare": "turbine", "common": "energy market"}
+
+
+def make_result(rng, i):
+    keywords = rng.sample(WORDS, 6)
+    if i % 500 == 0:
+        keywords.append("turbine")
+    return {
+        "title": f"Report {i}: {' '.join(rng.sample(WORDS, 3))}",
+        "summary": " ".join(rng.choice(WORDS) for _ in range(120)),
+        "keywords": keywords,
+        "sections": {f"Section {j}": " ".join(rng.choice(WORDS) for _ in range(20)) for j in range(4)}
+    }
+
+
+def scan_files(directory, query):
+    words = query.lower().split()
+    hits = []
+    for path in glob.glob(os.path.join(directory, "analysis_*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+        text = f"{result['title']} {result['summary']} {' '.join(result['keywords'])}".lower()
+        if all(word in text for word in words):
+            hits.append(path)
+    return hits
+
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hits = func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), len(hits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", default="1000,10000", help="Comma-separated archive sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="Searches per case (median is reported)")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench_archive")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    print(f"{'results':>8}  {'query':<8}{'matches':>9}{'archive (ms)':>14}{'json files (ms)':>17}")
+    for count in (int(c) for c in args.results.split(",")):
+        rng = random.Random(count)
+        with tempfile.TemporaryDirectory() as work_dir:
+            archive = ResultArchive(logger, path=os.path.join(work_dir, "archive.sqlite3"))
+            for i in range(count):
+                result = make_result(rng, i)
+                archive.add_result(result, f"doc_{i}.pdf", f"hash{i}", [1, 2, 3], "stub", "summary")
+                with open(os.path.join(work_dir, f"analysis_{i:06d}.json"), "w", encoding="utf-8") as f:
+                    json.dump(result, f)
+            for name, query in QUERIES.items():
+                archive_seconds, hits = timed(lambda: archive.search(query), args.repeat)
+                scan_seconds, matches = timed(lambda: scan_files(work_dir, query), 1)
+                assert hits == min(matches, DEFAULT_SEARCH_LIMIT)
+                print(f"{count:>8}  {name:<8}{matches:>9}{archive_seconds * 1000:>14.2f}{scan_seconds * 1000:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Measures prompt tokens and end-to-end latency with and without text compaction.
+
+Usage (from the project root):
+    python -m benchmarks.bench_compaction --pages 20,100 --prefill-latency 0.02
+
+The stub model charges --prefill-latency seconds per 1000 prompt characters, so
+latency follows prompt size the way prefill time of a real model does.
+"""
+import os
+import time
+import logging
+import argparse
+
+from benchmarks.synthetic_pdf import make_pdf
+from src.Utils.pdf_util import PdfUtils
+from src.Utils.llm_utils import LlmUtils, estimate_tokens
+from src.Utils.stub_model import StubModel
+from src.Utils.text_compactor import TextCompactor
+
+PROMPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "Prompts", "prompt.json")
+CORPORA = {
+    "plain": {"header": None, "footer": None},
+    "report": {},
+    "report+hyphens": {"hyphenate": True},
+    "slides": {"lines_per_page": 10, "words_per_line": 8, "hyphenate": True,
+               "footer": "Confidential - internal use only | ACME Corp | {page} / 999"},
+}
+
+
+def run_end_to_end(pdf_bytes, compact, model, logger, max_chunk_tokens):
+    """Extraction, optional compaction, map-reduce analysis; returns (seconds, prompt tokens, result)."""
+    start = time.perf_counter()
+    page_texts = PdfUtils(logger).extract_page_texts(pdf_bytes)
+    if compact:
+        text = TextCompactor(logger).compact_pages(page_texts)
+    else:
+        text = "".join(page_text + "\n" for page_text in page_texts)
+    llm_utils = LlmUtils(logger=logger, model=model, pdf_text=text, prompt_key="summary", prompt_path=PROMPT_PATH)
+    result = llm_utils.run_map_reduce(max_chunk_tokens=max_chunk_tokens, max_concurrency=1)
+    return time.perf_counter() - start, estimate_tokens(text), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", default="20,100", help="Comma-separated page counts")
+    parser.add_argument("--corpora", default=",".join(CORPORA), help=f"Comma-separated, from {', '.join(CORPORA)}")
+    parser.add_argument("--prefill-latency", type=float, default=0.02, help="Stub seconds per 1000 prompt characters")
+    parser.add_argument("--max-chunk-tokens", type=int, default=6000)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case (best time is reported)")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench_compaction")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    model = StubModel(prefill_latency=args.prefill_latency, think=False)
+
+    print(f"{'corpus':<16}{'pages':>6}{'raw tok':>10}{'compact tok':>13}{'saved':>8}"
+          f"{'raw e2e (s)':>13}{'compact e2e (s)':>17}{'calls':>10}")
+    for pages in (int(p) for p in args.pages.split(",")):
+        for corpus in args.corpora.split(","):
+            pdf_bytes = make_pdf(pages, **CORPORA[corpus])
+            measured = {}
+            for compact in (False, True):
+                calls_before = model.calls
+                timings = []
+                for _ in range(args.repeat):
+                    seconds, tokens, _ = run_end_to_end(pdf_bytes, compact, model, logger, args.max_chunk_tokens)
+                    timings.append(seconds)
+                measured[compact] = (min(timings), tokens, (model.calls - calls_before) // args.repeat)
+            (raw_s, raw_tokens, raw_calls), (compact_s, compact_tokens, compact_calls) = measured[False], measured[True]
+            saved = 1 - compact_tokens / raw_tokens if raw_tokens else 0.0
+            print(f"{corpus:<16}{pages:>6}{raw_tokens:>10}{compact_tokens:>13}{saved:>8.1%}"
+                  f"{raw_s:>13.3f}{compact_s:>17.3f}{f'{raw_calls}->{compact_calls}':>10}")
+
+
+if __name__ == "__main__":
+    main()
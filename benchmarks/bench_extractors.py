@@ -0,0 +1,50 @@
+"""Measures text extraction throughput of every installed engine and the engine "auto" picks.
+
+Usage (from the project root):
+    python -m benchmarks.bench_extractors --pages 50,500 --workers 1,4
+
+Engines that are not installed are skipped (pip install pypdf pdfminer.six pypdfium2).
+"auto" includes its calibration; "chars" shows that the engines find the same text.
+"""
+import os
+import time
+import logging
+import argparse
+import tempfile
+
+from benchmarks.synthetic_pdf import make_pdf
+from src.Utils.pdf_util import PdfUtils
+from src.Utils.extractors import available_engines, get_engine_selector
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", default="50,500", help="Comma-separated page counts")
+    parser.add_argument("--workers", default="1,4", help="Comma-separated worker process counts")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench_extractors")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    print(f"{'pages':>6}{'workers':>9}  {'engine':<18}{'time (s)':>10}{'pages/s':>10}{'chars':>10}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for pages in (int(p) for p in args.pages.split(",")):
+            path = os.path.join(work_dir, f"bench_{pages}.pdf")
+            with open(path, "wb") as f:
+                f.write(make_pdf(pages))
+            for workers in (int(w) for w in args.workers.split(",")):
+                for engine in available_engines() + ["auto"]:
+                    get_engine_selector(logger).clear()
+                    pdf_utils = PdfUtils(logger, engine=engine)
+                    start = time.perf_counter()
+                    # "auto" only calibrates documents it can remember by hash
+                    results = pdf_utils.extract_pages(path, max_workers=workers, doc_hash=f"bench-{pages}")
+                    seconds = time.perf_counter() - start
+                    name = f"auto ({pdf_utils.last_extraction['engine']})" if engine == "auto" else engine
+                    chars = sum(len(text) for _, text, _ in results)
+                    print(f"{pages:>6}{workers:>9}  {name:<18}{seconds:>10.2f}{pages / seconds:>10.0f}{chars:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Compares peak memory of the in-memory upload path with the memory-mapped large-file mode.
+
+Usage (from the project root):
+    python -m benchmarks.bench_large_file --pages 200 --image-kb 1024 --selected 50
+
+Each mode runs in a fresh process that first loads the PDF the way Streamlit
+holds an upload (one copy in memory), then parses it and extracts the selected
+pages. The peaks are the highest RSS and private (non file-backed) memory seen
+during that work, minus the values right after the upload was loaded; pages of
+the memory-mapped file count towards RSS but can be dropped by the OS.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import tempfile
+import subprocess
+from io import BytesIO
+
+MODES = ("in-memory", "mmap")
+
+
+class Upload(BytesIO):
+    """Just enough of Streamlit's UploadedFile (a BytesIO over the uploaded bytes)."""
+
+    file_id = "bench"
+
+
+def run_child(mode, path, selected):
+    from src.Utils.pdf_util import PdfUtils
+    from src.Utils.memory import MemoryMonitor, memory_usage
+    from src.Utils.document_cache import DocumentHandle
+
+    logger = logging.getLogger("bench_large_file")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    with open(path, "rb") as f:
+        upload = Upload(f.read())
+    page_indices = list(range(selected))
+
+    start_rss, start_private = memory_usage()
+    started = time.perf_counter()
+    with MemoryMonitor(interval=0.005) as memory:
+        if mode == "mmap":
+            document = DocumentHandle.from_upload(upload, large_file_bytes=0)
+            reader = None
+        else:
+            document = DocumentHandle.from_upload(upload, large_file_bytes=float("inf"))
+            reader = document.reader
+        text = PdfUtils(logger).extract_text_from_pdf(
+            document.source, page_indices=page_indices, max_workers=1, reader=reader
+        )
+    return {
+        "seconds": time.perf_counter() - started,
+        "peak_rss": (memory.peak_bytes or 0) - (start_rss or 0),
+        "peak_private": (memory.peak_private_bytes or 0) - (start_private or 0),
+        "text_sha": hashlib.sha256(text.encode("utf-8")).hexdigest()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--image-kb", type=int, default=1024, help="Size of the scanned image on every page")
+    parser.add_argument("--selected", type=int, default=50, help="How many leading pages are extracted")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.path, args.selected)))
+        return
+
+    from benchmarks.synthetic_pdf import make_pdf
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "large.pdf")
+        with open(path, "wb") as f:
+            f.write(make_pdf(args.pages, lines_per_page=10, image_bytes=args.image_kb * 1024))
+        size = os.path.getsize(path)
+        results = {}
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_large_file", "--child", mode, "--path", path,
+                 "--selected", str(min(args.selected, args.pages))],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"PDF: {args.pages} pages, {size / 2**20:.0f} MB, {min(args.selected, args.pages)} pages extracted")
+    print(f"{'mode':<12}{'time (s)':>10}{'peak RSS (MB)':>16}{'peak private (MB)':>20}")
+    for mode, result in results.items():
+        print(f"{mode:<12}{result['seconds']:>10.2f}{result['peak_rss'] / 2**20:>16.0f}{result['peak_private'] / 2**20:>20.0f}")
+    print(f"Same text: {len({result['text_sha'] for result in results.values()}) == 1}")
+
+
+if __name__ == "__main__":
+    main()
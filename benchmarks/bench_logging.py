@@ -0,0 +1,118 @@
+"""Measures the logging overhead of a 1,000-page PdfSplitter split.
+
+Usage (from the project root):
+    python -m benchmarks.bench_logging --pages 1000
+    python -m benchmarks.bench_logging --pages 1000 --slow-disk-ms 0.5
+
+Compares the old setup (synchronous FileHandler at DEBUG, every page logged)
+with the queue-based logger from logger_config at DEBUG, INFO and as JSON. The
+variants run interleaved and the median split time is reported; the overhead is
+that time minus the time with logging disabled, and "drain" is how long the
+background writer needed afterwards to empty its queue. --slow-disk-ms adds a
+delay to every write, like a busy disk or a network drive.
+"""
+import os
+import time
+import logging
+import argparse
+import tempfile
+import statistics
+
+from benchmarks.synthetic_pdf import make_pdf
+from src.Utils.pdf_util import PdfUtils
+from src.Utils.logger_config import get_logger, stop_logging
+
+
+def slow_down(handlers, delay):
+    for handler in handlers:
+        emit = handler.emit
+
+        def slow_emit(record, emit=emit):
+            time.sleep(delay)
+            emit(record)
+        handler.emit = slow_emit
+
+
+def sync_logger(name, log_file, delay):
+    """The logger as configured before: synchronous, unbounded file, DEBUG."""
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+    handler = logging.FileHandler(log_file, encoding="utf-8", mode="a")
+    handler.setFormatter(logging.Formatter("{asctime} - {levelname} - {message}", style="{", datefmt="%Y-%m-%d %H:%M"))
+    logger.addHandler(handler)
+    slow_down([handler], delay)
+    return logger, lambda: handler.close()
+
+
+def null_logger(name, log_file, delay):
+    logger = logging.getLogger(name)
+    logger.addHandler(logging.NullHandler())
+    logger.setLevel(logging.CRITICAL)
+    return logger, lambda: None
+
+
+def async_logger(level, json_format=False):
+    def build(name, log_file, delay):
+        logger = get_logger(name, level=level, module_levels={}, json_format=json_format, log_file=log_file)
+        # The file handler sits behind the queue, on the listener thread
+        slow_down(logger.handlers[0].listener.handlers, delay)
+        return logger, lambda: stop_logging(name)
+    return build
+
+
+VARIANTS = {
+    "disabled": null_logger,
+    "sync DEBUG (old)": sync_logger,
+    "async DEBUG": async_logger("DEBUG"),
+    "async INFO": async_logger("INFO"),
+    "async JSON INFO": async_logger("INFO", json_format=True),
+}
+
+
+def split_once(pdf_path, pages, logger):
+    splitter = PdfUtils.PdfSplitter(pdf_path, list(range(0, pages, 2)), logger)
+    start = time.perf_counter()
+    splitter.load_pdf()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=7, help="Rounds over all variants (median is reported)")
+    parser.add_argument("--slow-disk-ms", type=float, default=0.0, help="Delay added to every log write")
+    args = parser.parse_args()
+    delay = args.slow_disk_ms / 1000
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        pdf_path = os.path.join(work_dir, "input.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(make_pdf(args.pages, lines_per_page=5))
+
+        loggers = {}
+        for run, (variant, build) in enumerate(VARIANTS.items()):
+            log_file = os.path.join(work_dir, f"bench-{run}.log")
+            loggers[variant] = (log_file, *build(f"bench_logging_{run}", log_file, delay))
+        timings = {variant: [] for variant in VARIANTS}
+        # Interleaved rounds, so drifting machine load hits every variant alike
+        for _ in range(args.repeat):
+            for variant, (_, logger, _) in loggers.items():
+                timings[variant].append(split_once(pdf_path, args.pages, logger))
+
+        rows = []
+        for variant, (log_file, _, close) in loggers.items():
+            drain_start = time.perf_counter()
+            close()
+            drain = time.perf_counter() - drain_start
+            size = os.path.getsize(log_file) if os.path.exists(log_file) else 0
+            rows.append((variant, statistics.median(timings[variant]), drain, size))
+
+    baseline = rows[0][1]
+    print(f"{args.pages}-page split, median of {args.repeat}, {args.slow_disk_ms} ms per log write")
+    print(f"{'logging':<20}{'split (ms)':>12}{'overhead (ms)':>15}{'drain (ms)':>12}{'log (KB)':>10}")
+    for variant, median, drain, size in rows:
+        print(f"{variant:<20}{median * 1000:>12.1f}{(median - baseline) * 1000:>15.1f}{drain * 1000:>12.1f}{size / 1024:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Measures several analyses of the same pages: separate runs vs. one run with a shared extraction.
+
+Usage (from the project root):
+    python -m benchmarks.bench_multi_analysis --pages 20,100 --prompts summary,keywords,qa
+
+The stub model keeps the last prompt's KV cache like a local server: it charges
+--prefill-latency seconds per 1000 characters only after the part a prompt shares
+with the previous one. "instructions first" is the old template layout (document
+at the end), "document first" the current one.
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import tempfile
+
+from benchmarks.synthetic_pdf import make_pdf
+from src.Utils.pdf_util import PdfUtils
+from src.Utils.llm_utils import LlmUtils, DEFAULT_PROMPT_PATH, CHARS_PER_TOKEN
+from src.Utils.stub_model import StubModel
+from src.Utils.text_compactor import TextCompactor
+
+
+def instructions_first(prompt_path, work_dir):
+    """Writes a copy of the prompt file with the document moved behind the instructions."""
+    with open(prompt_path, "r", encoding="utf-8") as f:
+        prompts = json.load(f)
+    for key, template in prompts.items():
+        prefix, _, instructions = template.partition("{text}")
+        if prefix == "PDF content:\n":
+            prompts[key] = instructions.strip().lstrip("-").strip() + "\n\nPDF content:\n{text}"
+    path = os.path.join(work_dir, "prompt_instructions_first.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(prompts, f)
+    return path
+
+
+def extract(pdf_bytes, logger):
+    return TextCompactor(logger).compact_pages(PdfUtils(logger).extract_page_texts(pdf_bytes))
+
+
+def separate_runs(pdf_bytes, prompt_keys, prompt_path, model, logger, max_chunk_tokens):
+    for prompt_key in prompt_keys:
+        text = extract(pdf_bytes, logger)
+        llm_utils = LlmUtils(logger=logger, model=model, pdf_text=text, prompt_key=prompt_key, prompt_path=prompt_path)
+        llm_utils.run_map_reduce(max_chunk_tokens=max_chunk_tokens, max_concurrency=1)
+    return len(prompt_keys)
+
+
+def shared_run(pdf_bytes, prompt_keys, prompt_path, model, logger, max_chunk_tokens):
+    text = extract(pdf_bytes, logger)
+    llm_utils = LlmUtils(logger=logger, model=model, pdf_text=text, prompt_key=prompt_keys[0], prompt_path=prompt_path)
+    llm_utils.run_analyses(prompt_keys, map_reduce=True, max_chunk_tokens=max_chunk_tokens, max_concurrency=1)
+    return 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", default="20,100", help="Comma-separated page counts")
+    parser.add_argument("--prompts", default="summary,keywords,qa", help="Comma-separated prompt keys")
+    parser.add_argument("--prefill-latency", type=float, default=0.02, help="Stub seconds per 1000 prompt characters")
+    parser.add_argument("--max-chunk-tokens", type=int, default=6000)
+    args = parser.parse_args()
+    prompt_keys = args.prompts.split(",")
+
+    logger = logging.getLogger("bench_multi_analysis")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        old_prompt_path = instructions_first(DEFAULT_PROMPT_PATH, work_dir)
+        variants = {
+            "separate, instructions first": (separate_runs, old_prompt_path),
+            "separate, document first": (separate_runs, DEFAULT_PROMPT_PATH),
+            "one run, document first": (shared_run, DEFAULT_PROMPT_PATH),
+        }
+        print(f"{len(prompt_keys)} analyses ({', '.join(prompt_keys)}), {args.prefill_latency} s prefill per 1000 chars")
+        print(f"{'pages':>6}  {'variant':<30}{'extractions':>12}{'calls':>7}{'prompt tok':>12}{'prefilled tok':>15}{'time (s)':>10}")
+        for pages in (int(p) for p in args.pages.split(",")):
+            pdf_bytes = make_pdf(pages)
+            for variant, (run, prompt_path) in variants.items():
+                # The stub answers each prompt with its own schema, so "calls" would show any repair round trip
+                model = StubModel(prefill_latency=args.prefill_latency, prefix_cache=True)
+                start = time.perf_counter()
+                extractions = run(pdf_bytes, prompt_keys, prompt_path, model, logger, args.max_chunk_tokens)
+                seconds = time.perf_counter() - start
+                prompt_tokens = sum(len(prompt) for prompt in model.prompts) // CHARS_PER_TOKEN
+                print(f"{pages:>6}  {variant:<30}{extractions:>12}{model.calls:>7}{prompt_tokens:>12}"
+                      f"{model.prefilled_chars // CHARS_PER_TOKEN:>15}{seconds:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
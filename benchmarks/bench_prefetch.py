@@ -0,0 +1,69 @@
+"""Measures the extraction left after "Start Analysis" with and without background pre-extraction.
+
+Usage (from the project root):
+    python -m benchmarks.bench_prefetch --pages 300 --selected 100-200 --think 0,2,5 --engine pdfminer
+
+The simulated user uploads the PDF, spends --think seconds choosing pages and
+then starts the analysis; "after click" is the extraction time the analysis still
+waits for. "extracted ahead" counts the pages the prefetcher had stored by then.
+"""
+import os
+import time
+import logging
+import argparse
+import tempfile
+import threading
+
+from benchmarks.synthetic_pdf import make_pdf
+from src.Utils.pdf_util import PdfUtils
+from src.Utils.page_store import PageStore
+from src.Utils.document_cache import DocumentHandle
+from src.Utils.extractors import get_engine_selector
+from src.Utils.prefetch import Prefetcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--selected", default="100-200", help="1-based page range analyzed")
+    parser.add_argument("--think", default="0,2,5", help="Comma-separated seconds between upload and click")
+    parser.add_argument("--engine", default="pdfminer", help="Extraction engine")
+    parser.add_argument("--cpu-share", type=float, default=0.5, help="Share of a core the prefetcher may use")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench_prefetch")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    first, last = (int(page) for page in args.selected.split("-"))
+    selected_pages = list(range(first, last + 1))
+    pdf_bytes = make_pdf(args.pages)
+
+    print(f"{args.pages} pages, pages {first}-{last} analyzed, {args.engine}, prefetch CPU share {args.cpu_share}")
+    print(f"{'think (s)':>10}  {'variant':<12}{'extracted ahead':>17}{'after click (s)':>17}")
+    for think in (float(t) for t in args.think.split(",")):
+        for prefetch in (False, True):
+            with tempfile.TemporaryDirectory() as work_dir:
+                get_engine_selector(logger).clear()
+                page_store = PageStore(logger, path=os.path.join(work_dir, "pages.sqlite3"))
+                document = DocumentHandle(f"bench-{think}-{prefetch}", pdf_bytes)
+                prefetcher = Prefetcher(logger, page_store, cpu_share=args.cpu_share, engine=args.engine)
+                if prefetch:
+                    prefetcher.start(document.file_id, document, selected_pages)
+                time.sleep(think)
+                ahead = prefetcher.status(document.file_id)["pages"] if prefetch else 0
+                start = time.perf_counter()
+                with prefetcher.suspend(document.doc_hash):
+                    PdfUtils(logger, page_store=page_store, engine=args.engine).extract_pages(
+                        document.source, [page - 1 for page in selected_pages], max_workers=1, doc_hash=document.doc_hash
+                    )
+                after_click = time.perf_counter() - start
+                prefetcher.cancel(document.file_id)
+                # A cancelled prefetch finishes its batch; keep it out of the next measurement
+                while any(thread.name.startswith("prefetch-") for thread in threading.enumerate()):
+                    time.sleep(0.05)
+                name = "prefetch" if prefetch else "on click"
+                print(f"{think:>10.1f}  {name:<12}{ahead:>17}{after_click:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Compares a follow-up question answered from BM25-retrieved chunks with a full pass over all pages.
+
+Usage (from the project root):
+    python -m benchmarks.bench_retrieval --pages 20,100,500 --prefill-latency 0.02
+
+Every synthetic page states one fact that no other page mentions; each question
+asks for one of them, so "found" is the share of questions whose page is among
+the top-k chunks. The stub model charges --prefill-latency seconds per 1000
+prompt characters, like the prefill time of a real model.
+"""
+import os
+import time
+import random
+import logging
+import argparse
+import statistics
+
+from benchmarks.synthetic_pdf import WORDS
+from src.Utils.llm_utils import LlmUtils, QUESTION_PROMPT_KEY, estimate_tokens
+from src.Utils.stub_model import StubModel
+from src.Utils.retrieval import BM25Index, page_chunks, DEFAULT_TOP_K
+
+PROMPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "Prompts", "prompt.json")
+SUBJECTS = "pump valve turbine boiler reactor compressor filter sensor cable furnace".split()
+PLACES = "Oslo Lima Perth Dakar Quito Hanoi Riga Tunis Cork Minsk".split()
+
+
+def make_pages(pages, lines_per_page=40, words_per_line=12, seed=7):
+    """Returns {page_number: text} and one (question, page_number) per page."""
+    rng = random.Random(seed)
+    texts = {}
+    questions = []
+    for page_number in range(1, pages + 1):
+        subject = f"{SUBJECTS[page_number % len(SUBJECTS)]}-{page_number}"
+        place = PLACES[(page_number * 3) % len(PLACES)]
+        lines = [" ".join(rng.choice(WORDS) for _ in range(words_per_line)) for _ in range(lines_per_page)]
+        lines.insert(rng.randrange(lines_per_page), f"The {subject} unit was installed in {place} by the field team.")
+        texts[page_number] = "\n".join(lines)
+        questions.append((f"Where was the {subject} unit installed?", page_number))
+    return texts, questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", default="20,100,500", help="Comma-separated page counts")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--questions", type=int, default=20, help="Questions asked per document")
+    parser.add_argument("--prefill-latency", type=float, default=0.02, help="Stub seconds per 1000 prompt characters")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench_retrieval")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    model = StubModel(prefill_latency=args.prefill_latency, think=False, response="Stub answer (page 1).")
+
+    print(f"{'pages':>6}{'index (ms)':>12}{'query (ms)':>12}{'found':>8}"
+          f"{'full tok':>10}{'question tok':>14}{'full (s)':>10}{'question (s)':>14}")
+    for pages in (int(p) for p in args.pages.split(",")):
+        texts, questions = make_pages(pages)
+        questions = questions[::max(1, len(questions) // args.questions)][:args.questions]
+
+        start = time.perf_counter()
+        index = BM25Index(page_chunks(texts))
+        index_seconds = time.perf_counter() - start
+
+        query_seconds, found, question_seconds, question_tokens = [], 0, [], []
+        for question, page_number in questions:
+            start = time.perf_counter()
+            hits = index.search(question, args.top_k)
+            query_seconds.append(time.perf_counter() - start)
+            found += any(hit_page == page_number for hit_page, _, _ in hits)
+
+            llm_utils = LlmUtils(logger=logger, model=model, pdf_text=None, prompt_key=QUESTION_PROMPT_KEY,
+                                 prompt_path=PROMPT_PATH)
+            start = time.perf_counter()
+            llm_utils.run_question(question, [(hit_page, text) for hit_page, text, _ in hits])
+            question_seconds.append(time.perf_counter() - start)
+            question_tokens.append(estimate_tokens(model.prompts[-1]))
+
+        # The same question without retrieval: every page goes into the prompt
+        llm_utils = LlmUtils(logger=logger, model=model, pdf_text=None, prompt_key=QUESTION_PROMPT_KEY,
+                             prompt_path=PROMPT_PATH)
+        start = time.perf_counter()
+        llm_utils.run_question(questions[0][0], list(texts.items()))
+        full_seconds = time.perf_counter() - start
+        full_tokens = estimate_tokens(model.prompts[-1])
+
+        print(f"{pages:>6}{index_seconds * 1000:>12.1f}{statistics.median(query_seconds) * 1000:>12.2f}"
+              f"{found / len(questions):>8.0%}{full_tokens:>10}{statistics.median(question_tokens):>14.0f}"
+              f"{full_seconds:>10.2f}{statistics.median(question_seconds):>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
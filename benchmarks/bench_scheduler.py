@@ -0,0 +1,112 @@
+"""Measures concurrent users of one model server with and without the model scheduler.
+
+Usage (from the project root):
+    python -m benchmarks.bench_scheduler --users 6 --duplicates 2 --limits 1,2
+
+Each simulated user runs a map-reduce summary of its own PDF at the same time;
+--duplicates of them ask for the same document and pages. The stub server shares
+its time between running calls and loses --thrash of its speed for every extra
+call, like a local server swapping KV caches. "no scheduler" is the old behaviour
+(every call goes straight to the server, identical calls are not coalesced).
+"""
+import time
+import logging
+import argparse
+import threading
+import statistics
+
+from benchmarks.synthetic_pdf import make_pdf
+from src.Utils.pdf_util import PdfUtils
+from src.Utils.llm_utils import LlmUtils, DEFAULT_PROMPT_PATH
+from src.Utils.stub_model import StubModel
+from src.Utils.scheduler import ModelScheduler, caller_context
+import src.Utils.llm_utils as llm_utils_module
+
+# Simulation step of the contended server
+STEP_SECONDS = 0.005
+
+
+class ContendedModel(StubModel):
+    """StubModel whose calls share one server: n running calls each progress at 1 / (n * (1 + thrash * (n - 1)))."""
+
+    def __init__(self, latency, thrash):
+        super().__init__(latency=0.0)
+        self.work = latency
+        self.thrash = thrash
+        self.active = 0
+        self.peak_active = 0
+
+    def respond(self, prompt):
+        self._record(prompt)
+        with self._lock:
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+        try:
+            done = 0.0
+            while done < self.work:
+                time.sleep(STEP_SECONDS)
+                active = self.active
+                done += STEP_SECONDS / (active * (1 + self.thrash * (active - 1)))
+        finally:
+            with self._lock:
+                self.active -= 1
+        return self._build_response(prompt)
+
+
+def run_users(texts, model, logger, max_chunk_tokens):
+    latencies = [None] * len(texts)
+
+    def user(i):
+        start = time.perf_counter()
+        with caller_context(f"user{i}"):
+            llm_utils = LlmUtils(logger=logger, model=model, pdf_text=texts[i], prompt_key="summary", prompt_path=DEFAULT_PROMPT_PATH)
+            llm_utils.run_map_reduce(max_chunk_tokens=max_chunk_tokens)
+        latencies[i] = time.perf_counter() - start
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(len(texts))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=6)
+    parser.add_argument("--duplicates", type=int, default=2, help="Users asking for the same document and pages")
+    parser.add_argument("--pages", type=int, default=12, help="Pages per document")
+    parser.add_argument("--limits", default="1,2", help="Comma-separated scheduler concurrency limits")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds of one call on an idle server")
+    parser.add_argument("--thrash", type=float, default=0.25, help="Speed lost per extra concurrent call")
+    parser.add_argument("--max-chunk-tokens", type=int, default=3000)
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench_scheduler")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    texts = []
+    for i in range(args.users):
+        # The first --duplicates users share document 0; the header on every page keeps the others apart
+        pdf_bytes = make_pdf(args.pages, header=f"Report {0 if i < args.duplicates else i}")
+        texts.append("".join(text + "\n" for text in PdfUtils(logger).extract_page_texts(pdf_bytes)))
+
+    variants = [("no scheduler", None)] + [(f"scheduler, limit {limit}", int(limit)) for limit in args.limits.split(",")]
+    print(f"{args.users} users ({args.duplicates} with the same document), {args.latency} s per call on an idle server")
+    print(f"{'variant':<22}{'calls':>7}{'peak running':>14}{'mean (s)':>10}{'worst (s)':>11}{'all done (s)':>14}")
+    for name, limit in variants:
+        scheduler = ModelScheduler(logger, max_concurrent=limit or 1)
+        if limit is None:
+            # Straight to the server, as before the scheduler existed
+            scheduler.call = lambda key, func, token_callback=None, cancel_event=None: func(token_callback)
+        llm_utils_module.get_model_scheduler = lambda logger, scheduler=scheduler: scheduler
+        model = ContendedModel(args.latency, args.thrash)
+        start = time.perf_counter()
+        latencies = run_users(texts, model, logger, args.max_chunk_tokens)
+        total = time.perf_counter() - start
+        print(f"{name:<22}{model.calls:>7}{model.peak_active:>14}{statistics.mean(latencies):>10.2f}"
+              f"{max(latencies):>11.2f}{total:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
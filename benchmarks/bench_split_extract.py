@@ -0,0 +1,79 @@
+"""Compares the old temp-file/PdfSplitter extraction path with the in-memory path.
+
+Usage (from the project root):
+    python -m benchmarks.bench_split_extract --pages 200 --selected 50
+
+"bytes written" counts the bytes written to disk. With several cores the
+in-memory path hands the PDF to the extraction workers through one shared
+memory block ("shared memory", RAM only) instead of pickling it into every task.
+"""
+import os
+import time
+import logging
+import argparse
+import tempfile
+
+from benchmarks.synthetic_pdf import make_pdf
+from src.Utils.pdf_util import PdfUtils
+from src.Utils.instrumentation import start_trace
+
+
+def run_disk_path(pdf_bytes, page_indices, logger):
+    """Temp file -> PdfSplitter (1.pdf / 2.pdf) -> extract from 1.pdf, as before."""
+    bytes_written = 0
+    with tempfile.TemporaryDirectory() as work_dir:
+        pdf_path = os.path.join(work_dir, "upload.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(pdf_bytes)
+        bytes_written += len(pdf_bytes)
+        splitter = PdfUtils.PdfSplitter(pdf_path, page_indices, logger)
+        splitter.run()
+        bytes_written += os.path.getsize(splitter.output1_path) + os.path.getsize(splitter.output2_path)
+        text = PdfUtils(logger).extract_text_from_pdf(splitter.output1_path)
+    return text, bytes_written, 0
+
+
+def run_memory_path(pdf_bytes, page_indices, logger):
+    with start_trace() as trace:
+        text = PdfUtils(logger).extract_text_from_pdf(pdf_bytes, page_indices=page_indices)
+    shared = sum(span.attributes.get("shared_bytes", 0) for span in trace.spans)
+    return text, 0, shared
+
+
+def measure(func, pdf_bytes, page_indices, logger, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text, bytes_written, shared_bytes = func(pdf_bytes, page_indices, logger)
+        timings.append(time.perf_counter() - start)
+    return min(timings), bytes_written, shared_bytes, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200, help="Total pages of the synthetic PDF")
+    parser.add_argument("--selected", type=int, default=50, help="How many leading pages are selected")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per path (best time is reported)")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench_split_extract")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    pdf_bytes = make_pdf(args.pages)
+    page_indices = list(range(min(args.selected, args.pages)))
+
+    disk_time, disk_bytes, disk_shared, disk_text = measure(run_disk_path, pdf_bytes, page_indices, logger, args.repeat)
+    memory_time, memory_bytes, memory_shared, memory_text = measure(
+        run_memory_path, pdf_bytes, page_indices, logger, args.repeat
+    )
+
+    print(f"PDF: {args.pages} pages, {len(pdf_bytes)} bytes, {len(page_indices)} selected, {os.cpu_count()} cores")
+    print(f"{'path':<12}{'wall time (s)':>16}{'bytes written':>16}{'shared memory':>16}")
+    print(f"{'disk':<12}{disk_time:>16.3f}{disk_bytes:>16}{disk_shared:>16}")
+    print(f"{'in-memory':<12}{memory_time:>16.3f}{memory_bytes:>16}{memory_shared:>16}")
+    print(f"Same text: {disk_text == memory_text}")
+
+
+if __name__ == "__main__":
+    main()
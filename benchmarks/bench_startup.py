@@ -0,0 +1,101 @@
+"""Measures cold start, Streamlit rerun time and prompt loading of the app.
+
+Usage (from the project root):
+    python -m benchmarks.bench_startup --imports 5 --reruns 20
+
+"cold import" imports the app modules in fresh interpreters (Streamlit itself is
+already loaded, as in the server) and lists the heavy libraries that came with
+them. The reruns drive main.py with Streamlit's AppTest and read the script
+timer; "prompt load" builds a PromptHandler with and without the resource cache.
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import statistics
+import subprocess
+
+from src.Utils.script_timer import get_script_timer
+
+# Libraries that should only be imported when they are needed
+HEAVY_MODULES = ("lmstudio", "PyPDF2", "pypdf", "pdfminer", "pypdfium2", "numpy")
+APP_MODULES = "src.ui, src.app_logic, src.jobs, src.session"
+MAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+_IMPORT_SCRIPT = f"""
+import sys, time
+import streamlit
+start = time.perf_counter()
+import {APP_MODULES}
+print(time.perf_counter() - start)
+print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))
+"""
+
+
+def cold_imports(runs):
+    seconds, loaded = [], ""
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", _IMPORT_SCRIPT], capture_output=True, text=True, check=True
+        ).stdout.splitlines()
+        seconds.append(float(output[0]))
+        loaded = output[1] if len(output) > 1 else ""
+    return statistics.median(seconds), loaded
+
+
+def prompt_loads(logger, runs):
+    from src.Utils.llm_utils import LlmUtils, DEFAULT_PROMPT_PATH
+    from src.Utils.resources import get_resource_cache
+
+    def measure(cached):
+        start = time.perf_counter()
+        for _ in range(runs):
+            if not cached:
+                get_resource_cache().clear()
+            LlmUtils.PromptHandler(DEFAULT_PROMPT_PATH, "summary", logger)
+        return (time.perf_counter() - start) / runs
+
+    return measure(False), measure(True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--imports", type=int, default=5, help="Fresh interpreters for the cold import")
+    parser.add_argument("--reruns", type=int, default=20, help="Script reruns after the first run")
+    parser.add_argument("--prompt-loads", type=int, default=1000)
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench_startup")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    # The app's logger counts as configured and stays quiet (no console output, no app.log)
+    app_logger = logging.getLogger("PDFLlmLogger")
+    app_logger.addHandler(logging.NullHandler())
+    app_logger.propagate = False
+
+    seconds, loaded = cold_imports(args.imports)
+    print(f"cold import of the app modules: {seconds * 1000:.0f} ms (median of {args.imports})")
+    print(f"heavy libraries imported at start: {loaded or 'none'}")
+
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        print("streamlit.testing is not available, skipping the reruns")
+    else:
+        app = AppTest.from_file(MAIN_PATH, default_timeout=60)
+        app.run()
+        for _ in range(args.reruns):
+            app.run()
+        report = get_script_timer(logger).report()
+        print(f"first script run: {report['cold_start_ms']:.0f} ms ({report['import_ms']:.0f} ms imports)")
+        if report["reruns"]:
+            print(f"reruns: median {report['median_ms']:.1f} ms, p95 {report['p95_ms']:.1f} ms, "
+                  f"max {report['max_ms']:.1f} ms ({report['reruns']} runs)")
+
+    uncached, cached = prompt_loads(logger, args.prompt_loads)
+    print(f"prompt load: {uncached * 1e6:.0f} us from the file, {cached * 1e6:.0f} us cached")
+
+
+if __name__ == "__main__":
+    main()
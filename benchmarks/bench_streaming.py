@@ -0,0 +1,87 @@
+"""Measures extract-then-analyze against the streaming pipeline that overlaps extraction with the model.
+
+Usage (from the project root):
+    python -m benchmarks.bench_streaming --pages 200 --latency 0.5
+
+"sequential" extracts and compacts every page before the first chunk goes to the
+model (map-reduce as before); "overlapped" sends each chunk while the next pages
+are still being parsed. Both start from an empty page store. "first chunk" is
+when the model gets its first prompt, "first result" when the first partial
+summary is back.
+"""
+import time
+import logging
+import argparse
+
+from benchmarks.synthetic_pdf import make_pdf
+from src.Utils.pdf_util import PdfUtils
+from src.Utils.llm_utils import LlmUtils, DEFAULT_PROMPT_PATH
+from src.Utils.stub_model import StubModel
+from src.Utils.text_compactor import TextCompactor
+from src.Utils.extractors import get_engine_selector
+
+
+class TimedModel(StubModel):
+    """StubModel that remembers when its first prompt arrived."""
+
+    def __init__(self, latency):
+        super().__init__(latency=latency, think=False)
+        self.first_call_at = None
+
+    def respond(self, prompt):
+        if self.first_call_at is None:
+            self.first_call_at = time.perf_counter()
+        return super().respond(prompt)
+
+
+def run_sequential(pdf_bytes, pages, engine, model, logger, max_chunk_tokens, notify):
+    page_texts = PdfUtils(logger, engine=engine).extract_page_texts(pdf_bytes, page_indices=list(range(pages)))
+    text = TextCompactor(logger).compact_pages(page_texts)
+    llm_utils = LlmUtils(logger=logger, model=model, pdf_text=text, prompt_key="summary", prompt_path=DEFAULT_PROMPT_PATH)
+    return llm_utils.run_map_reduce(status_callback=notify, max_chunk_tokens=max_chunk_tokens)
+
+
+def run_overlapped(pdf_bytes, pages, engine, model, logger, max_chunk_tokens, notify):
+    def parts():
+        batches = PdfUtils(logger, engine=engine).iter_pages(pdf_bytes, list(range(pages)))
+        for i, text in TextCompactor(logger).compact_stream(batches):
+            yield i + 1, text
+
+    llm_utils = LlmUtils(logger=logger, model=model, pdf_text=None, prompt_key="summary", prompt_path=DEFAULT_PROMPT_PATH)
+    return llm_utils.run_streaming(parts(), ["summary"], status_callback=notify, max_chunk_tokens=max_chunk_tokens)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub seconds per model call")
+    parser.add_argument("--engine", default="pypdf2", help="Extraction engine")
+    parser.add_argument("--max-chunk-tokens", type=int, default=3000)
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench_streaming")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    pdf_bytes = make_pdf(args.pages)
+
+    print(f"{args.pages} pages, {args.engine}, {args.latency} s per model call")
+    print(f"{'variant':<12}{'first chunk (s)':>17}{'first result (s)':>18}{'total (s)':>11}{'calls':>7}")
+    for name, run in (("sequential", run_sequential), ("overlapped", run_overlapped)):
+        get_engine_selector(logger).clear()
+        model = TimedModel(args.latency)
+        first_result = []
+
+        def notify(role, content):
+            # The first partial result of either variant
+            if not first_result and content.startswith(("🧩 Chunk", "🧩 Pages")):
+                first_result.append(time.perf_counter())
+
+        start = time.perf_counter()
+        run(pdf_bytes, args.pages, args.engine, model, logger, args.max_chunk_tokens, notify)
+        total = time.perf_counter() - start
+        first = first_result[0] - start if first_result else total
+        print(f"{name:<12}{model.first_call_at - start:>17.2f}{first:>18.2f}{total:>11.2f}{model.calls:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Measures summaries of random page ranges from a precomputed summary tree vs. summarizing each range.
+
+Usage (from the project root):
+    python -m benchmarks.bench_summary_tree --pages 256 --ranges 20
+
+The stub model charges --prefill-latency seconds per 1000 prompt characters.
+The tree is built once (reported separately); afterwards every range is combined
+from stored nodes plus fresh summaries of its edge pages.
+"""
+import os
+import time
+import random
+import logging
+import argparse
+import tempfile
+import statistics
+
+from benchmarks.synthetic_pdf import make_pdf
+from src.Utils.pdf_util import PdfUtils
+from src.Utils.llm_utils import LlmUtils, DEFAULT_PROMPT_PATH, CHARS_PER_TOKEN
+from src.Utils.stub_model import StubModel
+from src.Utils.text_compactor import TextCompactor
+from src.Utils.summary_tree import SummaryTree, SummaryNodeStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=256)
+    parser.add_argument("--ranges", type=int, default=20, help="Random page ranges summarized")
+    parser.add_argument("--min-range", type=int, default=20, help="Shortest range in pages")
+    parser.add_argument("--prefill-latency", type=float, default=0.02, help="Stub seconds per 1000 prompt characters")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench_summary_tree")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    model = StubModel(prefill_latency=args.prefill_latency, think=False)
+    pdf_bytes = make_pdf(args.pages)
+    page_texts = [text for _, text, _ in PdfUtils(logger).extract_pages(pdf_bytes)]
+
+    def load_text(page_indices):
+        return TextCompactor(logger).compact_pages([page_texts[i] for i in page_indices])
+
+    def summarize(text):
+        llm_utils = LlmUtils(logger=logger, model=model, pdf_text=text, prompt_key="summary", prompt_path=DEFAULT_PROMPT_PATH)
+        return llm_utils.run_map_reduce(max_concurrency=1)
+
+    def merge(results):
+        llm_utils = LlmUtils(logger=logger, model=model, pdf_text=None, prompt_key="summary", prompt_path=DEFAULT_PROMPT_PATH)
+        return llm_utils.merge(results, max_concurrency=1)
+
+    def measure(func):
+        calls, prefilled = model.calls, sum(len(p) for p in model.prompts)
+        start = time.perf_counter()
+        func()
+        return (time.perf_counter() - start, model.calls - calls,
+                (sum(len(p) for p in model.prompts) - prefilled) // CHARS_PER_TOKEN)
+
+    rng = random.Random(args.pages)
+    ranges = []
+    for _ in range(args.ranges):
+        start = rng.randrange(0, args.pages - args.min_range)
+        ranges.append((start, rng.randrange(start + args.min_range, args.pages + 1)))
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = SummaryNodeStore(logger, path=os.path.join(work_dir, "tree.sqlite3"))
+        tree = SummaryTree(logger, store, "bench", args.pages, "stub", "v1", load_text, summarize, merge, max_concurrency=1)
+        build = measure(tree.build)
+        direct = [measure(lambda: summarize(load_text(list(range(start, end))))) for start, end in ranges]
+        from_tree = [measure(lambda: tree.summarize_range(start, end)) for start, end in ranges]
+
+    print(f"{args.pages} pages, {len(tree.nodes())} tree nodes, {args.ranges} random ranges of {args.min_range}+ pages")
+    print(f"Tree build (once): {build[0]:.2f} s, {build[1]} calls, {build[2]} prompt tokens")
+    print(f"{'per range (median)':<22}{'time (s)':>10}{'calls':>8}{'prompt tok':>12}")
+    for name, runs in (("summarize range", direct), ("from summary tree", from_tree)):
+        print(f"{name:<22}{statistics.median(r[0] for r in runs):>10.2f}{statistics.median(r[1] for r in runs):>8.0f}"
+              f"{statistics.median(r[2] for r in runs):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
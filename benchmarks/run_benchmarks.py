@@ -0,0 +1,197 @@
+"""Per-stage microbenchmarks of the PDF pipeline with synthetic PDFs and a stub LLM.
+
+Usage (from the project root):
+    python -m benchmarks.run_benchmarks --save benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --compare benchmarks/baseline.json --threshold 0.2
+
+Every stage is timed separately (best and median of --repeat runs) and measured
+once more under tracemalloc for its peak Python memory. Memory used inside the
+extraction worker processes is not included. With --compare, stages that got
+slower or bigger than the baseline by more than --threshold are reported and
+the exit code is 1.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import statistics
+import tempfile
+import tracemalloc
+
+from benchmarks.synthetic_pdf import make_pdf
+from src.Utils.pdf_util import PdfUtils
+from src.Utils.llm_utils import LlmUtils
+from src.Utils.stub_model import StubModel
+
+PROMPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "Prompts", "prompt.json")
+DENSITIES = {
+    "sparse": {"lines_per_page": 10, "words_per_line": 8},
+    "normal": {"lines_per_page": 40, "words_per_line": 12},
+    "dense": {"lines_per_page": 70, "words_per_line": 18},
+}
+# Differences below these are treated as noise, whatever the relative change
+MIN_TIME_DELTA = 0.005
+MIN_MEMORY_DELTA = 256 * 1024
+
+
+def make_logger():
+    logger = logging.getLogger("benchmarks")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    return logger
+
+
+def build_stages(pdf_bytes, pages, work_dir, logger, stub_latency):
+    """Returns (name, callable) pairs; each stage consumes the previous stage's output."""
+    state = {}
+    pdf_path = os.path.join(work_dir, "input.pdf")
+    page_indices = list(range(pages))
+
+    def temp_write():
+        with open(pdf_path, "wb") as f:
+            f.write(pdf_bytes)
+
+    def split():
+        splitter = PdfUtils.PdfSplitter(pdf_path, page_indices, logger)
+        splitter.run()
+        state["selected_path"] = splitter.output1_path
+
+    def extract():
+        state["text"] = PdfUtils(logger).extract_text_from_pdf(state["selected_path"])
+
+    prompt_handler = LlmUtils.PromptHandler(PROMPT_PATH, "summary", logger)
+
+    def prepare():
+        state["prompt"] = prompt_handler.prepare(state["text"])
+
+    model_runner = LlmUtils.ModelRunner(StubModel(latency=stub_latency), logger)
+
+    def model_run():
+        state["raw"] = model_runner.run(state["prompt"])
+
+    output_processor = LlmUtils.OutputProcessor(logger)
+
+    def extract_json():
+        state["json"] = output_processor.extract_json(output_processor.clean_text(state["raw"]))
+
+    return [
+        ("temp_write", temp_write),
+        ("split", split),
+        ("extract_text", extract),
+        ("prepare_prompt", prepare),
+        ("model_run_stub", model_run),
+        ("extract_json", extract_json),
+    ]
+
+
+def run_case(pages, density, repeat, stub_latency, logger):
+    pdf_bytes = make_pdf(pages, **DENSITIES[density])
+    results = {}
+    previous_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Some stages write files next to the working directory
+        os.chdir(work_dir)
+        try:
+            stages = build_stages(pdf_bytes, pages, work_dir, logger, stub_latency)
+            for name, stage in stages:
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    stage()
+                    timings.append(time.perf_counter() - start)
+                tracemalloc.start()
+                stage()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                results[name] = {
+                    "best_s": min(timings),
+                    "median_s": statistics.median(timings),
+                    "peak_bytes": peak
+                }
+        finally:
+            os.chdir(previous_cwd)
+    return {"pages": pages, "density": density, "pdf_bytes": len(pdf_bytes), "stages": results}
+
+
+def compare(current, baseline, threshold):
+    """Returns human-readable regression lines for stages slower/bigger than the baseline."""
+    regressions = []
+    baseline_cases = {(case["pages"], case["density"]): case for case in baseline["cases"]}
+    for case in current["cases"]:
+        base_case = baseline_cases.get((case["pages"], case["density"]))
+        if base_case is None:
+            continue
+        for stage, metrics in case["stages"].items():
+            base = base_case["stages"].get(stage)
+            if base is None:
+                continue
+            checks = (("median_s", MIN_TIME_DELTA), ("peak_bytes", MIN_MEMORY_DELTA))
+            for metric, min_delta in checks:
+                old, new = base[metric], metrics[metric]
+                if new - old > min_delta and new > old * (1 + threshold):
+                    regressions.append(
+                        f"{case['pages']}p/{case['density']} {stage} {metric}: "
+                        f"{old:.4g} -> {new:.4g} (+{(new / old - 1) * 100 if old else float('inf'):.0f}%)"
+                    )
+    return regressions
+
+
+def print_table(report):
+    print(f"{'case':<16}{'stage':<18}{'best (ms)':>12}{'median (ms)':>14}{'peak (KB)':>12}")
+    for case in report["cases"]:
+        label = f"{case['pages']}p/{case['density']}"
+        for stage, metrics in case["stages"].items():
+            print(
+                f"{label:<16}{stage:<18}{metrics['best_s'] * 1000:>12.2f}"
+                f"{metrics['median_s'] * 1000:>14.2f}{metrics['peak_bytes'] / 1024:>12.0f}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", default="10,100,500", help="Comma-separated page counts")
+    parser.add_argument("--densities", default="sparse,dense", help=f"Comma-separated, from {', '.join(DENSITIES)}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="Fixed latency of the stub model (s)")
+    parser.add_argument("--save", help="Write the results as a JSON baseline to this path")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative slowdown (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    logger = make_logger()
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "stub_latency": args.stub_latency,
+        "cases": []
+    }
+    for pages in (int(p) for p in args.pages.split(",")):
+        for density in args.densities.split(","):
+            print(f"Running {pages} pages / {density}...", file=sys.stderr)
+            report["cases"].append(run_case(pages, density, args.repeat, args.stub_latency, logger))
+
+    print_table(report)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold * 100:.0f}%:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
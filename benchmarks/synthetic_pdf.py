@@ -0,0 +1,89 @@
+"""Generates synthetic text PDFs for benchmarks, without extra dependencies."""
+
+WORDS = (
+    "analysis report system data model result process method value table figure "
+    "section performance memory document summary chapter source design network "
+    "energy market policy research sample measure output control quality"
+).split()
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_lines(page_number, lines_per_page, words_per_line, header, footer, hyphenate):
+    lines = []
+    if header:
+        lines.append(header)
+    carry = ""
+    for line in range(lines_per_page):
+        start = (page_number * 7 + line * 3) % len(WORDS)
+        words = [WORDS[(start + i * 5) % len(WORDS)] for i in range(words_per_line)]
+        text = carry + f"{page_number}.{line} " + " ".join(words)
+        carry = ""
+        # Break the last word of every other line across the line break, like justified text
+        if hyphenate and line % 2 == 0 and line + 1 < lines_per_page and len(words[-1]) > 5:
+            cut = len(words[-1]) // 2
+            text = text[:-cut] + "-"
+            carry = words[-1][-cut:] + " "
+        lines.append(text)
+    if footer:
+        lines.append(footer.format(page=page_number))
+    return lines
+
+
+def make_pdf(pages, lines_per_page=40, words_per_line=12, header="ACME Corp - Annual Report",
+             footer="Page {page}", hyphenate=False, image_bytes=0):
+    """Returns the bytes of a PDF with `pages` pages of Helvetica text.
+
+    `lines_per_page` and `words_per_line` control the text density; `header` and
+    `footer` (with a `{page}` placeholder) repeat on every page like in real reports,
+    and `hyphenate` splits words across line breaks. `image_bytes` adds an
+    uncompressed grayscale image of about that size to every page, like a scan.
+    """
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = add(b"")  # filled in once the page ids are known
+    kids = []
+    for page_number in range(1, pages + 1):
+        lines = _page_lines(page_number, lines_per_page, words_per_line, header, footer, hyphenate)
+        ops = " ".join(f"({_escape(line)}) '" for line in lines)
+        content = f"BT /F1 9 Tf 40 800 Td 11 TL {ops} ET".encode("latin-1")
+        xobjects = b""
+        if image_bytes:
+            side = max(1, int(image_bytes ** 0.5))
+            image_id = add(
+                b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+                b"/BitsPerComponent 8 /Length %d >>\nstream\n" % (side, side, side * side)
+                + bytes([page_number % 256]) * (side * side) + b"\nendstream"
+            )
+            content = b"q 612 0 0 842 0 0 cm /Im1 Do Q " + content
+            xobjects = b" /XObject << /Im1 %d 0 R >>" % image_id
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >>%s >> >>" % (pages_id, content_id, font_id, xobjects)
+        ))
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids)
+    )
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog_id, xref_offset
+    )
+    return bytes(out)
@@ -1,6 +1,10 @@
+import time
+# Start of this script run; the first run in a process includes importing the app modules
+script_started_at = time.perf_counter()
+
 import streamlit as st
 from src.Utils.logger_config import get_logger
-from src.session import init_session_state, add_message
+from src.session import init_session_state, get_client_id, sync_job_updates
 from src.ui import (
     render_css,
     render_header,
@@ -8,7 +12,11 @@ from src.ui import (
     render_chat_and_results,
     render_how_to_use,
 )
-from src.app_logic import process_pdf_pipeline
+from src.app_logic import process_pdf_pipeline, answer_question_pipeline, build_summary_index_pipeline
+from src.jobs import get_job_manager
+from src.Utils.script_timer import get_script_timer
+
+imports_done_at = time.perf_counter()
 
 # Page configuration (looks better in wide mode)
 st.set_page_config(
@@ -24,6 +32,12 @@ logger = get_logger(console=True)
 render_css()
 init_session_state()
 
+# Analyses run in background jobs; pick up their messages and results
+# (also after a page reload, since the client id is kept in the URL)
+client_id = get_client_id()
+job_manager = get_job_manager(logger)
+sync_job_updates(job_manager, client_id)
+
 # Create main header
 render_header()
 
@@ -33,53 +47,66 @@ col1, col2 = st.columns([1, 2])
 # Left Panel: Control Panel
 with col1:
     # Render control panel and get user inputs
-    uploaded_file, selected_pages, model_name, prompt_key, start_button = render_control_panel()
+    (uploaded_file, selected_pages, model_name, prompt_key, analysis_options,
+     start_button, index_button) = render_control_panel()
 
 # Right Panel: Chat and Results Display
 with col2:
-    # Render chat and results display area
-    render_chat_and_results()
+    # Render chat and results display area; follow-up questions need a readable PDF and a page range
+    question = render_chat_and_results(job_manager, client_id, can_ask=bool(uploaded_file and selected_pages))
 
 # "How to Use?" section
 render_how_to_use()
 
-# Run pipeline when analysis button is clicked
-if start_button:
-    # Callback function for real-time chat updates
-    def status_callback(role, content):
-        add_message(role, content)
-        # st.rerun() removed from this function.
-        # UI refresh will be done in the finally block
-        # after the entire process is completed.
+# Cold start and rerun times, shown in the control panel on the next run and exported with the metrics
+get_script_timer(logger).finish_run(script_started_at, imports_done_at)
 
-    # Disable button when processing starts
-    st.session_state.processing = True
-    
-    # Send initial message to user
-    status_callback("user", f"PDF analysis started: {uploaded_file.name} (Pages: {selected_pages})")
+# Queue the pipeline in the background when analysis button is clicked
+if start_button:
+    stream = analysis_options.pop("stream", False)
+    job_manager.submit(
+        client_id,
+        f"PDF analysis started: {uploaded_file.name} (Pages: {selected_pages})",
+        process_pdf_pipeline,
+        stream=stream,
+        pdf_file=uploaded_file,
+        selected_pages=selected_pages,
+        model_name=model_name,
+        prompt_key=prompt_key,
+        logger=logger,
+        document_cache=st.session_state.document_cache,
+        **analysis_options
+    )
+    # Show the new job right away
+    st.rerun()
 
-    with st.spinner("🤖 Processing PDF, please wait..."):
-        try:
-            # Run main processing pipeline
-            result = process_pdf_pipeline(
-                pdf_file=uploaded_file,
-                selected_pages=selected_pages,
-                model_name=model_name,
-                prompt_key=prompt_key,
-                logger=logger,
-                status_callback=status_callback
-            )
-            
-            # Save result to session state
-            st.session_state.current_result = result
-            status_callback("bot", "✅ Analysis completed! Results are displayed below.")
+# Precompute the summary tree of the whole PDF in the background
+if index_button:
+    job_manager.submit(
+        client_id,
+        f"Summary index build started: {uploaded_file.name}",
+        build_summary_index_pipeline,
+        pdf_file=uploaded_file,
+        model_name=model_name,
+        logger=logger,
+        compact=analysis_options["compact"],
+        document_cache=st.session_state.document_cache
+    )
+    st.rerun()
 
-        except Exception as e:
-            logger.error(f"Pipeline error: {e}")
-            status_callback("bot", f"❌ Error occurred: {e}")
-        
-        finally:
-            # Re-enable button after processing
-            st.session_state.processing = False
-            # Refresh UI one last time
-            st.rerun()
\ No newline at end of file
+# Answer a follow-up question from the most relevant chunks of the selected pages
+if question:
+    job_manager.submit(
+        client_id,
+        f"❓ {question}",
+        answer_question_pipeline,
+        stream=analysis_options.get("stream", False),
+        done_message=None,
+        pdf_file=uploaded_file,
+        selected_pages=selected_pages,
+        question=question,
+        model_name=model_name,
+        logger=logger,
+        document_cache=st.session_state.document_cache
+    )
+    st.rerun()
@@ -0,0 +1,138 @@
+import os
+import mmap
+import hashlib
+import tempfile
+import threading
+import weakref
+from io import BytesIO
+from collections import OrderedDict
+from .result_cache import hash_bytes
+from .memory import LARGE_FILE_BYTES
+
+DEFAULT_MAX_DOCUMENTS = 2
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Read size when spooling or hashing a large upload
+COPY_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+def _release_mapping(mapping, path):
+    try:
+        mapping.close()
+    except BufferError:
+        # Still exported somewhere; the mapping goes away with its last user
+        pass
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class DocumentHandle:
+    """A parsed PDF upload: bytes, reader, page count and (lazily) content hash.
+
+    Large uploads (see `from_upload`) are spooled to a temporary file once and
+    memory-mapped; `data` is then the read-only mapping and `path` the file, which
+    extraction workers open themselves instead of receiving a copy of the bytes.
+    """
+
+    def __init__(self, file_id, data=None, path=None):
+        # PyPDF2 is imported with the first upload, not when the app starts
+        from PyPDF2 import PdfReader
+        self.file_id = file_id
+        self.path = path
+        if path is not None:
+            with open(path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # Unmap and delete the spool file once the handle is no longer used anywhere
+            weakref.finalize(self, _release_mapping, data, path)
+        self.data = data
+        self.reader = PdfReader(data if path is not None else BytesIO(data))
+        self.page_count = len(self.reader.pages) if self.reader.pages else 0
+        if path is not None and hasattr(data, "madvise"):
+            # Counting pages touched the whole mapping; let the OS drop those pages again
+            data.madvise(mmap.MADV_DONTNEED)
+        self._doc_hash = None
+
+    @classmethod
+    def from_upload(cls, uploaded_file, large_file_bytes=LARGE_FILE_BYTES):
+        # getvalue() shares the upload's bytes (getbuffer() would copy them)
+        data = uploaded_file.getvalue()
+        if len(data) <= large_file_bytes:
+            return cls(uploaded_file.file_id, data)
+        fd, path = tempfile.mkstemp(prefix="pdf-upload-", suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            view = memoryview(data)
+            for start in range(0, len(view), COPY_CHUNK_BYTES):
+                f.write(view[start:start + COPY_CHUNK_BYTES])
+        return cls(uploaded_file.file_id, path=path)
+
+    @property
+    def source(self):
+        """What to pass to `PdfUtils` extraction: the spool file path or the bytes."""
+        return self.path if self.path is not None else self.data
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    @property
+    def doc_hash(self):
+        # Hashing a large upload is not free, so only do it when someone asks
+        if self._doc_hash is None:
+            if self.path is None:
+                self._doc_hash = hash_bytes(self.data)
+            else:
+                digest = hashlib.sha256()
+                with open(self.path, "rb") as f:
+                    for chunk in iter(lambda: f.read(COPY_CHUNK_BYTES), b""):
+                        digest.update(chunk)
+                self._doc_hash = digest.hexdigest()
+        return self._doc_hash
+
+
+class DocumentCache:
+    """Session-scoped cache of parsed uploads keyed by `UploadedFile.file_id`.
+
+    Keeps at most `max_documents` handles and `max_bytes` of PDF data, evicting
+    the least recently used upload first.
+    """
+
+    def __init__(self, logger, max_documents=DEFAULT_MAX_DOCUMENTS, max_bytes=DEFAULT_MAX_BYTES):
+        self.logger = logger
+        self.max_documents = max_documents
+        self.max_bytes = max_bytes
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, uploaded_file):
+        """Returns the handle for an upload, parsing it only the first time it is seen."""
+        file_id = uploaded_file.file_id
+        with self._lock:
+            handle = self._handles.get(file_id)
+            if handle is not None:
+                self._handles.move_to_end(file_id)
+                return handle
+
+        handle = DocumentHandle.from_upload(uploaded_file)
+        mode = "memory-mapped" if handle.path else "in memory"
+        self.logger.info(f"[DocumentCache] parsed {uploaded_file.name}: {handle.page_count} pages, {handle.size} bytes ({mode}).")
+        with self._lock:
+            self._handles[file_id] = handle
+            self._evict()
+        return handle
+
+    def retain(self, file_id):
+        """Drops every handle except the current upload (or all of them for None); returns the dropped file ids."""
+        with self._lock:
+            stale_ids = [key for key in self._handles if key != file_id]
+            for stale_id in stale_ids:
+                del self._handles[stale_id]
+                self.logger.info(f"[DocumentCache] evicted stale upload {stale_id}.")
+        return stale_ids
+
+    def _evict(self):
+        total = sum(handle.size for handle in self._handles.values())
+        while len(self._handles) > 1 and (len(self._handles) > self.max_documents or total > self.max_bytes):
+            file_id, handle = self._handles.popitem(last=False)
+            total -= handle.size
+            self.logger.info(f"[DocumentCache] evicted {file_id} ({handle.size} bytes).")
@@ -0,0 +1,415 @@
+import os
+import re
+import mmap
+import time
+import threading
+import functools
+import unicodedata
+import importlib.util
+from io import BytesIO
+from collections import OrderedDict
+
+# The PDF libraries are imported by the extractors on first use (the optional ones
+# may not be installed), so starting the app does not load all of them
+
+# "auto" calibrates every document; an engine name always uses that engine
+DEFAULT_ENGINE = os.environ.get("PDF_SUMMARY_PDF_ENGINE", "auto")
+# Used when calibration is skipped or no engine passes the quality check
+FALLBACK_ENGINE = "pypdf2"
+# Pages sampled (evenly spread over the selection) to time and check each engine
+CALIBRATION_PAGES = 4
+# Below this many pages a slower engine costs less than calibrating
+CALIBRATION_MIN_PAGES = 16
+# An engine must find this share of the characters the best engine finds...
+MIN_CHARS_RATIO = 0.9
+# ...and this share of them must be readable (letters, digits, punctuation, spaces)
+MIN_READABLE_RATIO = 0.95
+# An engine that already holds stored pages of a document is kept unless the fastest one beats it by more
+STORED_ENGINE_MIN_SPEED = 0.5
+# Calibrations kept in memory, least recently used are dropped first
+DEFAULT_MAX_CALIBRATIONS = 64
+
+# pdfminer writes glyphs without a Unicode mapping as "(cid:123)"
+_UNMAPPED_GLYPH = re.compile(r"\(cid:\d+\)")
+
+
+@functools.lru_cache(maxsize=None)
+def _installed(module_name):
+    # Finds the package without importing it
+    return importlib.util.find_spec(module_name) is not None
+
+
+class SharedPdf:
+    """PDF bytes in a shared memory block; sent to the worker processes in place of the bytes."""
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+
+# Bytes of the last shared PDF a worker process read, so only its first task copies them
+_shared_bytes = {}
+
+
+def shared_bytes(shared):
+    """The bytes of a `SharedPdf`, copied out of the block once per worker process and document."""
+    data = _shared_bytes.get(shared.name)
+    if data is None:
+        from multiprocessing import shared_memory
+        block = shared_memory.SharedMemory(name=shared.name)
+        try:
+            data = bytes(block.buf[:shared.size])
+        finally:
+            block.close()
+        _shared_bytes.clear()
+        _shared_bytes[shared.name] = data
+    return data
+
+
+def file_source(source):
+    # A path is memory-mapped so only the pages that are read are loaded; bytes are wrapped
+    if isinstance(source, (str, os.PathLike)):
+        if os.path.getsize(source) == 0:
+            return BytesIO(b"")
+        with open(source, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return BytesIO(source) if isinstance(source, bytes) else source
+
+
+class PyPdf2Extractor:
+    """PyPDF2's pure-Python `extract_text()`; always installed."""
+
+    name = "pypdf2"
+    # Whether one process may extract with several threads at once
+    thread_safe = True
+
+    @staticmethod
+    def available():
+        return True
+
+    @staticmethod
+    def version():
+        import PyPDF2
+        return f"PyPDF2 {PyPDF2.__version__}"
+
+    def open(self, source):
+        import PyPDF2
+        if isinstance(source, PyPDF2.PdfReader):
+            return source
+        return PyPDF2.PdfReader(file_source(source))
+
+    def close(self, document):
+        pass
+
+    def page_text(self, document, page_index):
+        return document.pages[page_index].extract_text() or ""
+
+    def extract_range(self, source, page_indices):
+        """Returns a list of (page_index, text, error) tuples in the given order."""
+        return self.timed_range(source, page_indices)[0]
+
+    def timed_range(self, source, page_indices):
+        """`extract_range` plus the seconds spent on the pages, without opening the document."""
+        document = self.open(source)
+        try:
+            results = []
+            start = time.perf_counter()
+            for i in page_indices:
+                try:
+                    results.append((i, self.page_text(document, i), None))
+                except Exception as e:
+                    results.append((i, "", str(e)))
+            return results, time.perf_counter() - start
+        finally:
+            self.close(document)
+
+
+class PypdfExtractor(PyPdf2Extractor):
+    """pypdf, the maintained successor of PyPDF2 (faster and more accurate text layout)."""
+
+    name = "pypdf"
+
+    @staticmethod
+    def available():
+        return _installed("pypdf")
+
+    @staticmethod
+    def version():
+        import pypdf
+        return f"pypdf {pypdf.__version__}"
+
+    def open(self, source):
+        import pypdf
+        return pypdf.PdfReader(file_source(source))
+
+
+class PdfminerExtractor(PyPdf2Extractor):
+    """pdfminer.six layout analysis; slow, but reads fonts and encodings the others miss."""
+
+    name = "pdfminer"
+
+    @staticmethod
+    def available():
+        return _installed("pdfminer")
+
+    @staticmethod
+    def version():
+        import pdfminer
+        return f"pdfminer.six {pdfminer.__version__}"
+
+    def extract_range(self, source, page_indices):
+        from pdfminer.high_level import extract_pages as pdfminer_extract_pages
+        from pdfminer.layout import LTTextContainer
+        # pdfminer parses the page tree once per call, so the whole range goes through one pass
+        wanted = sorted(set(page_indices))
+        texts = {}
+        errors = {}
+        try:
+            # pdfminer opens paths itself and does not accept a memory mapping
+            opened = source if isinstance(source, (str, os.PathLike)) else file_source(source)
+            layouts = pdfminer_extract_pages(opened, page_numbers=wanted)
+            for i, layout in zip(wanted, layouts):
+                texts[i] = "".join(element.get_text() for element in layout if isinstance(element, LTTextContainer))
+        except Exception as e:
+            errors = {i: str(e) for i in wanted if i not in texts}
+        return [(i, texts.get(i, ""), errors.get(i)) for i in page_indices]
+
+    def timed_range(self, source, page_indices):
+        # Parsing and layout analysis are interleaved here, so the whole pass is timed
+        start = time.perf_counter()
+        results = self.extract_range(source, page_indices)
+        return results, time.perf_counter() - start
+
+
+class PypdfiumExtractor(PyPdf2Extractor):
+    """PDFium (Chrome's PDF engine) through pypdfium2; native code, usually the fastest."""
+
+    name = "pypdfium2"
+    # PDFium must not be called from two threads at once
+    thread_safe = False
+
+    @staticmethod
+    def available():
+        return _installed("pypdfium2")
+
+    @staticmethod
+    def version():
+        import pypdfium2
+        return f"pypdfium2 {pypdfium2.PYPDFIUM_INFO}"
+
+    def open(self, source):
+        import pypdfium2
+        if isinstance(source, (str, os.PathLike)):
+            return pypdfium2.PdfDocument(source)
+        return pypdfium2.PdfDocument(bytes(source) if isinstance(source, mmap.mmap) else source)
+
+    def close(self, document):
+        document.close()
+
+    def page_text(self, document, page_index):
+        page = document[page_index]
+        try:
+            text_page = page.get_textpage()
+            try:
+                return text_page.get_text_range().replace("\r\n", "\n")
+            finally:
+                text_page.close()
+        finally:
+            page.close()
+
+
+# In order of preference when engines are equally fast
+EXTRACTORS = OrderedDict(
+    (extractor.name, extractor)
+    for extractor in (PyPdf2Extractor(), PypdfExtractor(), PdfminerExtractor(), PypdfiumExtractor())
+)
+_engine_locks = {name: threading.Lock() for name in EXTRACTORS}
+
+
+def available_engines():
+    return [name for name, extractor in EXTRACTORS.items() if extractor.available()]
+
+
+def engine_version(engine):
+    """Identifies the engine and its version, e.g. for the page store."""
+    return EXTRACTORS[engine].version()
+
+
+def extract_page_range(engine, source, page_indices):
+    """Extracts the given pages with one engine; runs inside a worker process or in-process.
+
+    Returns a list of (page_index, text, error) tuples in the given order.
+    """
+    return _timed_page_range(engine, source, page_indices)[0]
+
+
+def _timed_page_range(engine, source, page_indices):
+    if isinstance(source, SharedPdf):
+        source = shared_bytes(source)
+    extractor = EXTRACTORS[engine]
+    if extractor.thread_safe:
+        return extractor.timed_range(source, page_indices)
+    with _engine_locks[engine]:
+        return extractor.timed_range(source, page_indices)
+
+
+def readable_ratio(text):
+    """Share of non-space characters that are letters, digits or punctuation (not symbols, controls or U+FFFD)."""
+    unmapped = sum(len(match) for match in _UNMAPPED_GLYPH.findall(text))
+    characters = [c for c in _UNMAPPED_GLYPH.sub("", text) if not c.isspace()]
+    if not characters and not unmapped:
+        return 0.0
+    readable = sum(1 for c in characters if unicodedata.category(c)[0] in "LNP")
+    return readable / (len(characters) + unmapped)
+
+
+def calibrate(source, page_indices, engines=None, sample_pages=CALIBRATION_PAGES, preferred=()):
+    """Times every engine on a sample of the pages and picks the fastest one with good text.
+
+    An engine passes the quality check when it finds at least MIN_CHARS_RATIO of
+    the characters of the engine that finds the most, and MIN_READABLE_RATIO of
+    its characters are readable (garbled font encodings fail here). Opening the
+    document is not timed, extraction opens it once per batch of pages. A passing
+    `preferred` engine wins unless it is slower than STORED_ENGINE_MIN_SPEED of
+    the fastest. Returns {"engine": name, "pages_per_second": float,
+    "candidates": {name: {...}}}.
+    """
+    engines = engines or available_engines()
+    step = max(1, len(page_indices) // sample_pages)
+    sample = list(page_indices)[::step][:sample_pages]
+    candidates = {}
+    for engine in engines:
+        try:
+            results, seconds = _timed_page_range(engine, source, sample)
+        except Exception as e:
+            candidates[engine] = {"error": str(e)}
+            continue
+        text = "".join(text for _, text, _ in results)
+        candidates[engine] = {
+            "pages_per_second": len(sample) / max(seconds, 1e-9),
+            "chars": len(text.strip()),
+            "readable": readable_ratio(text),
+            "errors": sum(1 for _, _, error in results if error)
+        }
+    measured = {engine: stats for engine, stats in candidates.items() if "error" not in stats}
+    most_chars = max((stats["chars"] for stats in measured.values()), default=0)
+    for stats in measured.values():
+        stats["passed"] = (
+            most_chars > 0 and stats["errors"] == 0
+            and stats["chars"] >= MIN_CHARS_RATIO * most_chars and stats["readable"] >= MIN_READABLE_RATIO
+        )
+    passed = [engine for engine, stats in measured.items() if stats["passed"]]
+    engine = max(passed, key=lambda name: measured[name]["pages_per_second"]) if passed else FALLBACK_ENGINE
+    for name in preferred:
+        if name in passed and measured[name]["pages_per_second"] >= STORED_ENGINE_MIN_SPEED * measured[engine]["pages_per_second"]:
+            engine = name
+            break
+    return {
+        "engine": engine,
+        "pages_per_second": measured.get(engine, {}).get("pages_per_second"),
+        "candidates": candidates
+    }
+
+
+class EngineSelector:
+    """Remembers the engine chosen for each document and the throughput it reached.
+
+    With "auto", the first extraction of CALIBRATION_MIN_PAGES or more pages of a
+    document calibrates the installed engines (see `calibrate`); later
+    extractions of the same document reuse the choice, so its pages in the page
+    store stay valid.
+    """
+
+    def __init__(self, logger, max_documents=DEFAULT_MAX_CALIBRATIONS):
+        self.logger = logger
+        self.max_documents = max_documents
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def select(self, doc_hash, source, page_indices, engine=DEFAULT_ENGINE, stored_versions=(), submit=None):
+        """Returns the engine for extracting `page_indices` of a document.
+
+        `stored_versions` are the engine versions the page store already holds
+        pages of this document for; such an engine is used for small extractions
+        and preferred by the calibration. `submit(func, *args, **kwargs)` runs the
+        calibration elsewhere (e.g. on the worker processes) and returns its future;
+        it runs in the calling thread if None.
+        """
+        if engine != "auto":
+            if engine not in EXTRACTORS or not EXTRACTORS[engine].available():
+                self.logger.warning(f"[EngineSelector] engine '{engine}' is not available, using {FALLBACK_ENGINE}.")
+                return FALLBACK_ENGINE
+            return engine
+        if doc_hash is None:
+            # Without a content hash the choice could not be remembered, so every
+            # extraction would calibrate again; the fallback costs less
+            return FALLBACK_ENGINE
+        info = self.get(doc_hash)
+        if info is not None and info["selected"]:
+            return info["engine"]
+        stored = [name for name in available_engines() if engine_version(name) in stored_versions]
+        if len(page_indices) < CALIBRATION_MIN_PAGES:
+            return stored[0] if stored else FALLBACK_ENGINE
+        if submit is None:
+            calibration = calibrate(source, page_indices, preferred=stored)
+        else:
+            calibration = submit(calibrate, source, page_indices, preferred=stored).result()
+        summary = ", ".join(
+            f"{name} {stats['pages_per_second']:.0f} pages/s" + ("" if stats["passed"] else " (failed quality check)")
+            for name, stats in calibration["candidates"].items() if "error" not in stats
+        )
+        self.logger.info(f"[EngineSelector] calibrated {doc_hash}: {summary} -> {calibration['engine']}")
+        self._update(doc_hash, engine=calibration["engine"], calibration=calibration, selected=True)
+        return calibration["engine"]
+
+    def stored_engines(self, doc_hash, stored_versions):
+        """Engines whose pages of a document may be used as they are: the selected one, or those in `stored_versions`."""
+        info = self.get(doc_hash)
+        if info is not None and info["selected"]:
+            return [info["engine"]]
+        return [name for name in available_engines() if engine_version(name) in stored_versions]
+
+    def report(self, doc_hash, engine, pages, seconds):
+        """Records the throughput of one extraction run."""
+        self._update(doc_hash, engine=engine, pages=pages, seconds=seconds, pages_per_second=pages / max(seconds, 1e-9))
+
+    def get(self, doc_hash):
+        """Returns {"engine", "selected", "calibration", "pages", "seconds", "pages_per_second"} of a document, or None.
+
+        `selected` is True once the engine is the calibrated choice for the document,
+        `engine` and the throughput are those of its last extraction.
+        """
+        if doc_hash is None:
+            return None
+        with self._lock:
+            info = self._documents.get(doc_hash)
+            if info is not None:
+                self._documents.move_to_end(doc_hash)
+            return dict(info) if info is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+    def _update(self, doc_hash, **values):
+        if doc_hash is None:
+            return
+        with self._lock:
+            info = self._documents.setdefault(doc_hash, {"calibration": None, "selected": False})
+            info.update(values)
+            self._documents.move_to_end(doc_hash)
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+
+
+_engine_selector = None
+_engine_selector_lock = threading.Lock()
+
+
+def get_engine_selector(logger):
+    """Returns the process-wide engine selector shared by all Streamlit sessions."""
+    global _engine_selector
+    with _engine_selector_lock:
+        if _engine_selector is None:
+            _engine_selector = EngineSelector(logger)
+        return _engine_selector
@@ -0,0 +1,229 @@
+import os
+import time
+import uuid
+import threading
+import functools
+import traceback
+import contextvars
+from contextlib import contextmanager
+from collections import defaultdict
+
+# Written after every pipeline run, next to app.log
+METRICS_EXPORT_PATH = "metrics.prom"
+METRIC_PREFIX = "pdf_summary"
+# Upper bounds (seconds) of the stage latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name, parent, attributes):
+        self.span_id = uuid.uuid4().hex[:8]
+        self.name = name
+        self.parent = parent
+        self.attributes = dict(attributes)
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+
+    @property
+    def depth(self):
+        depth, parent = 0, self.parent
+        while parent is not None:
+            depth, parent = depth + 1, parent.parent
+        return depth
+
+
+class Trace:
+    """All spans recorded during one pipeline run."""
+
+    def __init__(self, model=None):
+        self.run_id = uuid.uuid4().hex[:8]
+        self.model = model
+        self.start = time.perf_counter()
+        self.spans = []
+        self.attributes = {}
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        return {
+            "run_id": self.run_id,
+            "model": self.model,
+            "total_ms": (time.perf_counter() - self.start) * 1000,
+            "attributes": dict(self.attributes),
+            "spans": [
+                {
+                    "name": s.name,
+                    "depth": s.depth,
+                    "start_ms": (s.start - self.start) * 1000,
+                    "duration_ms": (s.duration or 0) * 1000,
+                    "attributes": s.attributes,
+                    "error": s.error
+                }
+                for s in spans
+            ]
+        }
+
+
+class MetricsRegistry:
+    """Process-wide latency histograms and counters, labelled by stage and model."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._counters = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds, model=None, error=False):
+        labels = (stage, model or "")
+        with self._lock:
+            histogram = self._histograms.setdefault(
+                labels, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            )
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+            self._counters[("stage_calls", stage, model or "")] += 1
+            if error:
+                self._counters[("stage_errors", stage, model or "")] += 1
+
+    def increment(self, name, value, stage, model=None):
+        with self._lock:
+            self._counters[(name, stage, model or "")] += value
+
+    def snapshot(self):
+        with self._lock:
+            histograms = {labels: dict(h, buckets=list(h["buckets"])) for labels, h in self._histograms.items()}
+            return histograms, dict(self._counters)
+
+    def to_prometheus(self):
+        histograms, counters = self.snapshot()
+        name = f"{METRIC_PREFIX}_stage_duration_seconds"
+        lines = [
+            f"# HELP {name} Duration of pipeline stages.",
+            f"# TYPE {name} histogram"
+        ]
+        for (stage, model), histogram in sorted(histograms.items()):
+            labels = f'stage="{stage}",model="{model}"'
+            for bound, count in zip(self.buckets, histogram["buckets"]):
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram['sum']:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {histogram['count']}")
+
+        for counter in sorted({key[0] for key in counters}):
+            counter_name = f"{METRIC_PREFIX}_{counter}_total"
+            lines.append(f"# TYPE {counter_name} counter")
+            for (key, stage, model), value in sorted(counters.items()):
+                if key == counter:
+                    lines.append(f'{counter_name}{{stage="{stage}",model="{model}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+    def export_prometheus(self, path=METRICS_EXPORT_PATH):
+        # Write to a temp file first so a scraper never reads half a file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+_metrics = MetricsRegistry()
+
+
+def get_metrics():
+    return _metrics
+
+
+@contextmanager
+def start_trace(model=None):
+    """Collects every span recorded inside the block (also in threads started with `submit_in_context`)."""
+    trace = Trace(model)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Times a stage; spans opened inside it become its children."""
+    trace = _current_trace.get()
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        _current_span.reset(token)
+        model = current.attributes.get("model") or (trace.model if trace else None)
+        _metrics.observe(name, current.duration, model=model, error=current.error is not None)
+        if trace is not None:
+            trace.add(current)
+
+
+def record(**values):
+    """Adds numeric facts (pages, bytes, tokens...) to the current span and to the stage counters."""
+    current = _current_span.get()
+    if current is None:
+        return
+    trace = _current_trace.get()
+    model = current.attributes.get("model") or (trace.model if trace else None)
+    for key, value in values.items():
+        current.attributes[key] = current.attributes.get(key, 0) + value
+        _metrics.increment(key, value, current.name, model)
+
+
+def observe(stage, seconds):
+    """Records a latency that is not a span of its own, e.g. time to first token."""
+    trace = _current_trace.get()
+    _metrics.observe(stage, seconds, model=trace.model if trace else None)
+
+
+def submit_in_context(executor, func, *args, **kwargs):
+    """executor.submit() that keeps the caller's trace and parent span in the worker thread."""
+    return executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+def _stage_name(func):
+    # "LlmUtils.ModelRunner.run" -> "ModelRunner.run", "process_pdf_pipeline" stays as is
+    return ".".join(func.__qualname__.split(".")[-2:])
+
+
+def log_decorator(func):
+    """Logs start/finish/error of a function or method and records it as a timed span.
+
+    The logger is taken from `self.logger` for methods, or from a `logger` keyword argument.
+    """
+    stage = _stage_name(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        logger = kwargs.get("logger") or (getattr(args[0], "logger", None) if args else None)
+        with span(stage) as current:
+            if logger:
+                logger.debug(f"[{func.__name__}] start")
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if logger:
+                    tb = traceback.format_exc()
+                    logger.error(f"[{func.__name__}] ERROR: {e}\nTraceback:\n{tb}")
+                raise
+        if logger:
+            logger.info(f"[{func.__name__}] finish ({current.duration * 1000:.1f} ms)")
+        return result
+    return wrapper
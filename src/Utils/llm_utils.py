@@ -1,35 +1,69 @@
 import os
 import json
 import re
+import time
 import traceback
-import lmstudio as lms
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .model_pool import get_model_pool
+from .scheduler import get_model_scheduler, AnalysisCancelled
+from .instrumentation import log_decorator, record, observe, submit_in_context
+from .resources import load_json
+
+# Rough characters-per-token ratio, used to size chunks without loading a tokenizer
+CHARS_PER_TOKEN = 4
+# Token budget for the document text of a single map (chunk) call
+DEFAULT_CHUNK_TOKENS = 6000
+# How many chunk calls may run against the model at the same time
+DEFAULT_MAX_CONCURRENCY = 2
+# Prompt used to merge partial chunk results in the reduce step
+MERGE_PROMPT_KEY = "merge"
+# Prompt used to fix a malformed response instead of re-running the whole analysis
+REPAIR_PROMPT_KEY = "repair"
+# Prompt used to answer a follow-up question from retrieved passages
+QUESTION_PROMPT_KEY = "question"
+# At most this much of a malformed response is sent back for repair
+REPAIR_MAX_CHARS = 12000
+# Expected type of every field of a summary result
+SUMMARY_SCHEMA = {"title": str, "summary": str, "keywords": list, "sections": dict}
+SUMMARY_FIELDS = tuple(SUMMARY_SCHEMA)
+# Expected fields per prompt key; other prompts only have to return a JSON object
+ANALYSIS_SCHEMAS = {
+    "summary": SUMMARY_SCHEMA,
+    MERGE_PROMPT_KEY: SUMMARY_SCHEMA,
+    "keywords": {"keywords": list, "topics": list},
+    "qa": {"questions": list},
+}
+# Analyses whose partial results are merged by the model; the others are merged locally
+MERGE_PROMPTS = {"summary": MERGE_PROMPT_KEY}
+# Prompts used inside the pipeline, not offered as analyses
+INTERNAL_PROMPT_KEYS = (MERGE_PROMPT_KEY, REPAIR_PROMPT_KEY, QUESTION_PROMPT_KEY)
+# Prompt file shipped with the app
+DEFAULT_PROMPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Prompts", "prompt.json")
+_TYPE_NAMES = {str: "string", list: "list", dict: "JSON object"}
+MAX_KEYWORDS = 15
+# Minimum seconds between two streaming UI updates
+STREAM_UPDATE_INTERVAL = 0.1
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
 
-# --- Log Decorator ---
-def log_decorator(func):
-    def wrapper(self, *args, **kwargs):
-        self.logger.info(f"[{func.__name__}] start")
-        try:
-            result = func(self, *args, **kwargs)
-            self.logger.info(f"[{func.__name__}] finish")
-            return result
-        except Exception as e:
-            tb = traceback.format_exc()
-            self.logger.error(f"[{func.__name__}] ERROR: {e}\nTraceback:\n{tb}")
-            raise
-    return wrapper
 
+def analysis_prompt_keys(prompt_path=DEFAULT_PROMPT_PATH):
+    """Prompt keys of the prompt file that can be selected as analyses, in file order."""
+    return [key for key in load_json(prompt_path) if key not in INTERNAL_PROMPT_KEYS]
 
 class LlmUtils:
     def __init__(self, logger, model, pdf_text, prompt_key, prompt_path=None):
         if prompt_path is None:
-            base_dir = os.path.dirname(os.path.abspath(__file__))
-            prompt_path = os.path.join(base_dir, "Prompts", "prompt.json")
+            prompt_path = DEFAULT_PROMPT_PATH
             logger.info(f"[LlmUtils] prompt_path automatically set: {prompt_path}")
         else:
             logger.info(f"[LlmUtils] prompt_path provided externally: {prompt_path}")
         self.logger = logger
         self.model = model
         self.pdf_text = pdf_text
+        self.prompt_path = prompt_path
         self.prompt_handler = self.PromptHandler(prompt_path, prompt_key, logger)
         self.model_runner = self.ModelRunner(model, logger)
         self.output_processor = self.OutputProcessor(logger)
@@ -45,12 +79,17 @@ class LlmUtils:
         def _load_prompt(self):
             if not os.path.exists(self.prompt_path):
                 raise FileNotFoundError(f"Prompt file not found: {self.prompt_path}")
-            with open(self.prompt_path, "r", encoding="utf-8") as f:
-                prompts = json.load(f)
+            # Parsed once per process and again only after the file was edited
+            prompts = load_json(self.prompt_path)
             if self.prompt_key not in prompts:
                 raise KeyError(f"Prompt '{self.prompt_key}' not found.")
             return prompts[self.prompt_key]
 
+        @property
+        def document_prefix(self):
+            """Template text before the document; analyses with the same prefix share the server's prompt cache."""
+            return self.prompt_template.split("{text}", 1)[0]
+
         @log_decorator
         def prepare(self, pdf_text):
             try:
@@ -60,13 +99,152 @@ class LlmUtils:
                 self.logger.error(f"Failed to prepare prompt: {e}\n{tb}")
                 return None
 
+    class TextChunker:
+        def __init__(self, max_tokens, logger):
+            self.max_chars = max_tokens * CHARS_PER_TOKEN
+            self.logger = logger
+
+        @log_decorator
+        def split(self, text):
+            chunks = [chunk for chunk, _, _ in self.iter_chunks([(None, text)])]
+            self.logger.info(f"Text split into {len(chunks)} chunks (max {self.max_chars} chars each).")
+            return chunks
+
+        def iter_chunks(self, parts):
+            """Splits text that arrives in parts, yielding every chunk as soon as it is full.
+
+            `parts` yields (page, text); each chunk comes as (text, first_page, last_page)
+            with the pages of its first and last line.
+            """
+            # Split on line boundaries so chunks never cut a sentence line in half
+            current = []
+            current_len = 0
+            span = None
+            for page, text in parts:
+                for line in text.splitlines(keepends=True):
+                    # A single line longer than the budget is hard-split
+                    while len(line) > self.max_chars:
+                        if current:
+                            yield from self._chunk(current, span)
+                            current, current_len, span = [], 0, None
+                        yield from self._chunk([line[:self.max_chars]], (page, page))
+                        line = line[self.max_chars:]
+                    if current_len + len(line) > self.max_chars and current:
+                        yield from self._chunk(current, span)
+                        current, current_len, span = [], 0, None
+                    current.append(line)
+                    current_len += len(line)
+                    span = (span[0] if span else page, page)
+            if current:
+                yield from self._chunk(current, span)
+
+        @staticmethod
+        def _chunk(lines, span):
+            text = "".join(lines)
+            if text.strip():
+                yield text, span[0], span[1]
+
+    class StreamingJsonParser:
+        """Follows a streamed response and parses its JSON objects as they grow.
+
+        Text inside a leading <think> block is skipped; afterwards brace depth and
+        string state are tracked per character, so each top-level object is parsed
+        as soon as its closing brace arrives. `result` is the last valid one so far,
+        the same one `OutputProcessor.extract_json` picks from the whole response.
+        """
+
+        def __init__(self):
+            self.raw = ""
+            self.result = None
+            self._pos = None
+            self._start = None
+            self._stack = []
+            self._commas = []
+            self._in_string = False
+            self._escape = False
+            self._last_partial = None
+
+        def feed(self, fragment):
+            """Adds streamed text; returns the last valid top-level object so far, or None."""
+            self.raw += fragment
+            if self._pos is None:
+                head = self.raw.lstrip()
+                if head.startswith("<think>"):
+                    end = self.raw.find("</think>")
+                    if end == -1:
+                        return None
+                    self._pos = end + len("</think>")
+                elif "<think>".startswith(head):
+                    # Not enough text yet to know whether a think block follows
+                    return None
+                else:
+                    self._pos = len(self.raw) - len(head)
+
+            for i in range(self._pos, len(self.raw)):
+                char = self.raw[i]
+                if self._in_string:
+                    if self._escape:
+                        self._escape = False
+                    elif char == "\\":
+                        self._escape = True
+                    elif char == '"':
+                        self._in_string = False
+                elif char == '"' and self._stack:
+                    self._in_string = True
+                elif char == "{" or (char == "[" and self._stack):
+                    if not self._stack:
+                        self._start = i
+                        self._commas = []
+                        self._last_partial = None
+                    self._stack.append(char)
+                elif char in "}]" and self._stack:
+                    self._stack.pop()
+                    if not self._stack:
+                        try:
+                            self.result = json.loads(self.raw[self._start:i + 1])
+                        except ValueError:
+                            pass
+                        self._start = None
+                elif char == "," and self._stack:
+                    self._commas.append((i, list(self._stack)))
+            self._pos = len(self.raw)
+            return self.result
+
+        @staticmethod
+        def _closers(stack):
+            return "".join("}" if opener == "{" else "]" for opener in reversed(stack))
+
+        def partial(self):
+            """Best-effort parse of the object in progress (open strings and brackets closed), else the last complete one."""
+            if self._start is None or not self._stack:
+                return self.result
+            candidates = [self.raw[self._start:] + ('"' if self._in_string else "") + self._closers(self._stack)]
+            if self._commas:
+                comma_pos, stack = self._commas[-1]
+                candidates.append(self.raw[self._start:comma_pos] + self._closers(stack))
+            for candidate in candidates:
+                try:
+                    self._last_partial = json.loads(candidate)
+                    break
+                except ValueError:
+                    continue
+            return self._last_partial if self._last_partial is not None else self.result
+
     class ModelRunner:
         def __init__(self, model, logger):
-            self.model = lms.llm(model)
+            # Accept an LM Studio model key (served from the shared pool)
+            # or an already resolved handle (e.g. StubModel)
+            self.model = get_model_pool(logger).acquire(model) if isinstance(model, str) else model
+            # Identifies the model when identical requests are coalesced
+            self.model_key = model if isinstance(model, str) else id(self.model)
             self.logger = logger
 
         @log_decorator
         def run(self, prompt):
+            # Waits for a free model slot; an identical prompt already in flight is answered by that call
+            return get_model_scheduler(self.logger).call((self.model_key, False, prompt), lambda _: self._respond(prompt))
+
+        def _respond(self, prompt):
             try:
                 self.logger.info("Sending prompt to LLM...")
                 result = self.model.respond(prompt)
@@ -75,6 +253,7 @@ class LlmUtils:
                 if not isinstance(result, str):
                     result = getattr(result, "text", str(result))
 
+                record(prompt_tokens=estimate_tokens(prompt), completion_tokens=estimate_tokens(result))
                 return result
 
             except Exception as e:
@@ -82,7 +261,97 @@ class LlmUtils:
                 self.logger.error(f"Model error: {e}\n{tb}")
                 return None
 
+        @log_decorator
+        def run_stream(self, prompt, token_callback=None, cancel_event=None, json_output=True):
+            """Streams the response, reporting text and speed through `token_callback(text, stats)`.
+
+            The whole response is read, as the last valid JSON object in it is the result
+            (see `OutputProcessor.extract_json`). With `json_output` the stats carry the
+            JSON object parsed so far as "partial_json"; a plain-text response (e.g. a
+            follow-up answer) is not parsed. Raises AnalysisCancelled when
+            `cancel_event` is set; the prediction is then cancelled so the model is free
+            for the next request.
+            Goes through the model scheduler like `run`.
+            """
+            return get_model_scheduler(self.logger).call(
+                (self.model_key, True, json_output, prompt),
+                lambda callback: self._respond_stream(prompt, callback, cancel_event, json_output),
+                token_callback=token_callback, cancel_event=cancel_event
+            )
+
+        def _respond_stream(self, prompt, token_callback, cancel_event, json_output=True):
+            stream = None
+            exhausted = False
+            try:
+                self.logger.info("Streaming prompt to LLM...")
+                parser = LlmUtils.StreamingJsonParser() if json_output else None
+                parts = []
+                tokens = 0
+                started_at = time.perf_counter()
+                first_token_at = None
+                last_update = 0.0
+
+                def stats(now):
+                    elapsed = now - first_token_at if first_token_at else 0.0
+                    values = {
+                        "ttft": (first_token_at - started_at) if first_token_at else None,
+                        "tokens": tokens,
+                        "tokens_per_second": tokens / elapsed if elapsed > 0 else 0.0
+                    }
+                    if parser is not None:
+                        values["partial_json"] = parser.partial()
+                    return values
+
+                stream = self.model.respond_stream(prompt)
+                for fragment in stream:
+                    now = time.perf_counter()
+                    if first_token_at is None:
+                        first_token_at = now
+                        observe("ModelRunner.time_to_first_token", now - started_at)
+                        self.logger.info(f"Time to first token: {now - started_at:.2f}s")
+                    content = getattr(fragment, "content", str(fragment))
+                    parts.append(content)
+                    tokens += getattr(fragment, "tokens_count", 1) or 1
+                    if parser is not None:
+                        parser.feed(content)
+
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise AnalysisCancelled("Analysis cancelled by user.")
+                    if token_callback and now - last_update >= STREAM_UPDATE_INTERVAL:
+                        last_update = now
+                        token_callback("".join(parts), stats(now))
+                exhausted = True
+
+                final_stats = stats(time.perf_counter())
+                record(prompt_tokens=estimate_tokens(prompt), completion_tokens=tokens)
+                if token_callback:
+                    token_callback("".join(parts), final_stats)
+                ttft = final_stats["ttft"] or 0.0
+                self.logger.info(
+                    f"Streamed {tokens} tokens, TTFT {ttft:.2f}s, {final_stats['tokens_per_second']:.1f} tok/s."
+                )
+                return "".join(parts)
+
+            except AnalysisCancelled:
+                self.logger.warning("Streaming cancelled by user.")
+                raise
+            except Exception as e:
+                tb = traceback.format_exc()
+                self.logger.error(f"Model error: {e}\n{tb}")
+                return None
+            finally:
+                # Also runs when Streamlit interrupts the script (e.g. the Cancel button)
+                if stream is not None and not exhausted:
+                    try:
+                        stream.cancel()
+                        self.logger.info("Prediction cancelled, model released.")
+                    except Exception as e:
+                        self.logger.warning(f"Could not cancel prediction: {e}")
+
     class OutputProcessor:
+        # Characters that can change the nesting state of a JSON text
+        _JSON_TOKENS = re.compile(r'[{}"\\]')
+
         def __init__(self, logger):
             self.logger = logger
 
@@ -93,36 +362,405 @@ class LlmUtils:
             cleaned = cleaned.strip()
             return cleaned
 
+        @classmethod
+        def _top_level_objects(cls, text):
+            # One pass over the structural characters only; braces inside strings are skipped
+            spans = []
+            depth = 0
+            start = None
+            in_string = False
+            escaped_until = -1
+            for match in cls._JSON_TOKENS.finditer(text):
+                i = match.start()
+                if i < escaped_until:
+                    continue
+                char = match.group()
+                if in_string:
+                    if char == "\\":
+                        escaped_until = i + 2
+                    elif char == '"':
+                        in_string = False
+                elif char == '"':
+                    in_string = depth > 0
+                elif char == "{":
+                    if depth == 0:
+                        start = i
+                    depth += 1
+                elif char == "}" and depth:
+                    depth -= 1
+                    if depth == 0:
+                        spans.append((start, i + 1))
+            return spans
+
         @log_decorator
-        def extract_json(self, text, output_path="a.json"):
-            self.logger.info("Starting JSON extraction...")
-            try:
-                json_match = re.search(r'\{.*\}', text, flags=re.DOTALL)
-                if not json_match:
-                    raise ValueError("No valid JSON found in text.")
-                json_str = json_match.group(0)
-                data = json.loads(json_str)
-                with open(output_path, "w", encoding="utf-8") as f:
-                    json.dump(data, f, indent=2, ensure_ascii=False)
-                self.logger.info(f"JSON successfully saved to '{output_path}' file.")
-                return data
-            except Exception as e:
-                tb = traceback.format_exc()
-                self.logger.error(f"JSON extraction error: {e}\n{tb}")
-                return None
+        def extract_json(self, text):
+            """Returns the last valid top-level JSON object in `text`, or None."""
+            for start, end in reversed(self._top_level_objects(text)):
+                try:
+                    data = json.loads(text[start:end])
+                except ValueError:
+                    continue
+                if isinstance(data, dict):
+                    return data
+            self.logger.warning("No valid JSON object found in the response.")
+            return None
+
+        @staticmethod
+        def validate_summary(data):
+            """Returns what is wrong with a summary result; an empty list means it is valid."""
+            return LlmUtils.OutputProcessor.validate(data, SUMMARY_SCHEMA)
+
+        @staticmethod
+        def validate(data, schema):
+            """Returns what is wrong with a result of the given schema ({field: type}, or None for any object)."""
+            if not isinstance(data, dict):
+                return ["no complete JSON object found"]
+            problems = []
+            for field, expected in (schema or {}).items():
+                if field not in data:
+                    problems.append(f"missing field '{field}'")
+                elif not isinstance(data[field], expected):
+                    problems.append(f"'{field}' must be a {_TYPE_NAMES[expected]}")
+            if isinstance(data.get("keywords"), list) and not all(isinstance(k, str) for k in data["keywords"]):
+                problems.append("'keywords' must only contain strings")
+            return problems
+
+        @log_decorator
+        def merge_results(self, partials, schema=SUMMARY_SCHEMA):
+            # Local fallback for the reduce step when the merge call fails
+            if schema is not SUMMARY_SCHEMA:
+                return self._merge_fields(partials)
+            title = next((p.get("title") for p in partials if p.get("title")), "")
+            summary = " ".join(p.get("summary", "") for p in partials if p.get("summary"))
+            keywords = []
+            seen = set()
+            for p in partials:
+                for keyword in p.get("keywords") or []:
+                    if isinstance(keyword, str) and keyword.lower() not in seen:
+                        seen.add(keyword.lower())
+                        keywords.append(keyword)
+            sections = {}
+            for p in partials:
+                if isinstance(p.get("sections"), dict):
+                    for heading, description in p["sections"].items():
+                        sections.setdefault(heading, description)
+            return {
+                "title": title,
+                "summary": summary,
+                "keywords": keywords[:MAX_KEYWORDS],
+                "sections": sections
+            }
+
+        @staticmethod
+        def _merge_fields(partials):
+            # Lists are concatenated without duplicates, objects combined, texts joined
+            merged = {}
+            for partial in partials:
+                for field, value in partial.items():
+                    if isinstance(value, list):
+                        items = merged.setdefault(field, [])
+                        seen = {json.dumps(item, sort_keys=True).lower() for item in items}
+                        items.extend(item for item in value if json.dumps(item, sort_keys=True).lower() not in seen)
+                    elif isinstance(value, dict):
+                        for key, item in value.items():
+                            merged.setdefault(field, {}).setdefault(key, item)
+                    elif isinstance(value, str) and isinstance(merged.get(field), str):
+                        merged[field] = f"{merged[field]} {value}".strip()
+                    else:
+                        merged.setdefault(field, value)
+            return merged
+
+    @log_decorator
+    def run_full_pipeline(self, token_callback=None, cancel_event=None):
+        return self._run_prompt(self.prompt_handler, token_callback, cancel_event)
 
     @log_decorator
-    def run_full_pipeline(self):
-        prompt = self.prompt_handler.prepare(self.pdf_text)
+    def run_analyses(self, prompt_keys, map_reduce=False, status_callback=None, max_chunk_tokens=DEFAULT_CHUNK_TOKENS,
+                     max_concurrency=DEFAULT_MAX_CONCURRENCY, token_callback=None, cancel_event=None):
+        """Runs several prompts over the same text and returns {prompt_key: result}.
+
+        The calls for one text run back to back, so with document-first templates the
+        server's prompt cache only has to process each analysis' instructions again.
+        """
+        handlers = self._load_handlers(prompt_keys)
+
+        chunks = [self.pdf_text]
+        if map_reduce:
+            chunks = self.TextChunker(max_chunk_tokens, self.logger).split(self.pdf_text)
+        if len(chunks) <= 1:
+            results = {}
+            for prompt_key, handler in handlers.items():
+                results[prompt_key] = self._run_prompt(handler, token_callback, cancel_event)
+            return results
+        return self._map_reduce(handlers, chunks, status_callback, max_chunk_tokens, max_concurrency, cancel_event)
+
+    def _load_handlers(self, prompt_keys):
+        handlers = {self.prompt_handler.prompt_key: self.prompt_handler}
+        for prompt_key in prompt_keys:
+            if prompt_key not in handlers:
+                handlers[prompt_key] = self.PromptHandler(self.prompt_path, prompt_key, self.logger)
+        handlers = {prompt_key: handlers[prompt_key] for prompt_key in prompt_keys}
+        prefixes = {handler.document_prefix for handler in handlers.values()}
+        if len(prefixes) > 1:
+            self.logger.warning("Prompt templates do not share the text before {text}; the prompt cache cannot be reused.")
+        return handlers
+
+    def _run_prompt(self, prompt_handler, token_callback=None, cancel_event=None):
+        prompt = prompt_handler.prepare(self.pdf_text)
         if not prompt:
             self.logger.error("Process terminated because prompt could not be prepared.")
             return None
 
-        raw_output = self.model_runner.run(prompt)
+        if token_callback or cancel_event:
+            raw_output = self.model_runner.run_stream(prompt, token_callback, cancel_event)
+        else:
+            raw_output = self.model_runner.run(prompt)
         if not raw_output:
             self.logger.error("Process terminated because no response received from model.")
             return None
 
+        return self._parse_output(raw_output, prompt_handler.prompt_key)
+
+    def _parse_output(self, raw_output, prompt_key=None):
+        """Parses a response; a malformed one gets a short repair call instead of a full re-run."""
+        prompt_key = prompt_key or self.prompt_handler.prompt_key
+        schema = ANALYSIS_SCHEMAS.get(prompt_key)
         cleaned = self.output_processor.clean_text(raw_output)
-        json_result = self.output_processor.extract_json(cleaned)
-        return json_result
\ No newline at end of file
+        data = self.output_processor.extract_json(cleaned)
+        problems = self.output_processor.validate(data, schema)
+        if not problems:
+            return data
+        repaired = self._repair(cleaned, problems, schema, prompt_key)
+        if repaired is not None and (data is None or not self.output_processor.validate(repaired, schema)):
+            return repaired
+        return data
+
+    @log_decorator
+    def _repair(self, cleaned, problems, schema=SUMMARY_SCHEMA, prompt_key="summary"):
+        try:
+            repair_handler = self.PromptHandler(self.prompt_path, REPAIR_PROMPT_KEY, self.logger)
+        except (FileNotFoundError, KeyError) as e:
+            self.logger.warning(f"Repair prompt unavailable, keeping the response as it is: {e}")
+            return None
+        self.logger.warning(
+            f"Response to the '{prompt_key}' prompt is not a valid result ({'; '.join(problems)}), requesting a repair."
+        )
+        record(repairs=1)
+        # Only the response goes back to the model, not the document
+        start = cleaned.find("{")
+        fragment = cleaned[max(start, 0):][:REPAIR_MAX_CHARS]
+        fields = "\n".join(f"{field}: {_TYPE_NAMES[expected]}" for field, expected in (schema or {}).items())
+        prompt = repair_handler.prepare(
+            f"Expected fields:\n{fields or 'any'}\n\nProblems: {'; '.join(problems)}\n\nResponse to fix:\n{fragment}"
+        )
+        if not prompt:
+            return None
+        raw_output = self.model_runner.run(prompt)
+        if not raw_output:
+            return None
+        return self.output_processor.extract_json(self.output_processor.clean_text(raw_output))
+
+    @log_decorator
+    def run_question(self, question, passages, token_callback=None, cancel_event=None):
+        """Answers a follow-up question from (page_number, text) passages instead of the whole document.
+
+        Returns the answer text (reasoning removed), or None.
+        """
+        excerpts = "\n\n".join(f"[Page {page_number}]\n{text.strip()}" for page_number, text in passages)
+        prompt = self.prompt_handler.prepare(f"{excerpts}\n\nQuestion: {question}")
+        if not prompt:
+            self.logger.error("Question terminated because prompt could not be prepared.")
+            return None
+
+        if token_callback or cancel_event:
+            # The answer is plain text, not a JSON object
+            raw_output = self.model_runner.run_stream(prompt, token_callback, cancel_event, json_output=False)
+        else:
+            raw_output = self.model_runner.run(prompt)
+        if not raw_output:
+            self.logger.error("Question terminated because no response received from model.")
+            return None
+        return self.output_processor.clean_text(raw_output)
+
+    def _summarize(self, prompt_handler, text, prompt_key=None):
+        prompt = prompt_handler.prepare(text)
+        if not prompt:
+            return None
+        raw_output = self.model_runner.run(prompt)
+        if not raw_output:
+            return None
+        return self._parse_output(raw_output, prompt_key or prompt_handler.prompt_key)
+
+    def _summarize_chunk(self, handlers, chunk):
+        # All analyses of one chunk run back to back, so the chunk stays in the server's prompt cache
+        return {prompt_key: self._summarize(handler, chunk) for prompt_key, handler in handlers.items()}
+
+    def _load_merge_handler(self, prompt_key):
+        if prompt_key not in MERGE_PROMPTS:
+            return None
+        try:
+            return self.PromptHandler(self.prompt_path, MERGE_PROMPTS[prompt_key], self.logger)
+        except (FileNotFoundError, KeyError) as e:
+            self.logger.warning(f"Merge prompt unavailable, partial results will be merged locally: {e}")
+            return None
+
+    def _merge_batch(self, merge_handler, partials, prompt_key=None):
+        schema = ANALYSIS_SCHEMAS.get(prompt_key or self.prompt_handler.prompt_key)
+        merged = None
+        if merge_handler:
+            merged = self._summarize(merge_handler, json.dumps(partials, ensure_ascii=False, indent=2), prompt_key)
+            if not isinstance(merged, dict) or not all(field in merged for field in schema or {}):
+                self.logger.warning("Merge call did not return a valid result, merging locally.")
+                merged = None
+        if merged is None:
+            merged = self.output_processor.merge_results(partials, schema)
+        return merged
+
+    def _batch_partials(self, partials, max_tokens):
+        # Group partial results so each merge prompt stays within the token budget
+        batches = []
+        current = []
+        current_tokens = 0
+        for partial in partials:
+            tokens = estimate_tokens(json.dumps(partial, ensure_ascii=False))
+            # Keep at least two results per batch so every level shrinks the list
+            if current_tokens + tokens > max_tokens and len(current) >= 2:
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(partial)
+            current_tokens += tokens
+        if current:
+            if len(current) == 1 and batches:
+                batches[-1].append(current[0])
+            else:
+                batches.append(current)
+        return batches
+
+    @log_decorator
+    def run_map_reduce(self, status_callback=None, max_chunk_tokens=DEFAULT_CHUNK_TOKENS,
+                       max_concurrency=DEFAULT_MAX_CONCURRENCY, token_callback=None, cancel_event=None):
+        chunks = self.TextChunker(max_chunk_tokens, self.logger).split(self.pdf_text)
+        if len(chunks) <= 1:
+            self.logger.info("Text fits into a single chunk, running single-call pipeline.")
+            return self.run_full_pipeline(token_callback=token_callback, cancel_event=cancel_event)
+        handlers = {self.prompt_handler.prompt_key: self.prompt_handler}
+        results = self._map_reduce(handlers, chunks, status_callback, max_chunk_tokens, max_concurrency, cancel_event)
+        return results[self.prompt_handler.prompt_key]
+
+    def _map_reduce(self, handlers, chunks, status_callback, max_chunk_tokens, max_concurrency, cancel_event):
+        notify = status_callback or (lambda role, content: None)
+        notify("bot", f"🧩 Text split into {len(chunks)} chunks, summarizing {max_concurrency} at a time...")
+        chunk_results = [{} for _ in chunks]
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            futures = {
+                submit_in_context(executor, self._summarize_chunk, handlers, chunk): i
+                for i, chunk in enumerate(chunks)
+            }
+            try:
+                # Callbacks are reported from this thread, not from the worker threads
+                for done, future in enumerate(as_completed(futures), start=1):
+                    i = futures[future]
+                    try:
+                        chunk_results[i] = future.result()
+                    except Exception as e:
+                        self.logger.error(f"Chunk {i + 1} failed: {e}")
+                    state = "done" if any(chunk_results[i].values()) else "failed"
+                    notify("bot", f"🧩 Chunk {i + 1}/{len(chunks)} {state} ({done}/{len(chunks)} complete)")
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise AnalysisCancelled("Analysis cancelled by user.")
+            except BaseException:
+                # Cancellation or a Streamlit interrupt: drop the chunks that have not started
+                for pending in futures:
+                    pending.cancel()
+                raise
+            return self._reduce_chunks(handlers, chunk_results, notify, max_chunk_tokens, executor)
+
+    @log_decorator
+    def run_streaming(self, parts, prompt_keys=None, status_callback=None, max_chunk_tokens=DEFAULT_CHUNK_TOKENS,
+                      max_concurrency=DEFAULT_MAX_CONCURRENCY, cancel_event=None):
+        """Map-reduce over a document that is still being extracted; returns {prompt_key: result}.
+
+        `parts` yields (page, text) in document order, e.g. from a generator that
+        parses the next pages meanwhile. Every chunk goes to the model as soon as it
+        is full, so the first partial result only waits for the first chunk; each
+        partial result is posted through `status_callback` as it arrives.
+        """
+        notify = status_callback or (lambda role, content: None)
+        handlers = self._load_handlers(prompt_keys or [self.prompt_handler.prompt_key])
+        started_at = time.perf_counter()
+        chunk_results = []
+        futures = {}
+        reported = set()
+
+        def report(block):
+            # Posts the chunks finished so far (all of them when `block`), from this thread
+            pending = [future for future in futures if future not in reported]
+            for future in (as_completed(pending) if block else [f for f in pending if f.done()]):
+                reported.add(future)
+                i, first_page, last_page = futures[future]
+                try:
+                    chunk_results[i] = future.result()
+                except Exception as e:
+                    self.logger.error(f"Chunk {i + 1} failed: {e}")
+                result = next((r for r in chunk_results[i].values() if isinstance(r, dict)), None)
+                if len(reported) == 1 and result:
+                    observe("LlmUtils.time_to_first_result", time.perf_counter() - started_at)
+                    notify("bot", f"⏱️ First partial result after {time.perf_counter() - started_at:.1f}s.")
+                preview = result.get("summary") if result else None
+                state = f": {preview[:300]}" if isinstance(preview, str) else (" done" if result else " failed")
+                notify("bot", f"🧩 Pages {first_page}-{last_page} (chunk {i + 1}){state}")
+                if cancel_event is not None and cancel_event.is_set():
+                    raise AnalysisCancelled("Analysis cancelled by user.")
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            try:
+                for text, first_page, last_page in self.TextChunker(max_chunk_tokens, self.logger).iter_chunks(parts):
+                    chunk_results.append({})
+                    future = submit_in_context(executor, self._summarize_chunk, handlers, text)
+                    futures[future] = (len(chunk_results) - 1, first_page, last_page)
+                    notify("bot", f"📤 Chunk {len(chunk_results)} (pages {first_page}-{last_page}) sent to the model...")
+                    report(block=False)
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise AnalysisCancelled("Analysis cancelled by user.")
+                self.logger.info(f"All {len(chunk_results)} chunks sent after {time.perf_counter() - started_at:.2f}s.")
+                report(block=True)
+            except BaseException:
+                for pending in futures:
+                    pending.cancel()
+                raise
+            return self._reduce_chunks(handlers, chunk_results, notify, max_chunk_tokens, executor)
+
+    def _reduce_chunks(self, handlers, chunk_results, notify, max_chunk_tokens, executor):
+        results = {}
+        for prompt_key in handlers:
+            partials = [r.get(prompt_key) for r in chunk_results if isinstance(r.get(prompt_key), dict)]
+            if not partials:
+                self.logger.error(f"No chunk produced a valid '{prompt_key}' result.")
+                results[prompt_key] = None
+                continue
+            results[prompt_key] = self._reduce(prompt_key, partials, notify, max_chunk_tokens, executor)
+        return results
+
+    @log_decorator
+    def merge(self, partials, status_callback=None, max_chunk_tokens=DEFAULT_CHUNK_TOKENS,
+              max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """Merges partial results of consecutive parts of a document, in document order, into one."""
+        notify = status_callback or (lambda role, content: None)
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            return self._reduce(self.prompt_handler.prompt_key, list(partials), notify, max_chunk_tokens, executor)
+
+    def _reduce(self, prompt_key, partials, notify, max_chunk_tokens, executor):
+        merge_handler = self._load_merge_handler(prompt_key) if len(partials) > 1 else None
+        if len(partials) > 1 and merge_handler is None:
+            notify("bot", f"🔗 Merging {len(partials)} partial '{prompt_key}' results locally...")
+            return self.output_processor.merge_results(partials, ANALYSIS_SCHEMAS.get(prompt_key))
+        # Reduce level by level until a single result is left
+        while len(partials) > 1:
+            batches = self._batch_partials(partials, max_chunk_tokens)
+            notify("bot", f"🔗 Merging {len(partials)} partial '{prompt_key}' results in {len(batches)} call(s)...")
+            merge_futures = [
+                submit_in_context(executor, self._merge_batch, merge_handler, batch, prompt_key)
+                for batch in batches
+            ]
+            partials = [future.result() for future in merge_futures]
+        return partials[0]
@@ -1,20 +1,164 @@
+import os
+import json
+import atexit
 import logging
+import threading
+import multiprocessing
+from queue import SimpleQueue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
-def get_logger(name="PDFLlmLogger", console=False):
+# Defaults below can be overridden with these environment variables
+LOG_FILE = os.environ.get("PDF_SUMMARY_LOG_FILE", "app.log")
+# Level of the application logger (DEBUG, INFO, WARNING, ERROR)
+LOG_LEVEL = os.environ.get("PDF_SUMMARY_LOG_LEVEL", "INFO")
+# Per-module levels by source module name, e.g. "pdf_util=DEBUG,instrumentation=WARNING"
+LOG_MODULE_LEVELS = os.environ.get("PDF_SUMMARY_LOG_MODULES", "")
+# "text" or "json" (one JSON object per line)
+LOG_FORMAT = os.environ.get("PDF_SUMMARY_LOG_FORMAT", "text")
+# The log file is rotated at this size, keeping LOG_BACKUP_COUNT old files (app.log.1, ...)
+LOG_MAX_BYTES = int(os.environ.get("PDF_SUMMARY_LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get("PDF_SUMMARY_LOG_BACKUPS", 5))
+
+_listeners = {}
+# Listeners for the records of forked child processes, by logger name
+_child_listeners = {}
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "module": record.module,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ModuleLevelFilter(logging.Filter):
+    """Drops records below the level configured for their source module."""
+
+    def __init__(self, default_level, module_levels):
+        super().__init__()
+        self.default_level = default_level
+        self.module_levels = module_levels
+
+    def filter(self, record):
+        return record.levelno >= self.module_levels.get(record.module, self.default_level)
+
+
+def parse_level(level):
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level).strip().upper())
+    if not isinstance(value, int):
+        raise ValueError(f"Unknown log level: {level}")
+    return value
+
+
+def parse_module_levels(spec):
+    """Parses "module=LEVEL,module=LEVEL" (or a dict) into {module: level}."""
+    if isinstance(spec, dict):
+        return {module: parse_level(level) for module, level in spec.items()}
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        module, _, level = item.partition("=")
+        levels[module.strip()] = parse_level(level)
+    return levels
+
+
+def get_logger(name="PDFLlmLogger", console=False, level=None, module_levels=None, json_format=None, log_file=None):
+    """Returns the application logger, configuring it on the first call.
+
+    Records are put on a queue and written by a background thread to a size-rotated
+    log file (and the console), so the calling thread never waits on disk I/O.
+    Forked child processes send their records over a multiprocessing queue to
+    another thread of this process, which is the only writer of the file.
+    Arguments left as None fall back to the PDF_SUMMARY_LOG_* environment variables.
+    """
     logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
+    with _lock:
+        if logger.handlers:
+            return logger
 
-    if not logger.handlers:
-        file_handler = logging.FileHandler("app.log", encoding="utf-8", mode="a")
-        formatter = logging.Formatter(
-            "{asctime} - {levelname} - {message}", style="{", datefmt="%Y-%m-%d %H:%M"
-        )
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        default_level = parse_level(level or LOG_LEVEL)
+        levels = parse_module_levels(LOG_MODULE_LEVELS if module_levels is None else module_levels)
+        if json_format is None:
+            json_format = LOG_FORMAT.lower() == "json"
+        if json_format:
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter(
+                "{asctime} - {levelname} - {message}", style="{", datefmt="%Y-%m-%d %H:%M"
+            )
 
+        handlers = [RotatingFileHandler(
+            log_file or LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True
+        )]
         if console:
-            console_handler = logging.StreamHandler()
-            console_handler.setFormatter(formatter)
-            logger.addHandler(console_handler)
+            handlers.append(logging.StreamHandler())
+        for handler in handlers:
+            handler.setFormatter(formatter)
 
+        queue = SimpleQueue()
+        listener = QueueListener(queue, *handlers)
+        listener.start()
+        _listeners[name] = listener
+        child_listener = QueueListener(multiprocessing.Queue(), *handlers)
+        child_listener.start()
+        _child_listeners[name] = child_listener
+        queue_handler = QueueHandler(queue)
+        queue_handler.listener = listener
+        logger.addHandler(queue_handler)
+        # The logger lets through the most verbose configured level, the filter applies the rest
+        logger.setLevel(min([default_level, *levels.values()]))
+        logger.addFilter(ModuleLevelFilter(default_level, levels))
     return logger
+
+
+def stop_logging(name=None):
+    """Writes out queued records and detaches the handlers of one logger (or of all of them)."""
+    with _lock:
+        for logger_name in [name] if name else list(_listeners):
+            listener = _listeners.pop(logger_name, None)
+            if listener is None:
+                continue
+            listener.stop()
+            child_listener = _child_listeners.pop(logger_name)
+            child_listener.stop()
+            child_listener.queue.close()
+            for handler in listener.handlers:
+                handler.close()
+            logger = logging.getLogger(logger_name)
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+            for log_filter in list(logger.filters):
+                logger.removeFilter(log_filter)
+
+
+def _after_fork_in_child():
+    # A forked child (e.g. a process pool worker) inherits the queue handler but not
+    # the listener thread that empties the queue, so its records would never be
+    # written. Writing to the rotating file from here would race with the parent's
+    # rotation, so the records go to the parent's child listener instead
+    global _lock
+    _lock = threading.Lock()
+    for name, child_listener in _child_listeners.items():
+        for handler in logging.getLogger(name).handlers:
+            if isinstance(handler, QueueHandler):
+                handler.queue = child_listener.queue
+    # The parent's listener threads do not exist here and must not be stopped from here
+    _listeners.clear()
+    _child_listeners.clear()
+
+
+# Flush what is still queued when the process exits
+atexit.register(stop_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
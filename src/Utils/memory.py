@@ -0,0 +1,102 @@
+import os
+import sys
+import threading
+
+try:
+    import psutil
+except ImportError:  # optional, /proc is used on Linux without it
+    psutil = None
+
+# Uploads larger than this are spooled to disk and memory-mapped instead of held as bytes
+LARGE_FILE_BYTES = int(os.environ.get("PDF_SUMMARY_LARGE_FILE_MB", 50)) * 1024 * 1024
+# A run is stopped when the process holds more private memory than this (0 = no ceiling)
+MEMORY_LIMIT_BYTES = int(os.environ.get("PDF_SUMMARY_MEMORY_LIMIT_MB", 0)) * 1024 * 1024
+# How often the memory monitor samples the resident set size
+SAMPLE_INTERVAL = 0.05
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class MemoryLimitExceeded(Exception):
+    """Raised when a run goes over the configured memory ceiling."""
+
+
+def memory_usage():
+    """Returns (rss, private) bytes of this process, or (None, None) where they cannot be read.
+
+    `private` leaves out file-backed pages such as a memory-mapped PDF, which the
+    OS can drop and re-read at any time.
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/statm", "r") as f:
+                fields = f.read().split()
+            resident, shared = int(fields[1]), int(fields[2])
+            return resident * _PAGE_SIZE, (resident - shared) * _PAGE_SIZE
+        except (OSError, ValueError, IndexError):
+            pass
+    if psutil is not None:
+        rss = psutil.Process().memory_info().rss
+        return rss, rss
+    return None, None
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where it cannot be read."""
+    return memory_usage()[0]
+
+
+def check_memory_limit(limit_bytes=None):
+    """Raises MemoryLimitExceeded when the process holds more private memory than the ceiling."""
+    limit_bytes = MEMORY_LIMIT_BYTES if limit_bytes is None else limit_bytes
+    if not limit_bytes:
+        return
+    private = memory_usage()[1]
+    if private is not None and private > limit_bytes:
+        raise MemoryLimitExceeded(
+            f"Memory ceiling of {limit_bytes / 2**20:.0f} MB exceeded ({private / 2**20:.0f} MB in use). "
+            f"Select fewer pages or raise PDF_SUMMARY_MEMORY_LIMIT_MB."
+        )
+
+
+class MemoryMonitor:
+    """Samples memory use in a background thread and keeps the peaks.
+
+    Use as a context manager around one run; `peak_bytes` (RSS) and
+    `peak_private_bytes` are None where memory use cannot be read. Concurrent runs
+    share the process, so their peaks overlap.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start_bytes = None
+        self.peak_bytes = None
+        self.peak_private_bytes = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss, private = memory_usage()
+        if rss is None:
+            return
+        self.peak_bytes = max(rss, self.peak_bytes or 0)
+        self.peak_private_bytes = max(private, self.peak_private_bytes or 0)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.start_bytes = current_rss()
+        self._sample()
+        if self.start_bytes is not None:
+            self._thread = threading.Thread(target=self._run, name="memory-monitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+        return False
@@ -0,0 +1,141 @@
+import time
+import threading
+import traceback
+from .stub_model import StubModel
+
+# Model name that resolves to the local StubModel instead of LM Studio
+STUB_MODEL_NAME = "stub"
+# Handles unused for this long are dropped from the pool
+DEFAULT_IDLE_SECONDS = 15 * 60
+# A pooled handle is health-checked again when it was last checked this long ago
+DEFAULT_HEALTH_CHECK_SECONDS = 60
+# A failed warm-up is not retried on every rerun, only after this many seconds
+WARM_UP_RETRY_SECONDS = 30
+
+WARMING = "warming"
+READY = "ready"
+UNAVAILABLE = "unavailable"
+
+
+class PooledModel:
+    def __init__(self, handle):
+        self.handle = handle
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.last_checked = self.created_at
+
+
+class ModelPool:
+    """Process-wide pool of resolved LM Studio model handles, keyed by model name.
+
+    Resolving a model (`lms.llm(name)`) connects to the server and may load the
+    model; the pool pays for that once and hands out the same handle afterwards.
+    """
+
+    def __init__(self, logger, idle_seconds=DEFAULT_IDLE_SECONDS, health_check_seconds=DEFAULT_HEALTH_CHECK_SECONDS):
+        self.logger = logger
+        self.idle_seconds = idle_seconds
+        self.health_check_seconds = health_check_seconds
+        self._models = {}
+        self._status = {}
+        self._failed_at = {}
+        self._model_locks = {}
+        self._lock = threading.Lock()
+
+    def _model_lock(self, model_name):
+        with self._lock:
+            return self._model_locks.setdefault(model_name, threading.Lock())
+
+    def _resolve(self, model_name):
+        if model_name == STUB_MODEL_NAME:
+            return StubModel()
+        # The LM Studio SDK (and its HTTP/websocket stack) is imported with the first real model
+        import lmstudio as lms
+        return lms.llm(model_name)
+
+    def _is_healthy(self, pooled):
+        get_info = getattr(pooled.handle, "get_info", None)
+        if get_info is None:
+            return True
+        try:
+            get_info()
+            return True
+        except Exception as e:
+            self.logger.warning(f"[ModelPool] health check failed: {e}")
+            return False
+
+    def acquire(self, model_name):
+        """Returns a ready handle for `model_name`, resolving it only when needed."""
+        started_at = time.perf_counter()
+        self.evict_idle()
+        # Per-model lock: concurrent requests for a cold model resolve it only once
+        with self._model_lock(model_name):
+            pooled = self._models.get(model_name)
+            now = time.time()
+            if pooled is not None and now - pooled.last_checked > self.health_check_seconds:
+                if self._is_healthy(pooled):
+                    pooled.last_checked = now
+                else:
+                    pooled = None
+            source = "pooled"
+            if pooled is None:
+                self._status[model_name] = WARMING
+                try:
+                    pooled = PooledModel(self._resolve(model_name))
+                except Exception:
+                    self._status[model_name] = UNAVAILABLE
+                    self._failed_at[model_name] = time.time()
+                    raise
+                self._models[model_name] = pooled
+                source = "resolved"
+            pooled.last_used = now
+            self._status[model_name] = READY
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        self.logger.info(f"[ModelPool] '{model_name}' {source} in {elapsed_ms:.1f} ms (request setup overhead).")
+        return pooled.handle
+
+    def warm_up(self, model_name, background=True):
+        """Resolves (and so loads) a model ahead of the first request."""
+        with self._lock:
+            if model_name in self._models or self._status.get(model_name) == WARMING:
+                return
+            if time.time() - self._failed_at.get(model_name, 0) < WARM_UP_RETRY_SECONDS:
+                return
+            self._status[model_name] = WARMING
+
+        def run():
+            try:
+                self.acquire(model_name)
+                self.logger.info(f"[ModelPool] '{model_name}' warmed up.")
+            except Exception as e:
+                tb = traceback.format_exc()
+                self.logger.error(f"[ModelPool] warm-up of '{model_name}' failed: {e}\n{tb}")
+
+        if background:
+            threading.Thread(target=run, name=f"warm-up-{model_name}", daemon=True).start()
+        else:
+            run()
+
+    def status(self, model_name):
+        return self._status.get(model_name)
+
+    def evict_idle(self):
+        cutoff = time.time() - self.idle_seconds
+        with self._lock:
+            for model_name in [name for name, pooled in self._models.items() if pooled.last_used < cutoff]:
+                del self._models[model_name]
+                self._status.pop(model_name, None)
+                self.logger.info(f"[ModelPool] '{model_name}' evicted after being idle.")
+
+
+_model_pool = None
+_model_pool_lock = threading.Lock()
+
+
+def get_model_pool(logger):
+    """Returns the process-wide model pool shared by all Streamlit sessions."""
+    global _model_pool
+    with _model_pool_lock:
+        if _model_pool is None:
+            _model_pool = ModelPool(logger)
+        return _model_pool
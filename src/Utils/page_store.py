@@ -0,0 +1,152 @@
+import os
+import time
+import sqlite3
+import threading
+import traceback
+
+DEFAULT_STORE_PATH = os.path.join(".cache", "pages.sqlite3")
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+OK = "ok"
+EMPTY = "empty"
+ERROR = "error"
+
+# Bumped when the tables change; older stores are rebuilt since they only hold extracted text
+_SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_hash TEXT PRIMARY KEY,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    doc_hash TEXT NOT NULL,
+    page_index INTEGER NOT NULL,
+    extractor_version TEXT NOT NULL,
+    status TEXT NOT NULL,
+    text TEXT NOT NULL,
+    error TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (doc_hash, page_index, extractor_version)
+);
+"""
+
+
+class PageStore:
+    """Persistent per-page text store, keyed by document hash and 0-based page index.
+
+    Every page is stored with the extractor version and a status (ok, empty or
+    error), so empty and unreadable pages are not extracted again either. Pages of
+    different extractor versions are kept side by side; a new version makes the old
+    rows count as missing. The total text size is capped, evicting the least
+    recently used documents first.
+    """
+
+    def __init__(self, logger, path=DEFAULT_STORE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.logger = logger
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection shared by all threads, serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+            # Before version 2 a page only kept the rows of the last extractor version it was stored with
+            self._conn.executescript("DROP TABLE IF EXISTS pages; DROP TABLE IF EXISTS documents;")
+            self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+        self._conn.executescript(_SCHEMA)
+
+    def get_pages(self, doc_hash, page_indices, extractor_version):
+        """Returns {page_index: (text, error)} for the stored pages among `page_indices`."""
+        page_indices = list(page_indices)
+        try:
+            with self._lock, self._conn:
+                rows = []
+                # Stay below SQLite's limit on bound parameters
+                for start in range(0, len(page_indices), 500):
+                    batch = page_indices[start:start + 500]
+                    rows.extend(self._conn.execute(
+                        f"SELECT page_index, text, error FROM pages WHERE doc_hash = ? AND extractor_version = ? "
+                        f"AND page_index IN ({','.join('?' * len(batch))})",
+                        [doc_hash, extractor_version, *batch]
+                    ))
+                if rows:
+                    self._conn.execute("UPDATE documents SET last_used = ? WHERE doc_hash = ?", (time.time(), doc_hash))
+            return {page_index: (text, error) for page_index, text, error in rows}
+        except sqlite3.Error as e:
+            tb = traceback.format_exc()
+            self.logger.error(f"[PageStore] lookup failed: {e}\n{tb}")
+            return {}
+
+    def stored_versions(self, doc_hash):
+        """Returns the extractor versions of the stored pages of a document."""
+        try:
+            with self._lock:
+                rows = self._conn.execute("SELECT DISTINCT extractor_version FROM pages WHERE doc_hash = ?", (doc_hash,))
+                return {version for version, in rows}
+        except sqlite3.Error as e:
+            tb = traceback.format_exc()
+            self.logger.error(f"[PageStore] version lookup failed: {e}\n{tb}")
+            return set()
+
+    def put_pages(self, doc_hash, page_results, extractor_version):
+        """Stores (page_index, text, error) tuples as returned by `PdfUtils.extract_pages`."""
+        now = time.time()
+        rows = [
+            (doc_hash, i, extractor_version, ERROR if error else (OK if text else EMPTY), text, error, now)
+            for i, text, error in page_results
+        ]
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documents VALUES "
+                    "(?, (SELECT COALESCE(SUM(LENGTH(text)), 0) FROM pages WHERE doc_hash = ?), ?)",
+                    (doc_hash, doc_hash, now)
+                )
+                self._evict(keep=doc_hash)
+        except sqlite3.Error as e:
+            tb = traceback.format_exc()
+            self.logger.error(f"[PageStore] could not store pages: {e}\n{tb}")
+
+    def _evict(self, keep):
+        documents = self._conn.execute("SELECT doc_hash, bytes FROM documents ORDER BY last_used").fetchall()
+        total = sum(size for _, size in documents)
+        for doc_hash, size in documents:
+            if total <= self.max_bytes:
+                break
+            if doc_hash == keep:
+                continue
+            self._conn.execute("DELETE FROM pages WHERE doc_hash = ?", (doc_hash,))
+            self._conn.execute("DELETE FROM documents WHERE doc_hash = ?", (doc_hash,))
+            total -= size
+            self.logger.info(f"[PageStore] evicted {doc_hash[:12]} ({size} bytes of text).")
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages")
+            self._conn.execute("DELETE FROM documents")
+        self.logger.info("[PageStore] cleared.")
+
+    def stats(self):
+        with self._lock:
+            documents, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM documents").fetchone()
+            pages = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        return {"documents": documents, "pages": pages, "bytes": total}
+
+
+_page_store = None
+_page_store_lock = threading.Lock()
+
+
+def get_page_store(logger):
+    """Returns the process-wide page store shared by all Streamlit sessions."""
+    global _page_store
+    with _page_store_lock:
+        if _page_store is None:
+            _page_store = PageStore(logger)
+        return _page_store
@@ -1,55 +1,334 @@
-from PyPDF2 import PdfReader, PdfWriter
+import gc
 import os
+import time
+import threading
 import traceback
 from io import BytesIO
+from contextlib import contextmanager, ExitStack
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from .instrumentation import log_decorator, record
+from .memory import check_memory_limit, MemoryLimitExceeded
+from .extractors import (
+    extract_page_range, engine_version, get_engine_selector, file_source, SharedPdf, DEFAULT_ENGINE, FALLBACK_ENGINE
+)
+
+# Below this many pages the process pool start-up costs more than it saves
+PARALLEL_MIN_PAGES = 16
+# Each worker gets several smaller page ranges so uneven pages balance out
+TASKS_PER_WORKER = 4
+# A PDF read from a file is extracted with a fresh reader per this many pages,
+# so objects PyPDF2 caches (e.g. scanned page images) are released along the way
+LAZY_BATCH_PAGES = 32
+# Pages handed on together by `iter_pages`; small enough that the first ones arrive quickly
+STREAM_BATCH_PAGES = 4
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool():
+    # One pool per process, reused by every extraction and every session
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+        return _process_pool
+
+
+def _reset_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
 
-# --- Log Decorator ---
-def log_decorator(func):
-    def wrapper(self, *args, **kwargs):
-        self.logger.info(f"[{func.__name__}] start")
-        try:
-            result = func(self, *args, **kwargs)
-            self.logger.info(f"[{func.__name__}] finish")
-            return result
-        except Exception as e:
-            tb = traceback.format_exc()
-            self.logger.error(f"[{func.__name__}] ERROR: {e}\nTraceback:\n{tb}")
-            raise
-    return wrapper
+
+def submit_to_pool(func, *args, **kwargs):
+    """Queues `func(*args, **kwargs)` on the shared worker processes; returns its future.
+
+    A pool broken by a crashed worker is replaced once.
+    """
+    try:
+        return _get_process_pool().submit(func, *args, **kwargs)
+    except BrokenProcessPool:
+        _reset_process_pool()
+        return _get_process_pool().submit(func, *args, **kwargs)
+
+
+@contextmanager
+def shared_source(source):
+    """Yields what to send to the worker processes for `source` instead of the PDF bytes.
+
+    A path (a memory-mapped large upload) is used as it is. Bytes are copied once
+    into a shared memory block, which each worker copies out once per document,
+    rather than being pickled into every task; nothing is written to disk. The
+    block is released on exit.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        yield source
+        return
+    from multiprocessing import shared_memory
+    size = len(source)
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        block.buf[:size] = source
+        record(shared_bytes=size)
+        yield SharedPdf(block.name, size)
+    finally:
+        block.close()
+        block.unlink()
+
+
+def _open_reader(source):
+    # PyPDF2 is imported on first use, not when the app starts
+    from PyPDF2 import PdfReader
+    if isinstance(source, PdfReader):
+        return source
+    # PdfReader(path) would read the whole file; a read-only mapping only pages in what is used
+    return PdfReader(file_source(source))
 
 class PdfUtils:
-    def __init__(self, logger):
+    def __init__(self, logger, page_store=None, engine=DEFAULT_ENGINE):
         self.logger = logger
+        self.page_store = page_store
+        # Text extraction engine (see extractors.py), or "auto" to calibrate per document
+        self.engine = engine
+        # {"engine", "pages", "seconds", "pages_per_second"} of the last pages extracted
+        self.last_extraction = None
 
     @log_decorator
-    def extract_text_from_pdf(self, file_path):
-        self.logger.info(f"PDF text extraction started: {file_path}")
+    def extract_pages(self, source, page_indices=None, max_workers=None, reader=None, doc_hash=None):
+        """Extracts text page by page, in parallel for larger documents.
+
+        Args:
+            source: PDF file path or PDF bytes.
+            page_indices (list): 0-based pages to extract, all pages if None.
+            max_workers (int): Upper bound on worker processes, all cores if None.
+            reader (PdfReader): Already parsed document, reused by the in-process path.
+            doc_hash (str): Content hash of the PDF; with a page store, only pages
+                not stored for this hash yet are extracted.
+
+        Returns a list of (page_index, text, error) tuples in page order.
+        """
+        if page_indices is None:
+            reader = reader or _open_reader(source)
+            page_indices = list(range(len(reader.pages)))
+        page_indices = list(page_indices)
+        record(pages=len(page_indices))
+        if self.page_store is None or doc_hash is None:
+            engine = get_engine_selector(self.logger).select(doc_hash, source, page_indices, self.engine)
+            return self._extract(source, page_indices, max_workers, reader, engine, doc_hash)
+
+        stored_versions = self.page_store.stored_versions(doc_hash)
+        stored = self._fully_stored(doc_hash, page_indices, stored_versions)
+        if stored is not None:
+            record(stored_pages=len(page_indices))
+            self.logger.info(f"[PdfUtils] {len(page_indices)}/{len(page_indices)} pages from the page store, 0 extracted.")
+            return [(i, *stored[i]) for i in page_indices]
+        engine = get_engine_selector(self.logger).select(doc_hash, source, page_indices, self.engine, stored_versions)
+        version = engine_version(engine)
+        stored = self.page_store.get_pages(doc_hash, page_indices, version)
+        missing = [i for i in page_indices if i not in stored]
+        record(stored_pages=len(page_indices) - len(missing))
+        if missing:
+            extracted = self._extract(source, missing, max_workers, reader, engine, doc_hash)
+            self.page_store.put_pages(doc_hash, extracted, version)
+            stored.update({i: (text, error) for i, text, error in extracted})
+        self.logger.info(
+            f"[PdfUtils] {len(page_indices) - len(missing)}/{len(page_indices)} pages from the page store, "
+            f"{len(missing)} extracted."
+        )
+        return [(i, *stored[i]) for i in page_indices]
+
+    def _fully_stored(self, doc_hash, page_indices, stored_versions):
+        # Stored pages of one usable engine covering the whole request, so no engine
+        # has to be selected (nor calibrated) for it; None otherwise
+        if self.engine != "auto" or not stored_versions:
+            return None
+        for engine in get_engine_selector(self.logger).stored_engines(doc_hash, stored_versions):
+            stored = self.page_store.get_pages(doc_hash, page_indices, engine_version(engine))
+            if len(stored) == len(page_indices):
+                return stored
+        return None
+
+    def iter_pages(self, source, page_indices, max_workers=None, reader=None, doc_hash=None,
+                   batch_pages=STREAM_BATCH_PAGES):
+        """Extracts pages like `extract_pages`, but yields them in batches as soon as each batch is ready.
+
+        Batches of `batch_pages` pages come in page order as lists of (page_index,
+        text, error) tuples. For larger ranges every batch is queued on the worker
+        processes up front, so later pages are extracted while the caller works on
+        the first ones; otherwise each batch is extracted when it is asked for.
+        """
+        page_indices = list(page_indices)
+        use_store = self.page_store is not None and doc_hash is not None
+        stored_versions = self.page_store.stored_versions(doc_hash) if use_store else ()
+        engine = get_engine_selector(self.logger).select(doc_hash, source, page_indices, self.engine, stored_versions)
+        version = engine_version(engine)
+        stored = self.page_store.get_pages(doc_hash, page_indices, version) if use_store else {}
+        batches = [page_indices[i:i + batch_pages] for i in range(0, len(page_indices), batch_pages)]
+        missing = [[i for i in batch if i not in stored] for batch in batches]
+        missing_count = sum(len(batch) for batch in missing)
+        self.logger.info(
+            f"[PdfUtils] streaming {len(page_indices)} pages in {len(batches)} batches, "
+            f"{len(page_indices) - missing_count} from the page store."
+        )
+
+        start = time.perf_counter()
+        finished_at = []
+        futures = [None] * len(batches)
+        sharing = ExitStack()
+        workers = min(max_workers or os.cpu_count() or 1, os.cpu_count() or 1)
+        if workers > 1 and missing_count >= PARALLEL_MIN_PAGES:
+            shared = sharing.enter_context(shared_source(source))
+            pool = _get_process_pool()
+            for n, batch in enumerate(missing):
+                if batch:
+                    futures[n] = pool.submit(extract_page_range, engine, shared, batch)
+                    futures[n].add_done_callback(lambda _: finished_at.append(time.perf_counter()))
+        serial_seconds = 0.0
+        try:
+            for n, batch in enumerate(batches):
+                if missing[n]:
+                    extracted = None
+                    if futures[n] is not None:
+                        try:
+                            extracted = futures[n].result()
+                        except BrokenProcessPool as e:
+                            self.logger.error(f"Process pool failed, extracting the remaining pages serially: {e}")
+                            _reset_process_pool()
+                            futures = [None] * len(batches)
+                    if extracted is None:
+                        batch_start = time.perf_counter()
+                        extracted = self._extract_serial(source, missing[n], reader, engine)
+                        serial_seconds += time.perf_counter() - batch_start
+                    check_memory_limit()
+                    if use_store:
+                        self.page_store.put_pages(doc_hash, extracted, version)
+                    stored.update({i: (text, error) for i, text, error in extracted})
+                yield [(i, *stored[i]) for i in batch]
+        finally:
+            for future in futures:
+                if future is not None:
+                    future.cancel()
+            sharing.close()
+            if missing_count:
+                seconds = serial_seconds + (max(finished_at) - start if finished_at else 0.0)
+                self._report_extraction(engine, missing_count, seconds, doc_hash)
+
+    def _extract(self, source, page_indices, max_workers, reader, engine=FALLBACK_ENGINE, doc_hash=None):
+        start = time.perf_counter()
+        results = self._extract_pages(source, page_indices, max_workers, reader, engine)
+        self._report_extraction(engine, len(page_indices), time.perf_counter() - start, doc_hash)
+        return results
+
+    def _report_extraction(self, engine, pages, seconds, doc_hash):
+        self.last_extraction = {
+            "engine": engine, "pages": pages, "seconds": seconds, "pages_per_second": pages / max(seconds, 1e-9)
+        }
+        get_engine_selector(self.logger).report(doc_hash, engine, pages, seconds)
+        self.logger.info(
+            f"[PdfUtils] {pages} pages extracted with {engine} in {seconds:.2f}s "
+            f"({self.last_extraction['pages_per_second']:.0f} pages/s)."
+        )
+
+    def _extract_pages(self, source, page_indices, max_workers, reader, engine):
+        workers = min(max_workers or os.cpu_count() or 1, os.cpu_count() or 1)
+
+        if workers <= 1 or len(page_indices) < PARALLEL_MIN_PAGES:
+            return self._extract_serial(source, page_indices, reader, engine)
+
+        # Contiguous ranges keep each worker's reads local; results are reassembled in order
+        task_size = max(1, -(-len(page_indices) // (workers * TASKS_PER_WORKER)))
+        ranges = [page_indices[i:i + task_size] for i in range(0, len(page_indices), task_size)]
+        self.logger.info(f"Extracting {len(page_indices)} pages in {len(ranges)} ranges on {workers} workers.")
         try:
-            reader = PdfReader(file_path)
-            text = ""
-            for i, page in enumerate(reader.pages):
+            pool = _get_process_pool()
+            # The workers get a file path or a shared memory block instead of the PDF bytes
+            with shared_source(source) as shared:
+                futures = [pool.submit(extract_page_range, engine, shared, page_range) for page_range in ranges]
+                results = []
                 try:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                        self.logger.debug(f"Page {i} successfully read.")
-                    else:
-                        self.logger.warning(f"Page {i} is empty or unreadable.")
-                except Exception as e:
-                    self.logger.error(f"Error reading page {i}: {e}")
-            self.logger.info("PDF text extraction completed.")
-            return text
+                    for future in futures:
+                        results.extend(future.result())
+                        check_memory_limit()
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+            return results
+        except BrokenProcessPool as e:
+            self.logger.error(f"Process pool failed, falling back to serial extraction: {e}")
+            _reset_process_pool()
+            return self._extract_serial(source, page_indices, reader, engine)
+
+    def _extract_serial(self, source, page_indices, reader, engine):
+        # The parsed reader is only reused by the engine it belongs to
+        reader = reader if engine == "pypdf2" else None
+        if reader is not None or not isinstance(source, (str, os.PathLike)):
+            return extract_page_range(engine, reader or source, page_indices)
+        # Lazy mode for files: short-lived readers over the mapped file, checked against the memory ceiling
+        results = []
+        for start in range(0, len(page_indices), LAZY_BATCH_PAGES):
+            results.extend(extract_page_range(engine, source, page_indices[start:start + LAZY_BATCH_PAGES]))
+            # PyPDF2 readers are reference cycles; collect now so the batch's objects and mapping go away
+            gc.collect()
+            check_memory_limit()
+        return results
+
+    @log_decorator
+    def extract_page_texts(self, file_path, page_indices=None, max_workers=None, reader=None, doc_hash=None):
+        """Extracts the text of each page of a PDF, skipping empty or unreadable pages.
+
+        `file_path` may also be the PDF bytes, and `page_indices` limits extraction
+        to the selected (0-based) pages, so no split copy has to be written to disk.
+        """
+        source_name = f"<{len(file_path)} bytes in memory>" if isinstance(file_path, bytes) else file_path
+        self.logger.info(f"PDF text extraction started: {source_name}")
+        try:
+            page_results = self.extract_pages(
+                file_path, page_indices=page_indices, max_workers=max_workers, reader=reader, doc_hash=doc_hash
+            )
+            texts = []
+            empty_pages = []
+            for i, page_text, error in page_results:
+                if error:
+                    self.logger.error(f"Error reading page {i}: {error}")
+                elif page_text:
+                    texts.append(page_text)
+                else:
+                    empty_pages.append(i)
+            if empty_pages:
+                self.logger.warning(f"Pages {empty_pages} are empty or unreadable.")
+            record(chars=sum(len(page_text) for page_text in texts))
+            if isinstance(file_path, bytes):
+                record(bytes=len(file_path))
+            self.logger.info(f"PDF text extraction completed: {len(texts)}/{len(page_results)} pages with text.")
+            return texts
+        except MemoryLimitExceeded:
+            # Not a broken PDF; the caller reports it as it is
+            raise
         except Exception as e:
             tb = traceback.format_exc()
             self.logger.error(f"Could not read PDF: {e}\n{tb}")
             return None
 
+    def extract_text_from_pdf(self, file_path, page_indices=None, max_workers=None, reader=None):
+        """Extracts and joins the text of a PDF (see `extract_page_texts`)."""
+        texts = self.extract_page_texts(file_path, page_indices=page_indices, max_workers=max_workers, reader=reader)
+        if texts is None:
+            return None
+        # Join once instead of growing one string page by page
+        return "".join(page_text + "\n" for page_text in texts)
+
     class PdfSplitter:
         def __init__(self, input_path, selected_pages, logger):
             try:
                 self.logger = logger
                 self.input_path = input_path
                 self.selected_pages = selected_pages
+                from PyPDF2 import PdfWriter
                 self.reader = None
                 self.writer_selected = PdfWriter()
                 self.writer_rest = PdfWriter()
@@ -71,6 +350,8 @@ class PdfUtils:
             with open(self.input_path, "rb") as f:
                 pdf_data = f.read()
                 self.logger.info(f"{len(pdf_data)} bytes read.")
+            record(bytes=len(pdf_data))
+            from PyPDF2 import PdfReader
             self.reader = PdfReader(BytesIO(pdf_data))
             self.logger.info("PDF file successfully loaded into memory.")
             self.logger.info(f"Total page count: {len(self.reader.pages)}")
@@ -82,10 +363,11 @@ class PdfUtils:
             for page_num in range(len(self.reader.pages)):
                 if page_num in self.selected_pages:
                     self.writer_selected.add_page(self.reader.pages[page_num])
-                    self.logger.info(f"Selected page added: {page_num}")
+                    self.logger.debug(f"Selected page added: {page_num}")
                 else:
                     self.writer_rest.add_page(self.reader.pages[page_num])
-                    self.logger.info(f"Other page added: {page_num}")
+                    self.logger.debug(f"Other page added: {page_num}")
+            record(pages=len(self.reader.pages))
             self.logger.info("Page splitting completed.")
 
         @log_decorator
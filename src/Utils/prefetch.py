@@ -0,0 +1,235 @@
+import os
+import time
+import threading
+import traceback
+from contextlib import contextmanager
+from collections import Counter
+from concurrent.futures import wait
+
+from .pdf_util import submit_to_pool, shared_source
+from .page_store import get_page_store
+from .extractors import extract_page_range, engine_version, get_engine_selector, DEFAULT_ENGINE
+
+# Background extractions running at once across all sessions
+DEFAULT_PREFETCH_WORKERS = int(os.environ.get("PDF_SUMMARY_PREFETCH_WORKERS", 1))
+# Share of one core a background extraction may use; it sleeps in between batches for the rest
+DEFAULT_PREFETCH_CPU_SHARE = float(os.environ.get("PDF_SUMMARY_PREFETCH_CPU_SHARE", 0.5))
+# Pages extracted ahead per upload, nearest to the selection first
+DEFAULT_PREFETCH_MAX_PAGES = int(os.environ.get("PDF_SUMMARY_PREFETCH_MAX_PAGES", 1000))
+# Pages extracted together; each batch opens its own reader
+PREFETCH_BATCH_PAGES = 16
+# How often a prefetch waiting for its batch checks whether it was cancelled (seconds)
+CANCEL_POLL_SECONDS = 0.2
+# Finished prefetches whose status is kept
+MAX_FINISHED_TASKS = 64
+
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+
+def nearest_first(page_indices, focus):
+    """Orders 0-based `page_indices` by distance to the 0-based `focus` pages, later pages first on ties."""
+    if not focus:
+        return sorted(page_indices)
+    first, last = min(focus), max(focus)
+    return sorted(page_indices, key=lambda i: (max(first - i, i - last, 0), i < first, i))
+
+
+class PrefetchTask:
+    def __init__(self, file_id, document, focus, max_pages):
+        self.file_id = file_id
+        self.document = document
+        self.focus = focus
+        self.max_pages = max_pages
+        self.doc_hash = None
+        self.state = RUNNING
+        self.busy = False
+        self.stored_pages = 0
+        self.extracted_pages = 0
+        self.total_pages = min(document.page_count, max_pages)
+        self.cancel_event = threading.Event()
+
+
+class Prefetcher:
+    """Process-wide speculative text extraction of uploaded PDFs.
+
+    As soon as a PDF is uploaded its pages are extracted into the page store in
+    the background, nearest to the current page selection first, so "Start
+    Analysis" finds most of them already stored. The batches are extracted on
+    the shared worker processes, one at a time per upload, so the prefetch
+    threads only schedule them and hold the GIL for no more than that. At most
+    `max_workers` uploads are extracted at once and each uses at most
+    `cpu_share` of a worker. An
+    analysis of the same document suspends the prefetch of it (after the batch
+    in progress is stored) instead of extracting the same pages twice.
+    """
+
+    def __init__(self, logger, page_store, max_workers=DEFAULT_PREFETCH_WORKERS, cpu_share=DEFAULT_PREFETCH_CPU_SHARE,
+                 max_pages=DEFAULT_PREFETCH_MAX_PAGES, engine=DEFAULT_ENGINE):
+        self.logger = logger
+        self.page_store = page_store
+        # Same engine setting as the analyses, so they find the prefetched pages under its version
+        self.engine = engine
+        self.cpu_share = min(max(cpu_share, 0.05), 1.0)
+        self.max_pages = max_pages
+        self._slots = threading.BoundedSemaphore(max(1, max_workers))
+        self._cond = threading.Condition()
+        self._tasks = {}
+        self._suspended = Counter()
+
+    def start(self, file_id, document, selected_pages=None):
+        """Starts (or refocuses) the prefetch of an upload; `selected_pages` are 1-based."""
+        focus = [page - 1 for page in selected_pages or []]
+        with self._cond:
+            task = self._tasks.get(file_id)
+            if task is not None:
+                task.focus = focus
+                return task
+            finished = [key for key, other in self._tasks.items() if other.state != RUNNING]
+            for key in finished[:max(0, len(finished) - MAX_FINISHED_TASKS + 1)]:
+                del self._tasks[key]
+            task = self._tasks[file_id] = PrefetchTask(file_id, document, focus, self.max_pages)
+        threading.Thread(target=self._run, args=(task,), name=f"prefetch-{file_id}", daemon=True).start()
+        return task
+
+    def cancel(self, file_id):
+        """Stops the prefetch of an upload that is gone (e.g. the user picked another file)."""
+        with self._cond:
+            task = self._tasks.pop(file_id, None)
+        if task is not None and task.state == RUNNING:
+            task.cancel_event.set()
+            self.logger.info(f"[Prefetcher] cancelled prefetch of {file_id}.")
+
+    def status(self, file_id):
+        """Returns {"state", "pages", "total_pages", "extracted_pages"} of an upload, or None."""
+        with self._cond:
+            task = self._tasks.get(file_id)
+            if task is None:
+                return None
+            return {
+                "state": task.state,
+                "pages": task.stored_pages + task.extracted_pages,
+                "total_pages": task.total_pages,
+                "extracted_pages": task.extracted_pages
+            }
+
+    @contextmanager
+    def suspend(self, doc_hash):
+        """Pauses the prefetch of a document while the caller extracts it itself.
+
+        Waits for the batch in progress, so its pages are in the page store when
+        the caller looks them up.
+        """
+        with self._cond:
+            self._suspended[doc_hash] += 1
+            while any(task.busy and task.doc_hash == doc_hash for task in self._tasks.values()):
+                self._cond.wait()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._suspended[doc_hash] -= 1
+                if not self._suspended[doc_hash]:
+                    del self._suspended[doc_hash]
+                self._cond.notify_all()
+
+    def _run(self, task):
+        try:
+            with self._slots:
+                self._prefetch(task)
+            task.state = CANCELLED if task.cancel_event.is_set() else DONE
+            self.logger.info(
+                f"[Prefetcher] {task.file_id} {task.state}: {task.extracted_pages} pages extracted, "
+                f"{task.stored_pages} already stored."
+            )
+        except Exception as e:
+            task.state = FAILED
+            tb = traceback.format_exc()
+            self.logger.error(f"[Prefetcher] prefetch of {task.file_id} failed: {e}\n{tb}")
+        finally:
+            # The upload may be gone from its session already; do not keep its bytes alive
+            task.document = None
+            with self._cond:
+                task.busy = False
+                self._cond.notify_all()
+
+    def _prefetch(self, task):
+        if task.cancel_event.is_set():
+            return
+        document = task.document
+        # Hashing a large upload takes a while too, so it happens here rather than on the next click
+        task.doc_hash = document.doc_hash
+        # The workers read one shared copy instead of receiving the PDF bytes with every batch
+        with shared_source(document.source) as source:
+            self._prefetch_pages(task, source, document.page_count)
+
+    def _prefetch_pages(self, task, source, page_count):
+        page_indices = list(range(page_count))
+        selector = get_engine_selector(self.logger)
+        # Calibrates the engine for the whole document once, as a large analysis would
+        engine = selector.select(
+            task.doc_hash, source, page_indices, self.engine, self.page_store.stored_versions(task.doc_hash),
+            submit=submit_to_pool
+        )
+        version = engine_version(engine)
+        stored = set(self.page_store.get_pages(task.doc_hash, page_indices, version))
+        remaining = [i for i in page_indices if i not in stored]
+        task.stored_pages = min(len(stored), task.total_pages)
+        budget = task.total_pages - task.stored_pages
+        while remaining and budget > 0:
+            with self._cond:
+                while self._suspended[task.doc_hash] and not task.cancel_event.is_set():
+                    self._cond.wait(0.5)
+                if task.cancel_event.is_set():
+                    return
+                # The selection may have moved since the last batch
+                batch = sorted(nearest_first(remaining, task.focus)[:min(PREFETCH_BATCH_PAGES, budget)])
+                task.busy = True
+            started = time.perf_counter()
+            try:
+                # An analysis may have stored some of these pages while the prefetch was suspended
+                stored = self.page_store.get_pages(task.doc_hash, batch, version)
+                missing = [i for i in batch if i not in stored]
+                extracted = self._extract_batch(task, engine, source, missing) if missing else []
+                if extracted is None:
+                    return
+                self.page_store.put_pages(task.doc_hash, extracted, version)
+            finally:
+                with self._cond:
+                    task.busy = False
+                    self._cond.notify_all()
+            elapsed = time.perf_counter() - started
+            if missing:
+                selector.report(task.doc_hash, engine, len(missing), elapsed)
+            done = set(batch)
+            remaining = [i for i in remaining if i not in done]
+            task.extracted_pages += len(missing)
+            task.stored_pages += len(batch) - len(missing)
+            budget -= len(batch)
+            # Leaves the rest of the core to the sessions in the foreground
+            task.cancel_event.wait(elapsed * (1 - self.cpu_share) / self.cpu_share)
+
+    @staticmethod
+    def _extract_batch(task, engine, source, batch):
+        # Extracts one batch on a worker process; None if the prefetch was cancelled meanwhile
+        future = submit_to_pool(extract_page_range, engine, source, batch)
+        while not wait([future], timeout=CANCEL_POLL_SECONDS).done:
+            if task.cancel_event.is_set():
+                future.cancel()
+                return None
+        return future.result()
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher(logger):
+    """Returns the process-wide prefetcher shared by all Streamlit sessions."""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher(logger, get_page_store(logger))
+        return _prefetcher
@@ -0,0 +1,65 @@
+import os
+import json
+import threading
+
+
+class ResourceCache:
+    """Process-wide cache of static files (prompt templates, ...), parsed once per version.
+
+    Every read compares the file's mtime and size with the cached copy, so an
+    edited file is picked up on the next run without restarting the app. The
+    parsed value is shared by all callers and must not be modified.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._loads = 0
+
+    def load(self, path, parse):
+        """Returns `parse(file)` of `path`, read again only after the file changed."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        key = (path, parse)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._hits += 1
+                return entry[1]
+        with open(path, "r", encoding="utf-8") as f:
+            value = parse(f)
+        with self._lock:
+            self._entries[key] = (signature, value)
+            self._loads += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"files": len(self._entries), "hits": self._hits, "loads": self._loads}
+
+
+_resource_cache = ResourceCache()
+
+
+def get_resource_cache():
+    return _resource_cache
+
+
+def load_json(path):
+    """Parsed JSON of a static file, cached until the file changes."""
+    return _resource_cache.load(path, json.load)
+
+
+def load_text(path):
+    """Contents of a static text file, cached until the file changes."""
+    return _resource_cache.load(path, _read)
+
+
+def _read(f):
+    return f.read()
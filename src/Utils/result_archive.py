@@ -0,0 +1,216 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import traceback
+
+DEFAULT_ARCHIVE_PATH = os.path.join(".cache", "archive.sqlite3")
+# Search results returned per query
+DEFAULT_SEARCH_LIMIT = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    file_name TEXT NOT NULL,
+    doc_hash TEXT NOT NULL,
+    pages TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_key TEXT NOT NULL,
+    title TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    keywords TEXT NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_created ON results (created);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    client_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_client ON messages (client_id, id);
+"""
+
+# Full-text index over title, summary and keywords, kept in sync with `results` by triggers
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(
+    title, summary, keywords, content='results', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS results_ai AFTER INSERT ON results BEGIN
+    INSERT INTO results_fts (rowid, title, summary, keywords) VALUES (new.id, new.title, new.summary, new.keywords);
+END;
+CREATE TRIGGER IF NOT EXISTS results_ad AFTER DELETE ON results BEGIN
+    INSERT INTO results_fts (results_fts, rowid, title, summary, keywords)
+    VALUES ('delete', old.id, old.title, old.summary, old.keywords);
+END;
+"""
+
+_SEARCH_COLUMNS = "r.id, r.created, r.file_name, r.pages, r.model, r.prompt_key, r.title"
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def _strings(value):
+    # All texts of a JSON value, depth first
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+def searchable_fields(result):
+    """Returns (title, summary, keywords) texts of any analysis result.
+
+    Results without a summary field (e.g. keywords or Q&A extraction) are
+    indexed with all their other texts as the summary.
+    """
+    title = result.get("title") if isinstance(result.get("title"), str) else ""
+    keywords = [keyword for field in ("keywords", "topics") for keyword in _strings(result.get(field))]
+    if isinstance(result.get("summary"), str):
+        summary = result["summary"]
+    else:
+        summary = " ".join(
+            text for field, value in result.items() if field not in ("title", "keywords", "topics") for text in _strings(value)
+        )
+    return title, summary, ", ".join(keywords)
+
+
+class ResultArchive:
+    """SQLite archive of every analysis result and of chat messages moved out of the session.
+
+    Results are searchable by title, summary and keywords through an FTS5 index
+    (plain LIKE matching where SQLite is built without FTS5).
+    """
+
+    def __init__(self, logger, path=DEFAULT_ARCHIVE_PATH):
+        self.logger = logger
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection shared by all threads, serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        try:
+            self._conn.executescript(_FTS_SCHEMA)
+            self.full_text = True
+        except sqlite3.OperationalError as e:
+            self.full_text = False
+            self.logger.warning(f"[ResultArchive] FTS5 unavailable, searching with LIKE: {e}")
+
+    def add_result(self, result, file_name, doc_hash, pages, model, prompt_key):
+        """Archives one analysis result; returns its id, or None if it could not be stored."""
+        title, summary, keywords = searchable_fields(result)
+        try:
+            with self._lock, self._conn:
+                cursor = self._conn.execute(
+                    "INSERT INTO results (created, file_name, doc_hash, pages, model, prompt_key, title, summary, keywords, result) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (time.time(), file_name, doc_hash, _page_ranges(pages), model, prompt_key, title, summary, keywords,
+                     json.dumps(result, ensure_ascii=False))
+                )
+            return cursor.lastrowid
+        except sqlite3.Error as e:
+            tb = traceback.format_exc()
+            self.logger.error(f"[ResultArchive] could not archive result: {e}\n{tb}")
+            return None
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT, offset=0):
+        """Returns archived results matching every word of `query` (best match first), newest first without a query."""
+        words = _WORD_PATTERN.findall(query or "")
+        with self._lock:
+            if not words:
+                cursor = self._conn.execute(
+                    f"SELECT {_SEARCH_COLUMNS}, substr(r.summary, 1, 160) FROM results r "
+                    f"ORDER BY r.created DESC LIMIT ? OFFSET ?", (limit, offset)
+                )
+            elif self.full_text:
+                # Every word as a quoted prefix term, so user input is never parsed as FTS syntax
+                match = " ".join(f'"{word}"*' for word in words)
+                cursor = self._conn.execute(
+                    f"SELECT {_SEARCH_COLUMNS}, snippet(results_fts, 1, '**', '**', '…', 24) FROM results_fts "
+                    f"JOIN results r ON r.id = results_fts.rowid WHERE results_fts MATCH ? "
+                    f"ORDER BY bm25(results_fts, 10.0, 1.0, 5.0) LIMIT ? OFFSET ?", (match, limit, offset)
+                )
+            else:
+                condition = " AND ".join("(r.title || ' ' || r.summary || ' ' || r.keywords) LIKE ?" for _ in words)
+                cursor = self._conn.execute(
+                    f"SELECT {_SEARCH_COLUMNS}, substr(r.summary, 1, 160) FROM results r WHERE {condition} "
+                    f"ORDER BY r.created DESC LIMIT ? OFFSET ?", [f"%{word}%" for word in words] + [limit, offset]
+                )
+            rows = cursor.fetchall()
+        columns = ("id", "created", "file_name", "pages", "model", "prompt_key", "title", "snippet")
+        return [dict(zip(columns, row)) for row in rows]
+
+    def get_result(self, result_id):
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM results WHERE id = ?", (result_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add_messages(self, client_id, messages):
+        """Stores chat messages (oldest first) that no longer fit into the session."""
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT INTO messages (client_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+                    [(client_id, m["role"], m["content"], m["timestamp"]) for m in messages]
+                )
+        except sqlite3.Error as e:
+            tb = traceback.format_exc()
+            self.logger.error(f"[ResultArchive] could not archive messages: {e}\n{tb}")
+
+    def count_messages(self, client_id):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM messages WHERE client_id = ?", (client_id,)).fetchone()[0]
+
+    def get_messages(self, client_id, offset, limit):
+        """Archived messages of one client in chat order, `offset` counted from the oldest."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content, timestamp FROM messages WHERE client_id = ? ORDER BY id LIMIT ? OFFSET ?",
+                (client_id, limit, offset)
+            ).fetchall()
+        return [{"role": role, "content": content, "timestamp": timestamp} for role, content, timestamp in rows]
+
+    def clear_messages(self, client_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages WHERE client_id = ?", (client_id,))
+
+    def stats(self):
+        with self._lock:
+            results = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            messages = self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        return {"results": results, "messages": messages}
+
+
+def _page_ranges(pages):
+    # [1, 2, 3, 7] -> "1-3, 7"
+    ranges = []
+    for page in sorted(pages):
+        if ranges and page == ranges[-1][1] + 1:
+            ranges[-1][1] = page
+        else:
+            ranges.append([page, page])
+    return ", ".join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+
+_result_archive = None
+_result_archive_lock = threading.Lock()
+
+
+def get_result_archive(logger):
+    """Returns the process-wide result archive shared by all Streamlit sessions."""
+    global _result_archive
+    with _result_archive_lock:
+        if _result_archive is None:
+            _result_archive = ResultArchive(logger)
+        return _result_archive
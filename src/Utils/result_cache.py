@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import traceback
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "results")
+DEFAULT_MEMORY_ENTRIES = 64
+DEFAULT_DISK_LIMIT_BYTES = 50 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResultCache:
+    """Content-addressed cache for pipeline results.
+
+    Entries live in an in-memory LRU and are persisted as JSON files on disk,
+    where a total size cap and a TTL are enforced. The TTL counts from the
+    `created` time stored in each entry; a file's mtime is its last use and
+    only orders the eviction. The size and dates of the files are kept in
+    memory once the directory has been read, so `stats()` does not touch it.
+    """
+
+    def __init__(self, logger, cache_dir=DEFAULT_CACHE_DIR, max_memory_entries=DEFAULT_MEMORY_ENTRIES,
+                 max_disk_bytes=DEFAULT_DISK_LIMIT_BYTES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.logger = logger
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        # {key: [size, last use, created]} of the files on disk, None until the directory is read
+        self._disk = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(pdf_hash, selected_pages, model_name, prompt_key, prompt_template, options=None):
+        payload = {
+            "pdf": pdf_hash,
+            "pages": list(selected_pages),
+            "model": model_name,
+            "prompt_key": prompt_key,
+            "prompt": hash_bytes(prompt_template.encode("utf-8")),
+            "options": options or {}
+        }
+        return hash_bytes(json.dumps(payload, sort_keys=True).encode("utf-8"))
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _is_expired(self, created):
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and self._is_expired(entry["created"]):
+                del self._memory[key]
+                entry = None
+            if entry is None:
+                entry = self._read_disk(key)
+                if entry:
+                    self._remember(key, entry)
+            else:
+                self._memory.move_to_end(key)
+
+            if entry is None:
+                self.misses += 1
+                self.logger.info(f"[ResultCache] miss: {key[:12]}")
+                return None
+            self.hits += 1
+            self.logger.info(f"[ResultCache] hit: {key[:12]}")
+            return entry["result"]
+
+    def put(self, key, result):
+        entry = {"created": time.time(), "result": result}
+        with self._lock:
+            self._remember(key, entry)
+            self._write_disk(key, entry)
+
+    def invalidate(self, key=None):
+        """Drops one entry, or the whole cache when no key is given."""
+        with self._lock:
+            if key is not None:
+                self._memory.pop(key, None)
+                self._disk_index().pop(key, None)
+                paths = [self._path(key)]
+            else:
+                self._memory.clear()
+                names = os.listdir(self.cache_dir) if os.path.isdir(self.cache_dir) else []
+                paths = [os.path.join(self.cache_dir, name) for name in names if name.endswith(".json")]
+                self._disk = {}
+            for path in paths:
+                self._unlink(path)
+            self.logger.info(f"[ResultCache] invalidated {len(paths)} entries.")
+
+    def stats(self):
+        with self._lock:
+            disk = self._disk_index()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "disk_entries": len(disk),
+                "disk_bytes": sum(size for size, _, _ in disk.values())
+            }
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        # Files written by another process (e.g. the batch CLI) are not in the index yet
+        if key not in self._disk_index() and not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if self._is_expired(entry["created"]):
+                self._drop(key)
+                return None
+            # Refresh mtime so disk eviction follows least recent use; the TTL keeps counting from "created"
+            os.utime(path)
+            stat = os.stat(path)
+            self._disk[key] = [stat.st_size, stat.st_mtime, entry["created"]]
+            return entry
+        except FileNotFoundError:
+            self._disk.pop(key, None)
+            return None
+        except Exception as e:
+            self.logger.warning(f"[ResultCache] unreadable entry {path} removed: {e}")
+            self._drop(key)
+            return None
+
+    def _write_disk(self, key, entry):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+            stat = os.stat(self._path(key))
+            self._disk_index()[key] = [stat.st_size, stat.st_mtime, entry["created"]]
+            self._enforce_disk_limit()
+        except Exception as e:
+            tb = traceback.format_exc()
+            self.logger.error(f"[ResultCache] could not persist entry: {e}\n{tb}")
+
+    def _disk_index(self):
+        # Reads the directory once: size, mtime and stored "created" time of every entry
+        if self._disk is not None:
+            return self._disk
+        self._disk = {}
+        names = os.listdir(self.cache_dir) if os.path.isdir(self.cache_dir) else []
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+                with open(path, "r", encoding="utf-8") as f:
+                    created = json.load(f)["created"]
+            except Exception as e:
+                self.logger.warning(f"[ResultCache] unreadable entry {path} removed: {e}")
+                self._unlink(path)
+                continue
+            self._disk[name[:-len(".json")]] = [stat.st_size, stat.st_mtime, created]
+        return self._disk
+
+    def _drop(self, key):
+        self._disk_index().pop(key, None)
+        self._unlink(self._path(key))
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def _enforce_disk_limit(self):
+        disk = self._disk_index()
+        total = sum(size for size, _, _ in disk.values())
+        # Least recently used first
+        for key, (size, _, created) in sorted(disk.items(), key=lambda item: item[1][1]):
+            if total <= self.max_disk_bytes and not self._is_expired(created):
+                continue
+            self._drop(key)
+            total -= size
+            self.logger.info(f"[ResultCache] evicted from disk: {key}.json")
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache(logger):
+    """Returns the process-wide cache shared by all Streamlit sessions."""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(logger)
+        return _result_cache
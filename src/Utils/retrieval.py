@@ -0,0 +1,156 @@
+import re
+import threading
+from collections import OrderedDict
+
+from .instrumentation import log_decorator, record
+
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.5
+BM25_B = 0.75
+# How many chunks are sent to the model for one question
+DEFAULT_TOP_K = 4
+# Pages longer than this are indexed as several chunks, so one long page does not crowd out the rest
+MAX_CHUNK_CHARS = 3000
+# Indexes kept in memory, least recently used are dropped first
+DEFAULT_MAX_INDEXES = 8
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def page_chunks(page_texts, max_chars=MAX_CHUNK_CHARS):
+    """Splits {page_number: text} into (page_number, text) chunks on line boundaries."""
+    chunks = []
+    for page_number, text in page_texts.items():
+        current = ""
+        for line in text.splitlines(keepends=True):
+            if current and len(current) + len(line) > max_chars:
+                chunks.append((page_number, current))
+                current = ""
+            current += line
+        if current.strip():
+            chunks.append((page_number, current))
+    return chunks
+
+
+class BM25Index:
+    """In-memory BM25 index over page-level chunks.
+
+    The term matrix is stored column by column (one posting list per term) in
+    three flat NumPy arrays, so a query only touches the postings of its own
+    terms.
+    """
+
+    def __init__(self, chunks, k1=BM25_K1, b=BM25_B):
+        # NumPy is imported with the first follow-up question, not when the app starts
+        import numpy as np
+        self.chunks = list(chunks)
+        self.k1 = k1
+        self.b = b
+        vocabulary = {}
+        term_ids = []
+        chunk_ids = []
+        lengths = []
+        for chunk_id, (_, text) in enumerate(self.chunks):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            ids = [vocabulary.setdefault(token, len(vocabulary)) for token in tokens]
+            term_ids.extend(ids)
+            chunk_ids.extend([chunk_id] * len(ids))
+        self.vocabulary = vocabulary
+        self.chunk_lengths = np.asarray(lengths, dtype=np.float32)
+
+        # (term, chunk) pairs sorted by term, then collapsed into posting lists with counts
+        stride = max(len(self.chunks), 1)
+        pairs = np.asarray(term_ids, dtype=np.int64) * stride + np.asarray(chunk_ids, dtype=np.int64)
+        pairs, counts = np.unique(pairs, return_counts=True)
+        posting_terms = pairs // stride
+        self.posting_chunks = (pairs % stride).astype(np.int32)
+        self.posting_counts = counts.astype(np.float32)
+        self.term_offsets = np.searchsorted(posting_terms, np.arange(len(vocabulary) + 1)).astype(np.int64)
+
+        document_frequency = np.diff(self.term_offsets).astype(np.float32)
+        self.idf = np.log(1.0 + (len(self.chunks) - document_frequency + 0.5) / (document_frequency + 0.5))
+        average_length = self.chunk_lengths.mean() if len(self.chunks) else 0.0
+        self._length_norm = self.k1 * (1.0 - self.b + self.b * self.chunk_lengths / max(average_length, 1.0))
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def scores(self, query):
+        import numpy as np
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            chunk_ids = self.posting_chunks[start:end]
+            counts = self.posting_counts[start:end]
+            scores[chunk_ids] += self.idf[term_id] * counts * (self.k1 + 1) / (counts + self._length_norm[chunk_ids])
+        return scores
+
+    def search(self, query, top_k=DEFAULT_TOP_K):
+        """Returns up to `top_k` (page_number, text, score) tuples, best match first."""
+        import numpy as np
+        scores = self.scores(query)
+        top_k = min(top_k, int(np.count_nonzero(scores)))
+        if top_k <= 0:
+            return []
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(*self.chunks[i], float(scores[i])) for i in best]
+
+
+class RetrievalIndexCache:
+    """Keeps the BM25 index of recently questioned documents, keyed by document hash and pages."""
+
+    def __init__(self, logger, max_indexes=DEFAULT_MAX_INDEXES):
+        self.logger = logger
+        self.max_indexes = max_indexes
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(doc_hash, page_numbers):
+        return doc_hash, tuple(page_numbers)
+
+    @log_decorator
+    def get_or_build(self, doc_hash, page_numbers, load_page_texts):
+        """Returns the cached index, or builds one from `load_page_texts()` ({page_number: text})."""
+        key = self.make_key(doc_hash, page_numbers)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                record(index_hit=1)
+                return index
+
+        index = BM25Index(page_chunks(load_page_texts()))
+        record(index_hit=0, chunks=len(index), terms=len(index.vocabulary))
+        self.logger.info(f"[RetrievalIndexCache] indexed {doc_hash[:12]}: {len(index)} chunks, {len(index.vocabulary)} terms.")
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+
+_index_cache = None
+_index_cache_lock = threading.Lock()
+
+
+def get_retrieval_index_cache(logger):
+    """Returns the process-wide index cache shared by all Streamlit sessions."""
+    global _index_cache
+    with _index_cache_lock:
+        if _index_cache is None:
+            _index_cache = RetrievalIndexCache(logger)
+        return _index_cache
@@ -0,0 +1,245 @@
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+
+from .instrumentation import record, observe
+
+# How many model calls may run at the same time across all sessions
+DEFAULT_MAX_CONCURRENT_CALLS = int(os.environ.get("PDF_SUMMARY_MAX_MODEL_CALLS", 2))
+# Minimum seconds between two queue position messages of one caller
+QUEUE_NOTICE_INTERVAL = 5.0
+# Waiting calls check their cancel event this often
+WAIT_POLL_SECONDS = 0.2
+
+_current_caller = contextvars.ContextVar("model_caller", default=None)
+
+
+class AnalysisCancelled(Exception):
+    """Raised when the user cancels a running analysis."""
+
+
+class Caller:
+    """Who is waiting for the model: a client id, where to report queue positions and a cancel event."""
+
+    def __init__(self, client_id, notify=None, cancel_event=None):
+        self.client_id = client_id
+        self.notify = notify
+        self.cancel_event = cancel_event
+        self.last_notice = 0.0
+
+
+@contextmanager
+def caller_context(client_id, notify=None, cancel_event=None):
+    """Model calls made inside (also from worker threads started with `submit_in_context`) belong to this caller."""
+    token = _current_caller.set(Caller(client_id, notify, cancel_event))
+    try:
+        yield
+    finally:
+        _current_caller.reset(token)
+
+
+class _Ticket:
+    def __init__(self, caller):
+        self.caller = caller
+        self.granted = False
+
+
+class _Flight:
+    # One model call in progress and everyone waiting for its result
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.abandoned = False
+        self.token_callbacks = []
+
+
+class ModelScheduler:
+    """Process-wide admission control and single-flight coalescing for model calls.
+
+    At most `max_concurrent` calls run at once. Waiting calls are served round
+    robin by client, so a long map-reduce of one user does not hold everyone
+    else back, and each waiting caller is told its position in the queue.
+    A call with the same model and prompt as one already in flight does not go
+    to the model at all: it waits for that call and gets the same response
+    (including its streamed tokens). If the running call is cancelled, the
+    first waiting caller runs it again.
+    """
+
+    def __init__(self, logger, max_concurrent=DEFAULT_MAX_CONCURRENT_CALLS):
+        self.logger = logger
+        self.max_concurrent = max(1, max_concurrent)
+        self._cond = threading.Condition()
+        self._running = 0
+        self._waiting = OrderedDict()
+        self._flights = {}
+        self._coalesced = 0
+        self._calls = 0
+
+    def set_max_concurrent(self, max_concurrent):
+        with self._cond:
+            self.max_concurrent = max(1, max_concurrent)
+            self._grant()
+            self._cond.notify_all()
+
+    def call(self, key, func, token_callback=None, cancel_event=None):
+        """Runs `func(token_callback)` once for every caller that asks for the same `key` meanwhile.
+
+        `key` identifies the request (model and prompt); `token_callback` receives
+        the streamed text of whoever actually runs the call.
+        """
+        caller = _current_caller.get()
+        cancel_event = cancel_event or (caller.cancel_event if caller else None)
+        while True:
+            with self._cond:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                elif token_callback:
+                    flight.token_callbacks.append(token_callback)
+            if leader:
+                return self._lead(key, flight, func, token_callback, cancel_event)
+            self.logger.info("[ModelScheduler] identical request in flight, waiting for its response.")
+            while not flight.done.wait(WAIT_POLL_SECONDS):
+                if cancel_event is not None and cancel_event.is_set():
+                    with self._cond:
+                        if token_callback in flight.token_callbacks:
+                            flight.token_callbacks.remove(token_callback)
+                    raise AnalysisCancelled("Analysis cancelled by user.")
+            if not flight.abandoned:
+                with self._cond:
+                    self._coalesced += 1
+                record(coalesced_calls=1)
+                return flight.result
+            # The caller that ran it was cancelled; this one takes over
+
+    def _lead(self, key, flight, func, token_callback, cancel_event):
+        def fan_out(text, stats):
+            if token_callback:
+                token_callback(text, stats)
+            for callback in list(flight.token_callbacks):
+                callback(text, stats)
+
+        try:
+            with self.slot(cancel_event):
+                flight.result = func(fan_out)
+            return flight.result
+        except BaseException:
+            flight.abandoned = True
+            raise
+        finally:
+            with self._cond:
+                del self._flights[key]
+                self._calls += 1
+            flight.done.set()
+
+    @contextmanager
+    def slot(self, cancel_event=None):
+        """Holds one of the `max_concurrent` model slots, waiting in the fair queue if none is free."""
+        self._acquire(cancel_event)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._grant()
+                self._cond.notify_all()
+
+    def _acquire(self, cancel_event):
+        caller = _current_caller.get() or Caller(None)
+        with self._cond:
+            if self._running < self.max_concurrent and not self._waiting:
+                self._running += 1
+                return
+            ticket = _Ticket(caller)
+            self._waiting.setdefault(caller.client_id, deque()).append(ticket)
+        started = time.perf_counter()
+        reported = None
+        while True:
+            with self._cond:
+                if ticket.granted:
+                    break
+                if cancel_event is not None and cancel_event.is_set():
+                    self._remove(ticket)
+                    raise AnalysisCancelled("Analysis cancelled by user.")
+                position = self._position(ticket)
+                now = time.time()
+                if not (caller.notify and position != reported and now - caller.last_notice >= QUEUE_NOTICE_INTERVAL):
+                    self._cond.wait(WAIT_POLL_SECONDS)
+                    continue
+                caller.last_notice = now
+                reported = position
+                running = self._running
+            # The status callback may be slow (it renders the UI); no other caller waits for it
+            try:
+                caller.notify(
+                    "bot", f"⏳ The model is busy ({running} call(s) running), your request is number {position} in the queue..."
+                )
+            except BaseException:
+                self._leave(ticket)
+                raise
+        waited = time.perf_counter() - started
+        observe("ModelScheduler.queue_wait", waited)
+        self.logger.info(f"[ModelScheduler] model slot granted after {waited:.2f}s in the queue.")
+
+    def _grant(self):
+        # Round robin: the client served last goes to the back of the line
+        while self._running < self.max_concurrent and self._waiting:
+            client_id, queue = next(iter(self._waiting.items()))
+            queue.popleft().granted = True
+            self._running += 1
+            if queue:
+                self._waiting.move_to_end(client_id)
+            else:
+                del self._waiting[client_id]
+
+    def _position(self, ticket):
+        # 1-based place in the order _grant() will serve the waiting tickets
+        clients = list(self._waiting)
+        own_client = ticket.caller.client_id
+        index = self._waiting[own_client].index(ticket)
+        ahead = sum(min(len(self._waiting[client_id]), index) for client_id in clients)
+        ahead += sum(1 for client_id in clients[:clients.index(own_client)] if len(self._waiting[client_id]) > index)
+        return ahead + 1
+
+    def _remove(self, ticket):
+        queue = self._waiting[ticket.caller.client_id]
+        queue.remove(ticket)
+        if not queue:
+            del self._waiting[ticket.caller.client_id]
+
+    def _leave(self, ticket):
+        # Gives up a ticket whose caller stops waiting, or the slot it was granted meanwhile
+        with self._cond:
+            if not ticket.granted:
+                self._remove(ticket)
+                return
+            self._running -= 1
+            self._grant()
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "running": self._running,
+                "waiting": sum(len(queue) for queue in self._waiting.values()),
+                "max_concurrent": self.max_concurrent,
+                "calls": self._calls,
+                "coalesced": self._coalesced
+            }
+
+
+_model_scheduler = None
+_model_scheduler_lock = threading.Lock()
+
+
+def get_model_scheduler(logger):
+    """Returns the process-wide model scheduler shared by all Streamlit sessions."""
+    global _model_scheduler
+    with _model_scheduler_lock:
+        if _model_scheduler is None:
+            _model_scheduler = ModelScheduler(logger)
+        return _model_scheduler
@@ -0,0 +1,86 @@
+import time
+import threading
+import statistics
+from collections import deque
+
+from .instrumentation import observe
+
+# Latest reruns kept for the median / p95 in the report
+RERUN_HISTORY = 200
+
+COLD_START_STAGE = "Streamlit.cold_start"
+IMPORT_STAGE = "Streamlit.imports"
+RERUN_STAGE = "Streamlit.rerun"
+
+
+class ScriptTimer:
+    """Process-wide timings of the Streamlit script runs.
+
+    The first run in the process is the cold start (it imports the app modules);
+    every later run is a rerun after an interaction. Both go to the stage latency
+    histograms exported with the other metrics, to the log, and to `report()`.
+    """
+
+    def __init__(self, logger, history=RERUN_HISTORY):
+        self.logger = logger
+        self._cold_start = None
+        self._reruns = deque(maxlen=history)
+        self._rerun_count = 0
+        self._lock = threading.Lock()
+
+    def finish_run(self, started_at, imports_done_at):
+        """Records one script run that started at `started_at` (perf_counter) and imported until `imports_done_at`."""
+        seconds = time.perf_counter() - started_at
+        import_seconds = imports_done_at - started_at
+        with self._lock:
+            cold = self._cold_start is None
+            if cold:
+                self._cold_start = (seconds, import_seconds)
+            else:
+                self._reruns.append(seconds)
+                self._rerun_count += 1
+        if cold:
+            observe(COLD_START_STAGE, seconds)
+            observe(IMPORT_STAGE, import_seconds)
+            self.logger.info(f"[ScriptTimer] cold start: {seconds * 1000:.0f} ms ({import_seconds * 1000:.0f} ms imports).")
+        else:
+            observe(RERUN_STAGE, seconds)
+            self.logger.info(f"[ScriptTimer] rerun: {seconds * 1000:.1f} ms.")
+
+    def report(self):
+        """Returns {"cold_start_ms", "import_ms", "reruns", "last_ms", "median_ms", "p95_ms", "max_ms"} (None until measured)."""
+        with self._lock:
+            cold_start = self._cold_start
+            reruns = list(self._reruns)
+            rerun_count = self._rerun_count
+        report = {
+            "cold_start_ms": cold_start[0] * 1000 if cold_start else None,
+            "import_ms": cold_start[1] * 1000 if cold_start else None,
+            "reruns": rerun_count,
+            "last_ms": None,
+            "median_ms": None,
+            "p95_ms": None,
+            "max_ms": None
+        }
+        if reruns:
+            ordered = sorted(reruns)
+            report.update(
+                last_ms=reruns[-1] * 1000,
+                median_ms=statistics.median(ordered) * 1000,
+                p95_ms=ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+                max_ms=ordered[-1] * 1000
+            )
+        return report
+
+
+_script_timer = None
+_script_timer_lock = threading.Lock()
+
+
+def get_script_timer(logger):
+    """Returns the process-wide script timer shared by all Streamlit sessions."""
+    global _script_timer
+    with _script_timer_lock:
+        if _script_timer is None:
+            _script_timer = ScriptTimer(logger)
+        return _script_timer
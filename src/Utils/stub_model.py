@@ -0,0 +1,108 @@
+import os
+import json
+import threading
+import time
+
+
+class StubModel:
+    """Local stand-in for an LM Studio model handle, used for tests and benchmarks.
+
+    Mimics `lms.llm(...).respond(prompt)` and `respond_stream(prompt)` with a fixed
+    latency and a canned answer in the format the prompt asks for (the JSON fields of
+    a summary, keywords or qa prompt, plain text for a follow-up question), so the
+    pipeline can run end to end without an LM Studio server. `prefill_latency` adds seconds per 1000 prompt characters, like
+    the prompt processing time of a real model; with `prefix_cache` only the characters
+    after the part shared with the previous prompt are charged, like a server that keeps
+    the last prompt's KV cache.
+    """
+
+    def __init__(self, latency=0.0, response=None, think=True, token_latency=0.0, prefill_latency=0.0,
+                 prefix_cache=False):
+        self.latency = latency
+        self.prefill_latency = prefill_latency
+        self.prefix_cache = prefix_cache
+        self.prefilled_chars = 0
+        self.token_latency = token_latency
+        self.response = response
+        self.think = think
+        self.calls = 0
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def _build_response(self, prompt):
+        if self.response is not None:
+            return self.response
+        data = self._answer(prompt)
+        body = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False, indent=2)
+        if self.think:
+            body = "<think>stub reasoning</think>\n" + body
+        return body
+
+    @staticmethod
+    def _answer(prompt):
+        # Recognizes the prompts of src/Prompts/prompt.json by their output example
+        # (or, for a repair, by the expected fields); anything else gets a summary
+        if "Excerpts and question:" in prompt:
+            return "Stub answer (page 1)."
+        if '"questions": [' in prompt or "\nquestions: list" in prompt:
+            return {"questions": [{"question": "What is this?", "answer": "Generated by StubModel."}]}
+        if '"topics": [' in prompt or "\ntopics: list" in prompt:
+            return {"keywords": ["stub", "test"], "topics": ["Stub Topic"]}
+        return {
+            "title": "Stub Document",
+            "summary": f"Stub summary of a {len(prompt)} character prompt.",
+            "keywords": ["stub", "test"],
+            "sections": {"Stub Section": "Generated by StubModel."}
+        }
+
+    def _record(self, prompt):
+        # Returns the first-token latency of `prompt`
+        with self._lock:
+            cached = len(os.path.commonprefix([self.prompts[-1], prompt])) if self.prefix_cache and self.prompts else 0
+            self.calls += 1
+            self.prompts.append(prompt)
+            self.prefilled_chars += len(prompt) - cached
+        return self.latency + self.prefill_latency * (len(prompt) - cached) / 1000
+
+    def respond(self, prompt):
+        latency = self._record(prompt)
+        if latency:
+            time.sleep(latency)
+        return self._build_response(prompt)
+
+    def respond_stream(self, prompt, token_latency=None):
+        return StubPredictionStream(
+            self._build_response(prompt),
+            first_token_latency=self._record(prompt),
+            token_latency=self.token_latency if token_latency is None else token_latency
+        )
+
+
+class StubFragment:
+    def __init__(self, content):
+        self.content = content
+        self.tokens_count = 1
+
+
+class StubPredictionStream:
+    """Iterates a canned response in small fragments, like `PredictionStream`."""
+
+    def __init__(self, text, first_token_latency=0.0, token_latency=0.0, fragment_size=4):
+        self.text = text
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.fragment_size = fragment_size
+        self.cancelled = False
+
+    def __iter__(self):
+        if self.first_token_latency:
+            time.sleep(self.first_token_latency)
+        for i in range(0, len(self.text), self.fragment_size):
+            if self.cancelled:
+                return
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield StubFragment(self.text[i:i + self.fragment_size])
+
+    def cancel(self):
+        self.cancelled = True
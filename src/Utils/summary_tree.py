@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .llm_utils import AnalysisCancelled, DEFAULT_MAX_CONCURRENCY
+from .instrumentation import log_decorator, record, submit_in_context
+
+DEFAULT_TREE_PATH = os.path.join(".cache", "summary_tree.sqlite3")
+# Pages summarized together in one leaf of the tree
+LEAF_PAGES = 8
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    doc_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    start_page INTEGER NOT NULL,
+    end_page INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (doc_hash, model, variant, start_page, end_page)
+);
+"""
+
+
+class SummaryNodeStore:
+    """Persistent summaries of page ranges, keyed by document hash, model and variant.
+
+    The variant identifies everything else a summary depends on (prompt
+    templates, compaction, leaf size), so a changed prompt starts a new tree.
+    """
+
+    def __init__(self, logger, path=DEFAULT_TREE_PATH):
+        self.logger = logger
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection shared by all threads, serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def get_nodes(self, doc_hash, model, variant):
+        """Returns {(start_page, end_page): result} of every stored node of one tree."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT start_page, end_page, result FROM nodes WHERE doc_hash = ? AND model = ? AND variant = ?",
+                (doc_hash, model, variant)
+            ).fetchall()
+        return {(start, end): json.loads(result) for start, end, result in rows}
+
+    def count_nodes(self, doc_hash, model, variant):
+        """Returns how many nodes of one tree are stored, without reading their results."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM nodes WHERE doc_hash = ? AND model = ? AND variant = ?", (doc_hash, model, variant)
+            ).fetchone()[0]
+
+    def put_node(self, doc_hash, model, variant, span, result):
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (doc_hash, model, variant, span[0], span[1], json.dumps(result, ensure_ascii=False), time.time())
+                )
+        except sqlite3.Error as e:
+            tb = traceback.format_exc()
+            self.logger.error(f"[SummaryNodeStore] could not store node {span}: {e}\n{tb}")
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM nodes")
+        self.logger.info("[SummaryNodeStore] cleared.")
+
+
+class SummaryTree:
+    """Segment tree of summaries over the pages of one document.
+
+    Leaves summarize windows of `leaf_pages` pages; every parent is the merge of
+    its two children. A page range is answered from the O(log n) largest nodes
+    inside it, plus fresh summaries of the pages at its edges that only cover
+    part of a leaf. Missing nodes are computed on demand and stored, so
+    `build()` is only needed to precompute the whole tree.
+
+    Page spans are 0-based and end-exclusive. `load_text(page_indices)` returns
+    the text of the given pages, `summarize(text)` and `merge(results)` return a
+    summary result (or None). A leaf without text (blank or scanned pages) is
+    stored as an empty node (None) and left out of the merges above it.
+    """
+
+    def __init__(self, logger, store, doc_hash, page_count, model, variant, load_text, summarize, merge,
+                 leaf_pages=LEAF_PAGES, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.logger = logger
+        self.store = store
+        self.doc_hash = doc_hash
+        self.page_count = page_count
+        self.model = model
+        self.variant = variant
+        self.load_text = load_text
+        self.summarize = summarize
+        self.merge = merge
+        self.leaf_pages = leaf_pages
+        self.max_concurrency = max_concurrency
+        self.leaf_count = max(1, -(-page_count // leaf_pages))
+
+    def _span(self, node):
+        # Pages covered by the leaves lo..hi-1
+        lo, hi = node
+        return lo * self.leaf_pages, min(hi * self.leaf_pages, self.page_count)
+
+    @staticmethod
+    def _children(node):
+        lo, hi = node
+        mid = (lo + hi) // 2
+        return (lo, mid), (mid, hi)
+
+    def nodes(self):
+        """All nodes of the tree, parents after their children."""
+        ordered = []
+
+        def visit(node):
+            if node[1] - node[0] > 1:
+                for child in self._children(node):
+                    visit(child)
+            ordered.append(node)
+        visit((0, self.leaf_count))
+        return ordered
+
+    def coverage(self):
+        """Returns (stored nodes, total nodes)."""
+        # The variant includes the leaf size, so every stored node of this tree is one of its nodes
+        return self.store.count_nodes(self.doc_hash, self.model, self.variant), len(self.nodes())
+
+    def decompose(self, start, end):
+        """Splits pages [start, end) into whole tree nodes and leftover page runs, in page order.
+
+        Returns a list of ("node", node) and ("pages", [page_index, ...]) parts.
+        """
+        parts = []
+
+        def visit(node):
+            node_start, node_end = self._span(node)
+            if node_end <= start or node_start >= end:
+                return
+            if start <= node_start and node_end <= end:
+                parts.append(("node", node))
+            elif node[1] - node[0] > 1:
+                for child in self._children(node):
+                    visit(child)
+            else:
+                pages = list(range(max(start, node_start), min(end, node_end)))
+                if parts and parts[-1][0] == "pages":
+                    parts[-1][1].extend(pages)
+                else:
+                    parts.append(("pages", pages))
+        visit((0, self.leaf_count))
+        return parts
+
+    @log_decorator
+    def build(self, status_callback=None, cancel_event=None):
+        """Computes every missing node of the tree; returns the summary of the whole document."""
+        root = (0, self.leaf_count)
+        return self._ensure([root], status_callback, cancel_event)[self._span(root)]
+
+    @log_decorator
+    def summarize_range(self, start, end, status_callback=None, cancel_event=None):
+        """Summary of pages [start, end) combined from tree nodes; missing nodes are computed and stored."""
+        notify = status_callback or (lambda role, content: None)
+        parts = self.decompose(start, end)
+        nodes = [part for kind, part in parts if kind == "node"]
+        stored = self._ensure(nodes, status_callback, cancel_event)
+        record(tree_nodes=len(nodes), edge_pages=sum(len(part) for kind, part in parts if kind == "pages"))
+
+        partials = []
+        for kind, part in parts:
+            if kind == "node":
+                partials.append(stored[self._span(part)])
+            else:
+                notify("bot", f"🌿 Summarizing edge pages {part[0] + 1}-{part[-1] + 1} (not a whole tree node)...")
+                partials.append(self.summarize(self.load_text(part)))
+            self._check_cancel(cancel_event)
+        partials = [partial for partial in partials if partial]
+        if not partials:
+            return None
+        if len(partials) == 1:
+            return partials[0]
+        notify("bot", f"🌳 Combining {len(partials)} summaries of pages {start + 1}-{end}...")
+        return self.merge(partials)
+
+    def _ensure(self, targets, status_callback, cancel_event):
+        # Computes the missing targets bottom-up: leaves in parallel, then parents level by level
+        notify = status_callback or (lambda role, content: None)
+        stored = self.store.get_nodes(self.doc_hash, self.model, self.variant)
+        missing = []
+
+        def collect(node):
+            if self._span(node) in stored or node in missing:
+                return
+            if node[1] - node[0] > 1:
+                for child in self._children(node):
+                    collect(child)
+            missing.append(node)
+        for target in targets:
+            collect(target)
+        if not missing:
+            record(computed_nodes=0)
+            return stored
+
+        record(computed_nodes=len(missing))
+        notify("bot", f"🌳 Computing {len(missing)} summary tree node(s) ({len(stored)} already stored)...")
+        levels = {}
+        for node in missing:
+            levels.setdefault(self._height(node), []).append(node)
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for height in sorted(levels):
+                futures = {
+                    submit_in_context(executor, self._compute, node, stored): node for node in levels[height]
+                }
+                try:
+                    # Every node is stored as soon as it is done, so a failed sibling does not lose it
+                    for future in as_completed(futures):
+                        node = futures[future]
+                        self._store(stored, node, future.result())
+                        done += 1
+                        start, end = self._span(node)
+                        notify("bot", f"🌳 Node {done}/{len(missing)} ready (pages {start + 1}-{end})")
+                        self._check_cancel(cancel_event, futures)
+                except BaseException:
+                    # Nodes already running still finish; keep them for the next run
+                    for future in futures:
+                        future.cancel()
+                    for future, node in futures.items():
+                        if not future.cancelled() and self._span(node) not in stored and future.exception() is None:
+                            self._store(stored, node, future.result())
+                    raise
+        return stored
+
+    def _store(self, stored, node, result):
+        stored[self._span(node)] = result
+        self.store.put_node(self.doc_hash, self.model, self.variant, self._span(node), result)
+
+    def _compute(self, node, stored):
+        # Returns None for an empty node: no page below it has any text
+        start, end = self._span(node)
+        if node[1] - node[0] == 1:
+            text = self.load_text(list(range(start, end)))
+            if not text or not text.strip():
+                return None
+            result = self.summarize(text)
+        else:
+            children = [stored[self._span(child)] for child in self._children(node)]
+            children = [child for child in children if child]
+            if len(children) <= 1:
+                return children[0] if children else None
+            result = self.merge(children)
+        if not result:
+            raise Exception(f"Could not summarize pages {start + 1}-{end}.")
+        return result
+
+    def _height(self, node):
+        height = 0
+        while node[1] - node[0] > 1:
+            node = self._children(node)[1]
+            height += 1
+        return height
+
+    @staticmethod
+    def _check_cancel(cancel_event, futures=None):
+        if cancel_event is not None and cancel_event.is_set():
+            for pending in futures or ():
+                pending.cancel()
+            raise AnalysisCancelled("Analysis cancelled by user.")
+
+
+_node_store = None
+_node_store_lock = threading.Lock()
+
+
+def get_summary_node_store(logger):
+    """Returns the process-wide summary node store shared by all Streamlit sessions."""
+    global _node_store
+    with _node_store_lock:
+        if _node_store is None:
+            _node_store = SummaryNodeStore(logger)
+        return _node_store
@@ -0,0 +1,128 @@
+import re
+from collections import Counter
+from .llm_utils import estimate_tokens
+from .instrumentation import log_decorator, record
+
+# Only this many non-empty lines at the top and bottom of a page are header/footer candidates
+EDGE_LINES = 3
+# A candidate line is boilerplate when it repeats on at least this share of the pages...
+REPEAT_RATIO = 0.5
+# ...and repeated-line detection needs at least this many pages to be meaningful
+MIN_PAGES_FOR_REPEATS = 3
+# Pages before a streamed batch that are searched for repeated lines together with it
+STREAM_WINDOW_PAGES = 12
+
+_PAGE_NUMBER_RE = re.compile(r"^(page\s*)?\d+(\s*(/|of)\s*\d+)?$", re.IGNORECASE)
+_DIGITS_RE = re.compile(r"\d+")
+_SPACES_RE = re.compile(r"[ \t\f\v ]+")
+_HYPHEN_BREAK_RE = re.compile(r"(\w)-\n(?=[a-z])")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+class TextCompactor:
+    """Shrinks extracted page texts before they are put into a prompt.
+
+    Removes running headers/footers and page numbers (lines repeated at the same
+    edge of many pages), joins words hyphenated across line breaks and collapses
+    runs of whitespace. Body text is left as it is, so the meaning does not change.
+    """
+
+    def __init__(self, logger, edge_lines=EDGE_LINES, repeat_ratio=REPEAT_RATIO):
+        self.logger = logger
+        self.edge_lines = edge_lines
+        self.repeat_ratio = repeat_ratio
+        self.last_stats = None
+
+    @staticmethod
+    def _signature(line):
+        # "Page 3 of 120" and "Page 4 of 120" are the same footer
+        return _DIGITS_RE.sub("#", _SPACES_RE.sub(" ", line.strip().lower()))
+
+    def _edge_indices(self, lines):
+        filled = [i for i, line in enumerate(lines) if line.strip()]
+        return set(filled[:self.edge_lines] + filled[-self.edge_lines:])
+
+    def _find_repeated(self, pages):
+        if len(pages) < MIN_PAGES_FOR_REPEATS:
+            return set()
+        counts = Counter()
+        for lines in pages:
+            counts.update({self._signature(lines[i]) for i in self._edge_indices(lines)})
+        threshold = max(2, len(pages) * self.repeat_ratio)
+        return {signature for signature, count in counts.items() if count >= threshold}
+
+    def _kept_pages(self, page_texts, context=()):
+        # Lines of every page without boilerplate; `context` pages only count towards the repeated lines
+        pages = [text.splitlines() for text in page_texts]
+        repeated = self._find_repeated(pages + [text.splitlines() for text in context])
+
+        removed_lines = 0
+        kept_pages = []
+        for lines in pages:
+            edges = self._edge_indices(lines)
+            kept = []
+            for i, line in enumerate(lines):
+                line = _SPACES_RE.sub(" ", line).strip()
+                if i in edges and (_PAGE_NUMBER_RE.match(line) or self._signature(line) in repeated):
+                    removed_lines += 1
+                    continue
+                kept.append(line)
+            kept_pages.append("\n".join(kept).strip("\n"))
+        return kept_pages, removed_lines, len(repeated)
+
+    @log_decorator
+    def compact_pages(self, page_texts):
+        """Returns the compacted text of `page_texts` (one string per page), joined in order.
+
+        Savings are kept in `last_stats` and recorded on the current span.
+        """
+        kept_pages, removed_lines, repeated = self._kept_pages(page_texts)
+        text = "\n".join(page for page in kept_pages if page)
+        text = _HYPHEN_BREAK_RE.sub(r"\1", text)
+        text = _BLANK_LINES_RE.sub("\n\n", text) + "\n"
+        self._report("".join(text + "\n" for text in page_texts), text, removed_lines, repeated)
+        return text
+
+    def compact_stream(self, batches, window_pages=STREAM_WINDOW_PAGES):
+        """Compacts pages that arrive in batches; yields (page_index, text) per page with text left.
+
+        `batches` yields lists of tuples that start with (page_index, text), e.g. from
+        `PdfUtils.iter_pages`.
+        Repeated headers and footers are looked for in each batch together with the
+        `window_pages` pages before it, so small batches still find them. Words
+        hyphenated across two pages are not joined. `last_stats` adds up all batches.
+        """
+        window = []
+        totals = Counter()
+        for batch in batches:
+            page_texts = [item[1] for item in batch]
+            kept_pages, removed_lines, repeated = self._kept_pages(page_texts, context=window)
+            window = (window + page_texts)[-window_pages:]
+            texts = [_BLANK_LINES_RE.sub("\n\n", _HYPHEN_BREAK_RE.sub(r"\1", page)) + "\n" for page in kept_pages]
+            self._report("".join(text + "\n" for text in page_texts), "".join(texts), removed_lines, repeated)
+            totals.update({key: value for key, value in self.last_stats.items() if key != "saved_ratio"})
+            self.last_stats = dict(
+                totals, saved_ratio=totals["saved_tokens"] / totals["original_tokens"] if totals["original_tokens"] else 0.0
+            )
+            for item, page, text in zip(batch, kept_pages, texts):
+                if page:
+                    yield item[0], text
+
+    def _report(self, original, text, removed_lines, repeated):
+        original_tokens = estimate_tokens(original)
+        compacted_tokens = estimate_tokens(text)
+        saved_tokens = original_tokens - compacted_tokens
+        self.last_stats = {
+            "original_chars": len(original),
+            "compacted_chars": len(text),
+            "original_tokens": original_tokens,
+            "compacted_tokens": compacted_tokens,
+            "saved_tokens": saved_tokens,
+            "saved_ratio": saved_tokens / original_tokens if original_tokens else 0.0,
+            "removed_lines": removed_lines
+        }
+        record(saved_tokens=saved_tokens, removed_lines=removed_lines)
+        self.logger.info(
+            f"[TextCompactor] {original_tokens} -> {compacted_tokens} tokens "
+            f"({removed_lines} boilerplate lines removed, {repeated} repeated patterns)."
+        )
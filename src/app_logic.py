@@ -1,29 +1,21 @@
 import os
-import tempfile
+import json
 from .Utils.pdf_util import PdfUtils
-from .Utils.llm_utils import LlmUtils
-
-# --- Log Decorator (for normal functions) ---
-def log_decorator(func):
-    def wrapper(*args, **kwargs):
-        logger = kwargs.get('logger', None)
-        if logger:
-            logger.info(f"[{func.__name__}] start")
-        try:
-            result = func(*args, **kwargs)
-            if logger:
-                logger.info(f"[{func.__name__}] finish")
-            return result
-        except Exception as e:
-            import traceback
-            tb = traceback.format_exc()
-            if logger:
-                logger.error(f"[{func.__name__}] ERROR: {e}\nTraceback:\n{tb}")
-            raise
-    return wrapper
+from .Utils.llm_utils import LlmUtils, QUESTION_PROMPT_KEY, MERGE_PROMPT_KEY, estimate_tokens
+from .Utils.page_store import get_page_store
+from .Utils.result_cache import get_result_cache, hash_bytes
+from .Utils.result_archive import get_result_archive
+from .Utils.text_compactor import TextCompactor
+from .Utils.document_cache import DocumentHandle
+from .Utils.memory import MemoryMonitor
+from .Utils.retrieval import get_retrieval_index_cache, DEFAULT_TOP_K
+from .Utils.summary_tree import SummaryTree, get_summary_node_store, LEAF_PAGES
+from .Utils.prefetch import get_prefetcher
+from .Utils.instrumentation import log_decorator, start_trace, get_metrics, METRICS_EXPORT_PATH
 
-@log_decorator
-def process_pdf_pipeline(pdf_file, selected_pages, model_name, prompt_key, logger, status_callback):
+def process_pdf_pipeline(pdf_file, selected_pages, model_name, prompt_key, logger, status_callback, map_reduce=False, use_cache=True,
+                         compact=True, summary_index=False, document_cache=None, token_callback=None, cancel_event=None,
+                         trace_callback=None, overlap=False):
     """
     Runs PDF processing and LLM analysis pipeline.
     
@@ -31,61 +23,373 @@ def process_pdf_pipeline(pdf_file, selected_pages, model_name, prompt_key, logge
         pdf_file: Uploaded PDF file (Streamlit UploadedFile object).
         selected_pages (list): Page numbers to be analyzed (1-based).
         model_name (str): LLM model to be used.
-        prompt_key (str): Prompt key to be used.
+        prompt_key (str or list): Prompt key to be used, or several prompt keys analyzed over one
+            extraction; then the results are returned together as {"analyses": {prompt_key: result}}.
         logger: Logging object.
         status_callback (function): Callback function for real-time status updates.
+        map_reduce (bool): Summarize long texts chunk by chunk and merge the partial results.
+        use_cache (bool): Return a cached result for identical inputs instead of re-running the analysis.
+        compact (bool): Strip repeated headers/footers, page numbers and extra whitespace before prompting.
+        summary_index (bool): Answer the 'summary' analysis from the document's summary tree (see
+            `build_summary_index_pipeline`); missing tree nodes are computed and stored on the way.
+        document_cache (DocumentCache): Session cache of parsed uploads, so the PDF is parsed only once.
+        token_callback (function): Receives (text_so_far, stats) while the response streams in.
+        cancel_event (threading.Event): Set to cancel a streaming analysis.
+        trace_callback (function): Receives the timed stage trace of this run (also on errors).
+        overlap (bool): Send the text to the model chunk by chunk while later pages are still being
+            extracted (map-reduce); partial results are posted as they arrive.
+    """
+    with start_trace(model=model_name) as trace, MemoryMonitor() as memory:
+        try:
+            result = _run_pipeline(
+                pdf_file=pdf_file,
+                selected_pages=selected_pages,
+                model_name=model_name,
+                prompt_key=prompt_key,
+                logger=logger,
+                status_callback=status_callback,
+                map_reduce=map_reduce,
+                use_cache=use_cache,
+                compact=compact,
+                summary_index=summary_index,
+                document_cache=document_cache,
+                token_callback=token_callback,
+                cancel_event=cancel_event,
+                overlap=overlap
+            )
+            if memory.peak_bytes is not None:
+                status_callback(
+                    "bot",
+                    f"📈 Peak memory during this run: {memory.peak_bytes / 2**20:.0f} MB RSS "
+                    f"({memory.peak_private_bytes / 2**20:.0f} MB private)"
+                )
+            return result
+        finally:
+            trace.attributes["peak_rss_bytes"] = memory.peak_bytes
+            trace.attributes["peak_private_bytes"] = memory.peak_private_bytes
+            _finish_trace(trace, logger, trace_callback)
+
+def build_summary_index_pipeline(pdf_file, model_name, logger, status_callback, compact=True, document_cache=None,
+                                 token_callback=None, cancel_event=None, trace_callback=None):
     """
+    Precomputes the summary tree of a whole PDF and returns the summary of the whole document.
+
+    Leaves summarize windows of LEAF_PAGES pages and every parent merges its two
+    children; the nodes are stored per document hash and model, so any later page
+    range is summarized from a few stored nodes instead of its raw text. Nodes that
+    are already stored are not computed again.
+    Arguments as in `process_pdf_pipeline`.
+    """
+    with start_trace(model=model_name) as trace:
+        try:
+            document = _get_document(pdf_file, document_cache)
+            tree = _summary_tree(document, model_name, _prompt_path(), logger, compact)
+            stored, total = tree.coverage()
+            status_callback("bot", f"🌳 Building the summary index of {document.page_count} pages: {stored}/{total} nodes stored.")
+            result = tree.build(status_callback=status_callback, cancel_event=cancel_event)
+            status_callback("bot", "🌳 Summary index complete, summaries of any page range now reuse it.")
+            return result
+        finally:
+            _finish_trace(trace, logger, trace_callback)
+
+def summary_index_coverage(pdf_file, model_name, logger, compact=True, document_cache=None):
+    """Returns (stored nodes, total nodes) of the summary tree of a PDF for this model."""
+    document = _get_document(pdf_file, document_cache)
+    return _summary_tree(document, model_name, _prompt_path(), logger, compact).coverage()
+
+def _summary_tree(document, model_name, prompt_path, logger, compact):
+    # Everything a node summary depends on besides document and model
+    templates = [LlmUtils.PromptHandler(prompt_path, key, logger).prompt_template for key in ("summary", MERGE_PROMPT_KEY)]
+    variant = hash_bytes(json.dumps([templates, compact, LEAF_PAGES]).encode("utf-8"))[:16]
+    pdf_utils = PdfUtils(logger, page_store=get_page_store(logger))
+
+    def load_text(page_indices):
+        page_texts = pdf_utils.extract_page_texts(
+            document.source, page_indices=page_indices, reader=None if document.path else document.reader,
+            doc_hash=document.doc_hash
+        ) or []
+        if page_texts and compact:
+            return TextCompactor(logger).compact_pages(page_texts)
+        return "".join(page_text + "\n" for page_text in page_texts)
+
+    def summarize(text):
+        if not text.strip():
+            return None
+        llm_utils = LlmUtils(logger=logger, model=model_name, pdf_text=text, prompt_key="summary", prompt_path=prompt_path)
+        return llm_utils.run_map_reduce(max_concurrency=1)
+
+    def merge(results):
+        llm_utils = LlmUtils(logger=logger, model=model_name, pdf_text=None, prompt_key="summary", prompt_path=prompt_path)
+        return llm_utils.merge(results, max_concurrency=1)
+
+    return SummaryTree(
+        logger, get_summary_node_store(logger), document.doc_hash, document.page_count, model_name, variant,
+        load_text, summarize, merge
+    )
+
+def answer_question_pipeline(pdf_file, selected_pages, question, model_name, logger, status_callback, top_k=DEFAULT_TOP_K,
+                             document_cache=None, token_callback=None, cancel_event=None, trace_callback=None):
+    """
+    Answers a follow-up question about the selected pages of a PDF.
+
+    The pages are indexed once per document (BM25) and only the `top_k` most
+    relevant chunks are sent to the model, so the prompt stays small however many
+    pages are selected. The answer is posted to the chat through `status_callback`.
+
+    Args:
+        question (str): The user's question.
+        top_k (int): Number of chunks sent to the model.
+        Other arguments as in `process_pdf_pipeline`.
+    """
+    with start_trace(model=model_name) as trace:
+        try:
+            _answer_question(
+                pdf_file=pdf_file,
+                selected_pages=selected_pages,
+                question=question,
+                model_name=model_name,
+                logger=logger,
+                status_callback=status_callback,
+                top_k=top_k,
+                document_cache=document_cache,
+                token_callback=token_callback,
+                cancel_event=cancel_event
+            )
+        finally:
+            _finish_trace(trace, logger, trace_callback)
+
+def _finish_trace(trace, logger, trace_callback):
     try:
-        # 1. Write PDF to a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            tmp_file.write(pdf_file.getvalue())
-            pdf_path = tmp_file.name
-        
-        # Convert page indices to 0-based
-        page_indices = [i - 1 for i in selected_pages]
-        
-        # 2. Split PDF according to selected pages
-        status_callback("bot", f"📄 Splitting PDF... Pages: {selected_pages}")
-        splitter = PdfUtils.PdfSplitter(pdf_path, page_indices, logger)
-        splitter.run()
-        
-        # 3. Extract text from split PDF
-        status_callback("bot", "🔍 Extracting text...")
-        pdf_utils = PdfUtils(logger)
-        extracted_text = pdf_utils.extract_text_from_pdf(splitter.output1_path)
-        
-        if not extracted_text or not extracted_text.strip():
-            logger.warning("Could not extract text from PDF or extracted text is empty.")
-            raise ValueError("Could not extract text from selected pages. Please select different pages or check the PDF.")
-        
-        # 4. Process text with LLM
-        status_callback("bot", f"🤖 Starting analysis with '{model_name}' model...")
-        
-        # Specify the path to the prompt file correctly
-        # We assume this file is in the main directory of the project.
-        prompt_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Prompts', 'prompt.json')
-        
-        llm_utils = LlmUtils(
-            logger=logger,
-            model=model_name,
-            pdf_text=extracted_text,
-            prompt_key=prompt_key,
-            prompt_path=prompt_path # Explicitly provide prompt path
+        get_metrics().export_prometheus(METRICS_EXPORT_PATH)
+    except OSError as e:
+        logger.warning(f"Could not export metrics: {e}")
+    if trace_callback:
+        trace_callback(trace.to_dict())
+
+def _prompt_path():
+    # The prompt file is in the Prompts directory next to this module
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Prompts', 'prompt.json')
+
+def _get_document(pdf_file, document_cache):
+    if document_cache is not None:
+        return document_cache.get(pdf_file)
+    return DocumentHandle.from_upload(pdf_file)
+
+@log_decorator
+def _answer_question(pdf_file, selected_pages, question, model_name, logger, status_callback, top_k,
+                     document_cache, token_callback, cancel_event):
+    document = _get_document(pdf_file, document_cache)
+
+    def load_page_texts():
+        # Pages of an earlier analysis come straight from the page store
+        status_callback("bot", f"📇 Indexing pages {selected_pages[0]}-{selected_pages[-1]} for follow-up questions...")
+        pdf_utils = PdfUtils(logger, page_store=get_page_store(logger))
+        with get_prefetcher(logger).suspend(document.doc_hash):
+            pages = pdf_utils.extract_pages(
+                document.source, page_indices=[i - 1 for i in selected_pages],
+                reader=None if document.path else document.reader, doc_hash=document.doc_hash
+            )
+        return {i + 1: text for i, text, _ in pages if text.strip()}
+
+    index = get_retrieval_index_cache(logger).get_or_build(document.doc_hash, selected_pages, load_page_texts)
+    passages = [(page_number, text) for page_number, text, _ in index.search(question, top_k)]
+    if not passages:
+        raise ValueError("No selected page contains any word of the question. Try rephrasing it or select other pages.")
+
+    context_tokens = sum(estimate_tokens(text) for _, text in passages)
+    cited_pages = ", ".join(str(page_number) for page_number in sorted({page_number for page_number, _ in passages}))
+    status_callback(
+        "bot", f"📑 Answering from {len(passages)} of {len(index)} chunks (pages {cited_pages}, ~{context_tokens} tokens)..."
+    )
+    llm_utils = LlmUtils(
+        logger=logger,
+        model=model_name,
+        pdf_text=None,
+        prompt_key=QUESTION_PROMPT_KEY,
+        prompt_path=_prompt_path()
+    )
+    answer = llm_utils.run_question(question, passages, token_callback=token_callback, cancel_event=cancel_event)
+    if not answer:
+        raise Exception("Could not get an answer from the LLM model.")
+    status_callback("bot", f"💡 {answer}")
+
+@log_decorator
+def _run_pipeline(pdf_file, selected_pages, model_name, prompt_key, logger, status_callback, map_reduce,
+                  use_cache, compact, summary_index, document_cache, token_callback, cancel_event, overlap=False):
+    document = _get_document(pdf_file, document_cache)
+    prompt_path = _prompt_path()
+
+    prompt_keys = [prompt_key] if isinstance(prompt_key, str) else list(prompt_key)
+
+    # 0. Look up a cached result for the same PDF, pages, model and prompt (per analysis)
+    result_cache = get_result_cache(logger)
+    cache_keys = {}
+    for key in prompt_keys:
+        prompt_template = LlmUtils.PromptHandler(prompt_path, key, logger).prompt_template
+        options = {"map_reduce": map_reduce, "compact": compact, "summary_index": summary_index}
+        if overlap:
+            # Compacted batch by batch and chunked at batch boundaries, so not the same text as map-reduce
+            options["overlap"] = True
+        cache_keys[key] = result_cache.make_key(
+            document.doc_hash, selected_pages, model_name, key, prompt_template, options=options
+        )
+    results = {}
+    if use_cache:
+        for key in prompt_keys:
+            cached_result = result_cache.get(cache_keys[key])
+            if cached_result:
+                results[key] = cached_result
+        if len(results) == len(prompt_keys) == 1:
+            status_callback("bot", "⚡ Found a cached result for this PDF and page range, skipping analysis.")
+        elif results:
+            status_callback("bot", f"⚡ Found cached results for: {', '.join(results)}.")
+    missing = [key for key in prompt_keys if key not in results]
+    if summary_index and "summary" in missing:
+        # Combined from stored summaries of whole tree nodes, only the edge pages are summarized again
+        tree = _summary_tree(document, model_name, prompt_path, logger, compact)
+        status_callback("bot", f"🌳 Summarizing pages {selected_pages[0]}-{selected_pages[-1]} from the summary index...")
+        results["summary"] = tree.summarize_range(
+            selected_pages[0] - 1, selected_pages[-1], status_callback=status_callback, cancel_event=cancel_event
+        )
+    llm_keys = [key for key in missing if key not in results]
+    if llm_keys and overlap:
+        results.update(_analyze_streaming(
+            document, selected_pages, model_name, llm_keys, prompt_path, logger, status_callback, compact, cancel_event
+        ))
+    elif llm_keys:
+        results.update(_analyze(
+            document, selected_pages, model_name, llm_keys, prompt_path, logger, status_callback,
+            map_reduce, compact, token_callback, cancel_event
+        ))
+    new_keys = [key for key in missing if results.get(key)]
+    if new_keys:
+        # New results (also those from the summary index) are cached for identical re-runs and archived for search
+        result_archive = get_result_archive(logger)
+        for key in new_keys:
+            result_cache.put(cache_keys[key], results[key])
+            result_archive.add_result(
+                results[key], getattr(pdf_file, "name", ""), document.doc_hash, selected_pages, model_name, key
+            )
+
+    failed = [key for key in prompt_keys if not results.get(key)]
+    if len(failed) == len(prompt_keys):
+        raise Exception("Could not get a valid response from the LLM model.")
+    if failed:
+        status_callback("bot", f"⚠️ No valid result for: {', '.join(failed)}.")
+    if len(prompt_keys) == 1:
+        return results[prompt_keys[0]]
+    return {"analyses": {key: results.get(key) for key in prompt_keys}}
+
+@log_decorator
+def _analyze(document, selected_pages, model_name, prompt_keys, prompt_path, logger, status_callback,
+             map_reduce, compact, token_callback, cancel_event):
+    """Extracts the selected pages once and runs every prompt over the text; returns {prompt_key: result}."""
+    # Convert page indices to 0-based
+    page_indices = [i - 1 for i in selected_pages]
+    
+    # 1. Extract text straight from the selected pages of the parsed upload
+    # (no temporary file and no split copy written to disk)
+    status_callback("bot", f"🔍 Extracting text... Pages: {selected_pages}")
+    # Pages extracted by an earlier run (e.g. before the range was widened) or in the
+    # background since the upload come from the page store
+    pdf_utils = PdfUtils(logger, page_store=get_page_store(logger))
+    # Large (memory-mapped) uploads are read lazily by short-lived readers instead of the cached one
+    with get_prefetcher(logger).suspend(document.doc_hash):
+        page_texts = pdf_utils.extract_page_texts(
+            document.source, page_indices=page_indices, reader=None if document.path else document.reader,
+            doc_hash=document.doc_hash
+        )
+    if pdf_utils.last_extraction:
+        extraction = pdf_utils.last_extraction
+        status_callback(
+            "bot",
+            f"⚙️ Extracted {extraction['pages']} page(s) with {extraction['engine']} "
+            f"({extraction['pages_per_second']:.0f} pages/s)."
+        )
+    if page_texts and compact:
+        compactor = TextCompactor(logger)
+        extracted_text = compactor.compact_pages(page_texts)
+        stats = compactor.last_stats
+        status_callback(
+            "bot",
+            f"🧹 Compacted text: {stats['original_tokens']} -> {stats['compacted_tokens']} tokens "
+            f"(saved {stats['saved_tokens']}, {stats['saved_ratio']:.0%})."
+        )
+    else:
+        extracted_text = "".join(page_text + "\n" for page_text in page_texts or [])
+    
+    if not extracted_text or not extracted_text.strip():
+        logger.warning("Could not extract text from PDF or extracted text is empty.")
+        raise ValueError("Could not extract text from selected pages. Please select different pages or check the PDF.")
+    
+    # 2. Process text with LLM
+    status_callback("bot", f"🤖 Starting analysis with '{model_name}' model...")
+    
+    llm_utils = LlmUtils(
+        logger=logger,
+        model=model_name,
+        pdf_text=extracted_text,
+        prompt_key=prompt_keys[0],
+        prompt_path=prompt_path # Explicitly provide prompt path
+    )
+
+    if len(prompt_keys) > 1:
+        # Every template starts with the document, so after the first analysis the
+        # model server only has to process the instructions of the next one
+        status_callback("bot", f"📚 Running {len(prompt_keys)} analyses over the same text: {', '.join(prompt_keys)}")
+        return llm_utils.run_analyses(
+            prompt_keys, map_reduce=map_reduce, status_callback=status_callback,
+            token_callback=token_callback, cancel_event=cancel_event
+        )
+    if map_reduce:
+        result = llm_utils.run_map_reduce(
+            status_callback=status_callback, token_callback=token_callback, cancel_event=cancel_event
+        )
+    else:
+        result = llm_utils.run_full_pipeline(token_callback=token_callback, cancel_event=cancel_event)
+    return {prompt_keys[0]: result}
+
+@log_decorator
+def _analyze_streaming(document, selected_pages, model_name, prompt_keys, prompt_path, logger, status_callback,
+                       compact, cancel_event):
+    """Like `_analyze` with map-reduce, but chunks go to the model while later pages are still being extracted."""
+    page_indices = [i - 1 for i in selected_pages]
+    status_callback("bot", f"🔍 Extracting and analyzing with '{model_name}' as pages arrive... Pages: {selected_pages}")
+    pdf_utils = PdfUtils(logger, page_store=get_page_store(logger))
+    compactor = TextCompactor(logger)
+    sent_pages = []
+
+    def parts():
+        # (page, text) per extracted page, 1-based for the progress messages
+        batches = pdf_utils.iter_pages(
+            document.source, page_indices, reader=None if document.path else document.reader, doc_hash=document.doc_hash
+        )
+        if compact:
+            # Repeated headers are searched over a window of pages, not only the small batch at hand
+            pages = compactor.compact_stream(batches)
+        else:
+            pages = ((i, text + "\n") for batch in batches for i, text, _ in batch)
+        for i, text in pages:
+            if text.strip():
+                sent_pages.append(i + 1)
+                yield i + 1, text
+
+    llm_utils = LlmUtils(logger=logger, model=model_name, pdf_text=None, prompt_key=prompt_keys[0], prompt_path=prompt_path)
+    with get_prefetcher(logger).suspend(document.doc_hash):
+        results = llm_utils.run_streaming(parts(), prompt_keys, status_callback=status_callback, cancel_event=cancel_event)
+    if pdf_utils.last_extraction:
+        extraction = pdf_utils.last_extraction
+        status_callback(
+            "bot",
+            f"⚙️ Extracted {extraction['pages']} page(s) with {extraction['engine']} "
+            f"({extraction['pages_per_second']:.0f} pages/s)."
+        )
+    if compact and compactor.last_stats and compactor.last_stats["original_tokens"]:
+        compaction = compactor.last_stats
+        status_callback(
+            "bot", f"🧹 Compacted text: {compaction['original_tokens']} -> {compaction['compacted_tokens']} tokens."
         )
-        
-        result = llm_utils.run_full_pipeline()
-        
-        if not result:
-            raise Exception("Could not get a valid response from the LLM model.")
-            
-        return result
-        
-    finally:
-        # Clean up temporary files
-        if 'pdf_path' in locals() and os.path.exists(pdf_path):
-            os.unlink(pdf_path)
-        if 'splitter' in locals():
-            if os.path.exists(splitter.output1_path):
-                os.unlink(splitter.output1_path)
-            if os.path.exists(splitter.output2_path):
-                os.unlink(splitter.output2_path)
\ No newline at end of file
+    if not sent_pages:
+        logger.warning("Could not extract text from PDF or extracted text is empty.")
+        raise ValueError("Could not extract text from selected pages. Please select different pages or check the PDF.")
+    return results
@@ -0,0 +1,283 @@
+"""Headless batch mode: analyze a directory (or glob) of PDFs without Streamlit.
+
+Usage (from the project root):
+    python -m src.batch "reports/*.pdf" --pages 1-20 --output results.jsonl
+    python -m src.batch reports/ --rule "*manual*=1-5" --model stub --stub-latency 0.2
+
+Results are appended to a JSONL file as they complete. Finished documents are
+recorded in a checkpoint file, so re-running the same command resumes where an
+interrupted run stopped.
+"""
+import os
+import sys
+import mmap
+import glob
+import json
+import time
+import fnmatch
+import hashlib
+import argparse
+import traceback
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from PyPDF2 import PdfReader
+
+from .Utils.logger_config import get_logger
+from .Utils.pdf_util import PdfUtils
+from .Utils.llm_utils import LlmUtils, DEFAULT_CHUNK_TOKENS
+from .Utils.stub_model import StubModel
+from .Utils.text_compactor import TextCompactor
+from .Utils.model_pool import get_model_pool, STUB_MODEL_NAME
+from .Utils.scheduler import get_model_scheduler
+from .Utils.memory import MemoryMonitor, LARGE_FILE_BYTES
+from .Utils.instrumentation import get_metrics, METRICS_EXPORT_PATH
+
+DEFAULT_PROMPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Prompts", "prompt.json")
+
+
+def parse_page_spec(spec, page_count):
+    """Turns a spec like "1-5,8,10-" (1-based, "all" for every page) into 0-based indices."""
+    if spec.strip().lower() == "all":
+        return list(range(page_count))
+    indices = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            start = int(start) if start else 1
+            end = int(end) if end else page_count
+        else:
+            start = end = int(part)
+        indices.extend(i - 1 for i in range(max(start, 1), min(end, page_count) + 1))
+    return sorted(set(indices))
+
+
+def page_spec_for(path, default_spec, rules):
+    # The first rule whose pattern matches the file name wins
+    for pattern, spec in rules:
+        if fnmatch.fnmatch(os.path.basename(path), pattern):
+            return spec
+    return default_spec
+
+
+def find_pdfs(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(item, "**", "*.pdf"), recursive=True)
+        else:
+            matches = glob.glob(item, recursive=True)
+        paths.extend(os.path.abspath(path) for path in matches if path.lower().endswith(".pdf"))
+    return sorted(set(paths))
+
+
+def document_key(path, spec, model_name, prompt_key):
+    """Identifies one unit of work; a changed file, range, model or prompt is redone."""
+    stat = os.stat(path)
+    payload = f"{path}|{stat.st_size}|{stat.st_mtime_ns}|{spec}|{model_name}|{prompt_key}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def extract_document(path, spec, compact=True):
+    """Reads one PDF and extracts (and compacts) its selected pages; runs inside a worker process."""
+    large = os.path.getsize(path) > LARGE_FILE_BYTES
+    with open(path, "rb") as f:
+        # Large files are memory-mapped and extracted lazily instead of being read whole
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if large else f.read()
+    reader = PdfReader(data if large else BytesIO(data))
+    page_indices = parse_page_spec(spec, len(reader.pages))
+    # Parallelism is per document here, so each worker extracts its pages serially
+    page_results = PdfUtils(get_logger()).extract_pages(
+        path if large else data, page_indices, max_workers=1, reader=None if large else reader
+    )
+    page_texts = [text for _, text, error in page_results if text]
+    if compact:
+        text = TextCompactor(get_logger()).compact_pages(page_texts)
+    else:
+        text = "".join(page_text + "\n" for page_text in page_texts)
+    return {
+        "page_count": len(reader.pages),
+        "pages": [i + 1 for i in page_indices],
+        "bytes": len(data),
+        "text": text,
+        "page_errors": {i + 1: error for i, _, error in page_results if error}
+    }
+
+
+def analyze_text(text, model, prompt_key, prompt_path, logger, max_chunk_tokens):
+    llm_utils = LlmUtils(logger=logger, model=model, pdf_text=text, prompt_key=prompt_key, prompt_path=prompt_path)
+    return llm_utils.run_map_reduce(max_chunk_tokens=max_chunk_tokens, max_concurrency=1)
+
+
+class Checkpoint:
+    """Append-only list of finished document keys."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.done = {line.strip() for line in f if line.strip()}
+        self._file = open(path, "a", encoding="utf-8")
+
+    def mark(self, key):
+        self.done.add(key)
+        self._file.write(key + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Analyze many PDFs without the Streamlit UI.")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories or glob patterns")
+    parser.add_argument("--pages", default="all", help="Default page range, e.g. '1-10,15' or 'all'")
+    parser.add_argument("--rule", action="append", default=[], metavar="GLOB=PAGES",
+                        help="Page range for file names matching GLOB (repeatable, first match wins)")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--model", default="deepseek/deepseek-r1-0528-qwen3-8b",
+                        help="LM Studio model key, or 'stub' for the local stub model")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="Seconds per call of the stub model")
+    parser.add_argument("--prompt-key", default="summary")
+    parser.add_argument("--prompt-path", default=DEFAULT_PROMPT_PATH)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Extraction processes")
+    parser.add_argument("--llm-concurrency", type=int, default=2, help="Documents analyzed by the model at once")
+    parser.add_argument("--max-chunk-tokens", type=int, default=DEFAULT_CHUNK_TOKENS)
+    parser.add_argument("--no-compact", dest="compact", action="store_false",
+                        help="Send the raw extracted text, with repeated headers/footers and page numbers")
+    parser.add_argument("--verbose", action="store_true", help="Also print log messages to the console")
+    parser.add_argument("--log-level", help="Log level (default: PDF_SUMMARY_LOG_LEVEL or INFO)")
+    parser.add_argument("--log-json", action="store_true", default=None, help="Write the log as JSON lines")
+    return parser
+
+
+def run_batch(args, model=None):
+    """Runs the batch described by parsed `args`; returns the summary dict."""
+    logger = get_logger(console=args.verbose, level=args.log_level, json_format=args.log_json)
+    rules = []
+    for rule in args.rule:
+        pattern, _, spec = rule.partition("=")
+        rules.append((pattern, spec))
+    if model is None:
+        if args.model == STUB_MODEL_NAME:
+            model = StubModel(latency=args.stub_latency)
+        else:
+            model = get_model_pool(logger).acquire(args.model)
+    # Every model call goes through the scheduler, so its limit follows --llm-concurrency
+    get_model_scheduler(logger).set_max_concurrent(args.llm_concurrency)
+
+    paths = find_pdfs(args.inputs)
+    checkpoint = Checkpoint(args.checkpoint or args.output + ".checkpoint")
+    todo = []
+    for path in paths:
+        spec = page_spec_for(path, args.pages, rules)
+        key = document_key(path, spec, args.model, args.prompt_key)
+        if key not in checkpoint.done:
+            todo.append((path, spec, key))
+    skipped = len(paths) - len(todo)
+    print(f"Found {len(paths)} PDFs, {skipped} already done, {len(todo)} to process.")
+
+    summary = {"processed": 0, "failed": 0, "skipped": skipped, "pages": 0, "bytes": 0}
+    started_at = time.perf_counter()
+    # Bound the documents held in memory between extraction and analysis
+    max_in_flight = args.workers + 2 * args.llm_concurrency
+    pending = iter(todo)
+    extracting = {}
+    analyzing = {}
+
+    with open(args.output, "a", encoding="utf-8") as output, MemoryMonitor() as memory, \
+            ProcessPoolExecutor(max_workers=args.workers) as extract_pool, \
+            ThreadPoolExecutor(max_workers=args.llm_concurrency) as llm_pool:
+
+        def write_row(path, key, row, failed):
+            output.write(json.dumps(row, ensure_ascii=False) + "\n")
+            output.flush()
+            done = summary["processed"] + summary["failed"] + 1
+            if failed:
+                summary["failed"] += 1
+                print(f"[{done}/{len(todo)}] FAILED {path}: {row['error']}")
+            else:
+                # Only successes are checkpointed, so failures are retried on resume
+                checkpoint.mark(key)
+                summary["processed"] += 1
+                print(f"[{done}/{len(todo)}] ok {path} ({len(row['pages'])} pages, {row['seconds']:.1f}s)")
+
+        def fill():
+            while len(extracting) + len(analyzing) < max_in_flight:
+                item = next(pending, None)
+                if item is None:
+                    return
+                future = extract_pool.submit(extract_document, item[0], item[1], args.compact)
+                extracting[future] = item + (time.perf_counter(),)
+
+        fill()
+        while extracting or analyzing:
+            done, _ = wait(list(extracting) + list(analyzing), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in extracting:
+                    path, spec, key, doc_started = extracting.pop(future)
+                    try:
+                        document = future.result()
+                    except Exception as e:
+                        write_row(path, key, {"file": path, "status": "error", "error": f"extraction: {e}"}, True)
+                        continue
+                    summary["pages"] += len(document["pages"])
+                    summary["bytes"] += document["bytes"]
+                    if not document["text"].strip():
+                        write_row(path, key, {"file": path, "status": "error", "pages": document["pages"],
+                                              "error": "no text in selected pages"}, True)
+                        continue
+                    llm_future = llm_pool.submit(
+                        analyze_text, document["text"], model, args.prompt_key, args.prompt_path,
+                        logger, args.max_chunk_tokens
+                    )
+                    analyzing[llm_future] = (path, key, doc_started, document)
+                else:
+                    path, key, doc_started, document = analyzing.pop(future)
+                    row = {"file": path, "pages": document["pages"], "page_count": document["page_count"],
+                           "page_errors": document["page_errors"], "seconds": time.perf_counter() - doc_started}
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"Analysis failed for {path}: {e}\n{traceback.format_exc()}")
+                        result = None
+                    if result:
+                        write_row(path, key, dict(row, status="ok", result=result), False)
+                    else:
+                        write_row(path, key, dict(row, status="error", error="no valid response from model"), True)
+            fill()
+
+    checkpoint.close()
+    get_metrics().export_prometheus(METRICS_EXPORT_PATH)
+    elapsed = time.perf_counter() - started_at
+    summary["seconds"] = elapsed
+    summary["docs_per_minute"] = (summary["processed"] + summary["failed"]) / elapsed * 60 if elapsed else 0.0
+    summary["pages_per_second"] = summary["pages"] / elapsed if elapsed else 0.0
+    summary["peak_rss_bytes"] = memory.peak_bytes
+    summary["peak_private_bytes"] = memory.peak_private_bytes
+    peak_text = (
+        f", peak RSS {memory.peak_bytes / 2**20:.0f} MB ({memory.peak_private_bytes / 2**20:.0f} MB private, main process)"
+        if memory.peak_bytes else ""
+    )
+    print(
+        f"Done in {elapsed:.1f}s: {summary['processed']} ok, {summary['failed']} failed, "
+        f"{summary['skipped']} skipped | {summary['docs_per_minute']:.1f} docs/min, "
+        f"{summary['pages_per_second']:.1f} pages/s{peak_text}"
+    )
+    return summary
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    summary = run_batch(args)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
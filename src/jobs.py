@@ -0,0 +1,194 @@
+import time
+import uuid
+import threading
+import traceback
+from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .Utils.llm_utils import AnalysisCancelled
+from .Utils.scheduler import caller_context
+
+# How many analyses may run at the same time across all sessions
+DEFAULT_MAX_RUNNING_JOBS = 2
+# Finished jobs are kept this long so a reloaded page can still pick up their results
+DEFAULT_RETENTION_SECONDS = 3600
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+# Chat message added when a job completes, unless the job brings its own
+DEFAULT_DONE_MESSAGE = "✅ Analysis completed! Results are displayed below."
+
+
+class Job:
+    """One submitted analysis and everything the UI needs to show its progress."""
+
+    def __init__(self, job_id, client_id, description, done_message=DEFAULT_DONE_MESSAGE):
+        self.job_id = job_id
+        self.client_id = client_id
+        self.description = description
+        self.done_message = done_message
+        self.status = QUEUED
+        self.messages = []
+        # Messages of this job its client has already moved to the chat archive
+        self.archived_messages = 0
+        self.result = None
+        self.error = None
+        self.stream_text = ""
+        self.stream_stats = None
+        self.trace = None
+        self.cancel_event = threading.Event()
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def add_message(self, role, content):
+        with self._lock:
+            self.messages.append({
+                "role": role,
+                "content": content,
+                "timestamp": datetime.now().strftime("%H:%M:%S")
+            })
+
+    def messages_since(self, cursor):
+        with self._lock:
+            return list(self.messages[cursor:])
+
+    def mark_archived(self, count):
+        """Records that the first `count` messages are archived, so a reloaded page does not copy them again."""
+        with self._lock:
+            self.archived_messages = max(self.archived_messages, count)
+
+    def update_stream(self, text, stats):
+        with self._lock:
+            self.stream_text = text
+            self.stream_stats = stats
+
+    def set_trace(self, trace):
+        self.trace = trace
+
+    def stream_snapshot(self):
+        with self._lock:
+            return self.stream_text, self.stream_stats
+
+
+class JobManager:
+    """Runs analyses on a bounded background thread pool, independent of Streamlit reruns.
+
+    Jobs are grouped by a client id (kept in the page URL), so a browser tab finds
+    its queued, running and finished jobs again after a rerun or a page reload.
+    """
+
+    def __init__(self, logger, max_running=DEFAULT_MAX_RUNNING_JOBS, retention_seconds=DEFAULT_RETENTION_SECONDS):
+        self.logger = logger
+        self.max_running = max_running
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix="analysis-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, client_id, description, func, stream=False, done_message=DEFAULT_DONE_MESSAGE, **kwargs):
+        """Queues `func(status_callback=..., token_callback=..., cancel_event=..., trace_callback=..., **kwargs)`.
+
+        `done_message` is added to the chat when the job completes (None for no message).
+        Returns the job id.
+        """
+        job = Job(uuid.uuid4().hex[:8], client_id, description, done_message)
+        with self._lock:
+            self._prune()
+            self._jobs[job.job_id] = job
+        job.add_message("user", description)
+        job.future = self._executor.submit(self._run, job, func, stream, kwargs)
+        self.logger.info(f"[JobManager] job {job.job_id} queued for client {client_id}.")
+        return job.job_id
+
+    def _run(self, job, func, stream, kwargs):
+        if job.cancel_event.is_set():
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        self.logger.info(f"[JobManager] job {job.job_id} started.")
+        try:
+            # Model calls of this job wait in the scheduler's queue under the job's client
+            with caller_context(job.client_id, notify=job.add_message, cancel_event=job.cancel_event):
+                job.result = func(
+                    status_callback=job.add_message,
+                    token_callback=job.update_stream if stream else None,
+                    cancel_event=job.cancel_event,
+                    trace_callback=job.set_trace,
+                    **kwargs
+                )
+            job.status = DONE
+            if job.done_message:
+                job.add_message("bot", job.done_message)
+        except AnalysisCancelled:
+            job.status = CANCELLED
+            job.add_message("bot", "⏹️ Analysis cancelled, the model is free for the next request.")
+        except Exception as e:
+            tb = traceback.format_exc()
+            self.logger.error(f"[JobManager] job {job.job_id} failed: {e}\n{tb}")
+            job.status = FAILED
+            job.error = str(e)
+            job.add_message("bot", f"❌ Error occurred: {e}")
+        finally:
+            job.finished_at = time.time()
+            self.logger.info(f"[JobManager] job {job.job_id} finished: {job.status}.")
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs_for(self, client_id):
+        with self._lock:
+            return [job for job in self._jobs.values() if job.client_id == client_id]
+
+    def has_active(self, client_id):
+        return any(not job.finished for job in self.jobs_for(client_id))
+
+    def queue_position(self, job):
+        """1-based position among all queued jobs, or 0 if the job is not waiting."""
+        with self._lock:
+            queued = [j for j in self._jobs.values() if j.status == QUEUED and not j.cancel_event.is_set()]
+        return queued.index(job) + 1 if job in queued else 0
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return
+        job.cancel_event.set()
+        # A job that has not started yet is dropped right away
+        if job.future is not None and job.future.cancel():
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            job.add_message("bot", "⏹️ Queued analysis cancelled.")
+        self.logger.info(f"[JobManager] cancel requested for job {job_id}.")
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [j.job_id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager(logger):
+    """Returns the process-wide job manager shared by all Streamlit sessions."""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager(logger)
+        return _job_manager
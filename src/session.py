@@ -1,5 +1,15 @@
+import uuid
 import streamlit as st
 from datetime import datetime
+from .Utils.logger_config import get_logger
+from .Utils.document_cache import DocumentCache
+from .Utils.result_archive import get_result_archive
+from .jobs import get_job_manager
+
+# Chat messages kept in session state; older ones are moved to the result archive
+MAX_SESSION_MESSAGES = 100
+# Chat messages shown per page
+CHAT_PAGE_SIZE = 20
 
 def init_session_state():
     """Initialize Streamlit session state."""
@@ -7,13 +17,104 @@ def init_session_state():
         st.session_state.chat_history = []
     if 'current_result' not in st.session_state:
         st.session_state.current_result = None
-    if 'processing' not in st.session_state:
-        st.session_state.processing = False
+    if 'current_trace' not in st.session_state:
+        st.session_state.current_trace = None
+    if 'job_cursors' not in st.session_state:
+        # Number of messages already copied into chat_history, per job id (after a reload:
+        # unknown, the archived messages of each job are skipped)
+        st.session_state.job_cursors = {}
+    if 'collected_jobs' not in st.session_state:
+        st.session_state.collected_jobs = set()
+    if 'document_cache' not in st.session_state:
+        st.session_state.document_cache = DocumentCache(get_logger())
+    if 'archived_messages' not in st.session_state:
+        # Messages of this browser tab already moved to the archive (kept across page reloads)
+        st.session_state.archived_messages = get_result_archive(get_logger()).count_messages(get_client_id())
+    if 'chat_page' not in st.session_state:
+        # 0 shows the newest messages
+        st.session_state.chat_page = 0
+
+def add_message(role, content, timestamp=None, job_message=None):
+    """Add a new message to chat history.
 
-def add_message(role, content):
-    """Add a new message to chat history."""
-    st.session_state.chat_history.append({
+    `job_message` is (job_id, index) for a message copied from a background job.
+    """
+    message = {
         "role": role,
         "content": content,
-        "timestamp": datetime.now().strftime("%H:%M:%S")
-    })
\ No newline at end of file
+        "timestamp": timestamp or datetime.now().strftime("%H:%M:%S")
+    }
+    if job_message:
+        message["job_message"] = job_message
+    st.session_state.chat_history.append(message)
+    history = st.session_state.chat_history
+    overflow = len(history) - MAX_SESSION_MESSAGES
+    if overflow > 0:
+        get_result_archive(get_logger()).add_messages(get_client_id(), history[:overflow])
+        _mark_archived_job_messages(history[:overflow])
+        del history[:overflow]
+        st.session_state.archived_messages += overflow
+
+def _mark_archived_job_messages(messages):
+    # The job keeps its messages for a reloaded page, which must not copy these again
+    job_manager = get_job_manager(get_logger())
+    for message in messages:
+        if "job_message" in message:
+            job_id, index = message["job_message"]
+            job = job_manager.get(job_id)
+            if job is not None:
+                job.mark_archived(index + 1)
+
+def get_chat_page(page, page_size=CHAT_PAGE_SIZE):
+    """Returns (messages, page_count) of one chat page; page 0 holds the newest messages.
+
+    Older pages are read from the archive once they have left session state.
+    """
+    history = st.session_state.chat_history
+    archived = st.session_state.archived_messages
+    total = archived + len(history)
+    page_count = max(1, -(-total // page_size))
+    page = min(max(page, 0), page_count - 1)
+    end = total - page * page_size
+    start = max(0, end - page_size)
+    messages = []
+    if start < archived:
+        messages = get_result_archive(get_logger()).get_messages(get_client_id(), start, min(end, archived) - start)
+    messages += history[max(start - archived, 0):max(end - archived, 0)]
+    return messages, page_count
+
+def clear_chat_history():
+    """Forgets the chat of this browser tab, including its archived messages."""
+    get_result_archive(get_logger()).clear_messages(get_client_id())
+    st.session_state.chat_history = []
+    st.session_state.archived_messages = 0
+    st.session_state.chat_page = 0
+
+def get_client_id():
+    """Return an id for this browser tab, kept in the URL so it survives page reloads."""
+    client_id = st.query_params.get("client")
+    if not client_id:
+        client_id = uuid.uuid4().hex[:12]
+        st.query_params["client"] = client_id
+    return client_id
+
+def sync_job_updates(job_manager, client_id):
+    """Copy new job messages into chat history and pick up finished results.
+
+    Returns True when a job finished since the last call.
+    """
+    finished_now = False
+    for job in job_manager.jobs_for(client_id):
+        cursor = st.session_state.job_cursors.get(job.job_id, job.archived_messages)
+        new_messages = job.messages_since(cursor)
+        for i, message in enumerate(new_messages, start=cursor):
+            add_message(message["role"], message["content"], message["timestamp"], job_message=(job.job_id, i))
+        st.session_state.job_cursors[job.job_id] = cursor + len(new_messages)
+
+        if job.finished and job.job_id not in st.session_state.collected_jobs:
+            st.session_state.collected_jobs.add(job.job_id)
+            if job.result:
+                st.session_state.current_result = job.result
+                st.session_state.current_trace = job.trace
+            finished_now = True
+    return finished_now
\ No newline at end of file
@@ -1,11 +1,26 @@
 import streamlit as st
 import json # For handling analysis result JSON operations
+import html # For showing chat messages as plain text
+import time # For showing how long a job has been running
 from datetime import datetime # For timestamps
-from .session import add_message # For chat messages
+from .session import add_message, get_chat_page, clear_chat_history # For chat messages
+from .Utils.logger_config import get_logger
+from .Utils.result_cache import get_result_cache # For cache statistics and invalidation
+from .Utils.page_store import get_page_store # For extracted page text statistics
+from .Utils.retrieval import get_retrieval_index_cache # For dropping question indexes with the cache
+from .Utils.result_archive import get_result_archive # For searching earlier results
+from .jobs import QUEUED # For showing background job states
+from .Utils.model_pool import get_model_pool, READY, WARMING, UNAVAILABLE # For model warm-up
+from .Utils.scheduler import get_model_scheduler # For showing the shared model queue
+from .Utils.llm_utils import analysis_prompt_keys # For the analyses offered in the control panel
+from .Utils.summary_tree import get_summary_node_store, LEAF_PAGES # For the summary index
+from .Utils.extractors import get_engine_selector, available_engines, DEFAULT_ENGINE # For showing the text extraction engine
+from .Utils.prefetch import get_prefetcher, RUNNING as PREFETCH_RUNNING # For extracting uploads in the background
+from .Utils.script_timer import get_script_timer # For showing cold start and rerun times
+from .app_logic import summary_index_coverage # For showing how much of the summary index is stored
 
-from PyPDF2 import PdfReader # For reading PDF page count
-from PyPDF2.errors import PdfReadError # For catching PyPDF2-specific read errors
-from io import BytesIO # For processing uploaded files in memory
+# Seconds between two polls of the background jobs while one is active
+JOB_POLL_SECONDS = 1.0
 
 def render_css():
     """Applies custom CSS styles for the application."""
@@ -59,6 +74,46 @@ def render_header():
     </div>
     """, unsafe_allow_html=True)
 
+def render_engine_caption(document):
+    """Shows the text extraction engine chosen for the uploaded PDF and its throughput."""
+    info = get_engine_selector(get_logger()).get(document.doc_hash)
+    if info is None:
+        mode = "auto, calibrated on the first larger extraction" if DEFAULT_ENGINE == "auto" else DEFAULT_ENGINE
+        st.caption(f"⚙️ Text engine: {mode} (installed: {', '.join(available_engines())})")
+        return
+    text = f"⚙️ Text engine: {info['engine']}"
+    if info.get("pages_per_second"):
+        text += f" · {info['pages_per_second']:.0f} pages/s ({info['pages']} pages in {info['seconds']:.2f} s)"
+    if info["calibration"]:
+        others = [
+            f"{name} {stats['pages_per_second']:.0f}" + ("" if stats["passed"] else " ✗")
+            for name, stats in info["calibration"]["candidates"].items() if "error" not in stats and name != info["engine"]
+        ]
+        if others:
+            text += f" · calibrated against {', '.join(others)} pages/s"
+    st.caption(text, help="Engines marked ✗ failed the text quality check on this PDF.")
+
+def render_prefetch_caption(status):
+    """Shows how many pages of the upload were already extracted in the background."""
+    if status is None or not status["total_pages"]:
+        return
+    text = f"🔮 Pre-extracted {status['pages']}/{status['total_pages']} pages"
+    if status["state"] == PREFETCH_RUNNING:
+        text += " (continuing in the background)"
+    st.caption(text, help="Page text is extracted while you choose the pages, so the analysis can start from it.")
+
+def render_timing_caption(report):
+    """Shows how long the app took to start and to rerun after an interaction."""
+    if report["cold_start_ms"] is None:
+        return
+    text = f"⏱️ Cold start: {report['cold_start_ms']:.0f} ms ({report['import_ms']:.0f} ms imports)"
+    if report["reruns"]:
+        text += (
+            f" · Reruns: last {report['last_ms']:.0f} ms, median {report['median_ms']:.0f} ms, "
+            f"p95 {report['p95_ms']:.0f} ms ({report['reruns']} runs)"
+        )
+    st.caption(text, help="Script run times of this server process, measured up to the end of the page.")
+
 def render_control_panel():
     """Creates the control panel on the left side (file upload, page selection, etc.)."""
     st.header("🎛️ Control Panel")
@@ -71,21 +126,23 @@ def render_control_panel():
     actual_total_pages = 0  # Actual total page count in the PDF
     pdf_is_valid_for_processing = False # Flag indicating whether the PDF is readable and processable
 
+    document_cache = st.session_state.document_cache
+    prefetcher = get_prefetcher(get_logger())
+    # Forget parsed documents of earlier uploads and stop extracting them
+    for stale_id in document_cache.retain(uploaded_file.file_id if uploaded_file else None):
+        prefetcher.cancel(stale_id)
+
     if uploaded_file:
+        # PyPDF2 is imported with the first upload, not on every page load
+        from PyPDF2.errors import PdfReadError # For catching PyPDF2-specific read errors
         try:
-            # Get the byte content of the uploaded file and create a stream in memory
-            pdf_bytes = uploaded_file.getvalue()
-            pdf_stream = BytesIO(pdf_bytes)
-            reader = PdfReader(pdf_stream)
-            
-            # Check if reader.pages is empty or None
-            if not reader.pages:
-                 actual_total_pages = 0
-            else:
-                actual_total_pages = len(reader.pages)
+            # The upload is parsed once and reused on every rerun and by the pipeline
+            document = document_cache.get(uploaded_file)
+            actual_total_pages = document.page_count
 
             if actual_total_pages > 0:
                 st.success(f"✅ {uploaded_file.name} uploaded ({actual_total_pages} pages).")
+                render_engine_caption(document)
                 pdf_is_valid_for_processing = True
             else:
                 # If actual_total_pages is 0 (e.g. empty PDF or PyPDF2 issue)
@@ -137,6 +194,9 @@ def render_control_panel():
             
             selected_pages = list(range(start_page, end_page + 1))
             st.info(f"Selected pages: {selected_pages}")
+            # Extracts the pages while the user is still choosing, nearest to the selection first
+            prefetcher.start(uploaded_file.file_id, document, selected_pages)
+            render_prefetch_caption(prefetcher.status(uploaded_file.file_id))
         else:
             # If PDF is not valid for processing, selected_pages remains empty
             selected_pages = []
@@ -151,46 +211,157 @@ def render_control_panel():
         index=0,
         key="model_name_select" 
     )
+
+    keep_warm = st.checkbox(
+        "Keep model warm",
+        value=True,
+        help="Connects to LM Studio and loads the selected model in the background, so the first analysis does not pay for it.",
+        key="keep_warm_checkbox"
+    )
+    if keep_warm:
+        # No-op when the model is already pooled or warming up
+        model_pool = get_model_pool(get_logger())
+        model_pool.warm_up(model_name)
+        model_status = model_pool.status(model_name)
+        if model_status == READY:
+            st.caption("🟢 Model ready")
+        elif model_status == WARMING:
+            st.caption("🟡 Model warming up...")
+        elif model_status == UNAVAILABLE:
+            st.caption("🔴 Model unavailable, is the LM Studio server running?")
+    scheduler_stats = get_model_scheduler(get_logger()).stats()
+    st.caption(
+        f"🚦 Model calls: {scheduler_stats['running']}/{scheduler_stats['max_concurrent']} running · "
+        f"{scheduler_stats['waiting']} waiting · {scheduler_stats['coalesced']} answered by an identical call",
+        help="All sessions share the model. Waiting calls are served in turn per browser tab; identical requests that arrive while one is running get its response instead of a second call."
+    )
     
-    prompt_key = st.selectbox(
-        "Analysis Type (Prompt)", 
-        ["summary"], 
-        index=0, 
-        help="Currently only 'summary' prompt is supported.",
+    prompt_key = st.multiselect(
+        "Analysis Types (Prompts)",
+        analysis_prompt_keys(),
+        default=["summary"],
+        help="Several analyses of one run share a single text extraction. The document comes first in every prompt, so the model server can reuse it and each extra analysis mostly costs its instructions.",
         key="prompt_key_select"
     )
+
+    map_reduce = st.checkbox(
+        "Long document mode (map-reduce)",
+        value=True,
+        help="Splits long page ranges into chunks that fit the model's context, summarizes them in parallel and merges the results. Short ranges still use a single call.",
+        key="map_reduce_checkbox"
+    )
+
+    overlap = st.checkbox(
+        "Overlap extraction and analysis",
+        value=False,
+        help="Sends the text to the model chunk by chunk while later pages are still being extracted, and shows each partial result as it arrives. Useful for long page ranges; always works in long document mode.",
+        key="overlap_checkbox"
+    )
+
+    compact = st.checkbox(
+        "Compact text before analysis",
+        value=True,
+        help="Removes running headers/footers and page numbers, joins hyphenated words and collapses whitespace, so fewer prompt tokens are sent to the model.",
+        key="compact_checkbox"
+    )
+
+    summary_index = st.checkbox(
+        "Use summary index",
+        value=False,
+        help=f"Keeps summaries of {LEAF_PAGES}-page windows and of their merges (a segment tree per PDF and model). A new page range is then combined from a few stored summaries plus its edge pages instead of summarizing all its text. Missing parts are computed and stored on the way; precompute the whole index once for long manuals.",
+        key="summary_index_checkbox"
+    )
+    index_button = False
+    if summary_index and pdf_is_valid_for_processing:
+        stored_nodes, total_nodes = summary_index_coverage(
+            uploaded_file, model_name, get_logger(), compact=compact, document_cache=document_cache
+        )
+        st.caption(f"🌳 Summary index: {stored_nodes}/{total_nodes} nodes stored for this PDF and model")
+        index_button = st.button("🌳 Precompute Summary Index", disabled=stored_nodes == total_nodes)
+
+    st.subheader("⚡ Result Cache")
+    use_cache = st.checkbox(
+        "Use cached results",
+        value=True,
+        help="Reuse the result of an earlier run with the same PDF, pages, model and prompt. Untick to force a fresh analysis.",
+        key="use_cache_checkbox"
+    )
+    result_cache = get_result_cache(get_logger())
+    cache_stats = result_cache.stats()
+    page_store = get_page_store(get_logger())
+    store_stats = page_store.stats()
+    st.caption(
+        f"Hits: {cache_stats['hits']} · Misses: {cache_stats['misses']} · "
+        f"Stored: {cache_stats['disk_entries']} ({cache_stats['disk_bytes'] / 1024:.1f} KB) · "
+        f"Extracted pages: {store_stats['pages']} of {store_stats['documents']} PDFs ({store_stats['bytes'] / 1024:.1f} KB)"
+    )
+    if st.button("🧹 Clear Cache", help="Drops the cached analysis results. Extracted pages and the summary index are kept."):
+        result_cache.invalidate()
+        st.rerun()
+
+    with st.expander("🗃️ Stored Data (shared by all sessions)"):
+        st.caption("These stores serve every session of this server; a cleared one is rebuilt by the next runs that need it.")
+        if st.button("Clear extracted pages", help="Page texts stored by analyses and by background pre-extraction."):
+            page_store.clear()
+            st.rerun()
+        if st.button("Clear question indexes", help="Search indexes of follow-up questions, rebuilt from the stored pages."):
+            get_retrieval_index_cache(get_logger()).clear()
+            st.rerun()
+        if st.button("Clear summary index", help="Precomputed summaries of page windows of every PDF and model."):
+            get_summary_node_store(get_logger()).clear()
+            st.rerun()
+        if st.button("Reset engine calibrations", help="The extraction engine chosen per PDF; the next large extraction calibrates again."):
+            get_engine_selector(get_logger()).clear()
+            st.rerun()
+
+    stream = st.checkbox(
+        "Stream response",
+        value=True,
+        help="Shows the model output as it is generated, with time-to-first-token and tokens/sec.",
+        key="stream_checkbox"
+    )
+
+    analysis_options = {
+        "map_reduce": map_reduce, "use_cache": use_cache, "compact": compact, "summary_index": summary_index, "stream": stream,
+        "overlap": overlap
+    }
     
     # Determine whether analysis can be started
     can_start_analysis = (
         uploaded_file is not None and           # A file must be uploaded
         pdf_is_valid_for_processing and         # PDF must be readable and contain pages
-        bool(selected_pages)                    # A valid page range must be selected
+        bool(selected_pages) and                # A valid page range must be selected
+        bool(prompt_key)                        # At least one analysis must be selected
     )
 
     start_button = st.button(
         "🚀 Start Analysis",
         type="primary",
-        disabled=st.session_state.get('processing', False) or not can_start_analysis
+        disabled=not can_start_analysis
     )
+    render_timing_caption(get_script_timer(get_logger()).report())
     
-    return uploaded_file, selected_pages, model_name, prompt_key, start_button
+    return uploaded_file, selected_pages, model_name, prompt_key, analysis_options, start_button, index_button
+
+def render_chat_and_results(job_manager, client_id, can_ask=False):
+    """Shows the chat history, running analyses and analysis results on the right side.
 
-def render_chat_and_results():
-    """Shows the chat history and analysis results on the right side."""
+    Returns a submitted follow-up question, or None.
+    """
     st.header("💬 Chat and Results")
     
     chat_container = st.container()
     with chat_container:
-        for message in st.session_state.get('chat_history', []):
-            css_class = "user-message" if message["role"] == "user" else "bot-message"
-            role_icon = "👤" if message["role"] == "user" else "🤖"
-            role_name = "You" if message["role"] == "user" else "AI Assistant"
-            st.markdown(f"""
-            <div class="chat-message {css_class}">
-                <strong>{role_icon} {role_name} ({message["timestamp"]}):</strong><br>
-                {message["content"]}
-            </div>
-            """, unsafe_allow_html=True)
+        messages, page_count = get_chat_page(st.session_state.chat_page)
+        # One markdown element for the whole page instead of one per message
+        st.markdown("".join(_message_html(message) for message in messages), unsafe_allow_html=True)
+        if page_count > 1:
+            _render_chat_pager(page_count)
+
+    # Queued and running analyses of this browser tab
+    render_jobs(job_manager, client_id)
+
+    question = render_question_box(can_ask)
 
     if st.session_state.get('current_result'):
         st.subheader("📊 Analysis Result")
@@ -199,20 +370,198 @@ def render_chat_and_results():
             if isinstance(result_json, str):
                  result_json = json.loads(result_json)
             
-            st.markdown('<div class="json-container">', unsafe_allow_html=True)
-            st.json(result_json)
-            st.markdown('</div>', unsafe_allow_html=True)
+            col_json, col_trace = st.columns([3, 2])
+            with col_json:
+                st.markdown('<div class="json-container">', unsafe_allow_html=True)
+                if "analyses" in result_json:
+                    # Several analyses of one run, one tab each
+                    analyses = result_json["analyses"]
+                    for tab, analysis in zip(st.tabs(list(analyses)), analyses.values()):
+                        with tab:
+                            st.json(analysis or {})
+                else:
+                    st.json(result_json)
+                st.markdown('</div>', unsafe_allow_html=True)
+            with col_trace:
+                _render_trace(st.session_state.get('current_trace'))
             
             _render_save_buttons(result_json)
 
         except Exception as e:
             st.error(f"Error displaying result: {e}")
     
+    render_result_archive()
+
     if st.button("🗑️ Clear History"):
-        st.session_state.chat_history = []
+        clear_chat_history()
         st.session_state.current_result = None
+        st.session_state.current_trace = None
         st.rerun()
 
+    return question
+
+def _message_html(message):
+    css_class = "user-message" if message["role"] == "user" else "bot-message"
+    role_icon = "👤" if message["role"] == "user" else "🤖"
+    role_name = "You" if message["role"] == "user" else "AI Assistant"
+    # Messages are plain text (questions and answers included), not HTML
+    content = html.escape(message["content"]).replace("\n", "<br>")
+    return f"""
+    <div class="chat-message {css_class}">
+        <strong>{role_icon} {role_name} ({message["timestamp"]}):</strong><br>
+        {content}
+    </div>
+    """
+
+def _set_chat_page(page):
+    st.session_state.chat_page = page
+
+def _render_chat_pager(page_count):
+    """Older/newer buttons under the chat; page 0 is the newest."""
+    page = min(st.session_state.chat_page, page_count - 1)
+    col_older, col_position, col_newer = st.columns([1, 2, 1])
+    col_older.button(
+        "⬅️ Older", key="chat_older", disabled=page >= page_count - 1, on_click=_set_chat_page, args=(page + 1,)
+    )
+    col_position.caption(f"Page {page_count - page} of {page_count}")
+    col_newer.button("Newer ➡️", key="chat_newer", disabled=page == 0, on_click=_set_chat_page, args=(page - 1,))
+
+def render_result_archive():
+    """Full-text search over all earlier results (title, summary and keywords)."""
+    result_archive = get_result_archive(get_logger())
+    with st.expander(f"🗄️ Result Archive ({result_archive.stats()['results']} results)"):
+        query = st.text_input(
+            "Search earlier results", placeholder="e.g. energy market policy", key="archive_query",
+            help="Finds results containing every word (also as a word prefix) in their title, summary or keywords."
+        )
+        started = time.perf_counter()
+        hits = result_archive.search(query)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if not hits:
+            st.caption("No archived results match." if query else "Results appear here once an analysis has finished.")
+            return
+        st.caption(f"{len(hits)} result(s) in {elapsed_ms:.1f} ms" + (" (best match first)" if query else " (newest first)"))
+        st.dataframe(
+            [
+                {
+                    "date": datetime.fromtimestamp(hit["created"]).strftime("%Y-%m-%d %H:%M"),
+                    "file": hit["file_name"],
+                    "pages": hit["pages"],
+                    "analysis": hit["prompt_key"],
+                    "title": hit["title"],
+                    "match": hit["snippet"]
+                }
+                for hit in hits
+            ],
+            hide_index=True,
+            use_container_width=True
+        )
+        labels = {hit["id"]: f"#{hit['id']} · {hit['title'] or hit['file_name']} ({hit['prompt_key']})" for hit in hits}
+        col_select, col_open = st.columns([3, 1])
+        result_id = col_select.selectbox(
+            "Result", list(labels), format_func=labels.get, label_visibility="collapsed", key="archive_result_select"
+        )
+        if col_open.button("📂 Open", key="archive_open"):
+            st.session_state.current_result = result_archive.get_result(result_id)
+            st.session_state.current_trace = None
+            st.rerun()
+
+def render_question_box(can_ask):
+    """Creates the follow-up question field under the chat; returns the submitted question or None."""
+    with st.form("question_form", clear_on_submit=True, border=False):
+        col_question, col_ask = st.columns([5, 1])
+        question = col_question.text_input(
+            "Ask a question about the selected pages",
+            placeholder="e.g. What does the report say about energy costs?",
+            label_visibility="collapsed",
+            disabled=not can_ask
+        )
+        asked = col_ask.form_submit_button("💬 Ask", disabled=not can_ask)
+    if not can_ask:
+        st.caption("Upload a PDF and select pages to ask follow-up questions. Only the most relevant pages are sent to the model.")
+    if asked and question.strip():
+        return question.strip()
+    return None
+
+def _render_trace(trace):
+    """Shows the timed pipeline stages of the run that produced the result."""
+    st.markdown("**⏱️ Run Trace**")
+    if not trace:
+        st.caption("No trace recorded for this result.")
+        return
+    peak_rss = trace.get("attributes", {}).get("peak_rss_bytes")
+    peak_private = trace.get("attributes", {}).get("peak_private_bytes") or 0
+    peak_text = f" · peak RSS {peak_rss / 2**20:.0f} MB ({peak_private / 2**20:.0f} MB private)" if peak_rss else ""
+    st.caption(f"Run {trace['run_id']} · {trace['model']} · {trace['total_ms'] / 1000:.2f} s total{peak_text}")
+    st.dataframe(
+        [
+            {
+                "stage": "\u00a0\u00a0" * span["depth"] + span["name"],
+                "ms": round(span["duration_ms"], 1),
+                "details": ", ".join(f"{k}={v:g}" if isinstance(v, (int, float)) else f"{k}={v}"
+                                     for k, v in span["attributes"].items()) + (f" ❌ {span['error']}" if span["error"] else "")
+            }
+            for span in trace["spans"]
+        ],
+        hide_index=True,
+        use_container_width=True
+    )
+
+def render_jobs(job_manager, client_id):
+    """Shows queued and running analyses; polls for updates while any of them is active."""
+    run_every = JOB_POLL_SECONDS if job_manager.has_active(client_id) else None
+    st.fragment(_render_jobs_body, run_every=run_every)(job_manager, client_id)
+
+def _render_jobs_body(job_manager, client_id):
+    jobs = job_manager.jobs_for(client_id)
+    # A finished job needs a full rerun to move its messages and result into the page
+    if any(job.finished and job.job_id not in st.session_state.collected_jobs for job in jobs):
+        st.rerun()
+
+    for job in jobs:
+        if job.finished:
+            continue
+        with st.container(border=True):
+            if job.status == QUEUED:
+                st.markdown(f"⏳ **Queued** (position {job_manager.queue_position(job)}) · {job.description}")
+            else:
+                st.markdown(f"🔄 **Running** for {time.time() - job.started_at:.0f}s · {job.description}")
+                messages = job.messages_since(0)
+                if messages:
+                    st.caption(messages[-1]["content"])
+                text, stats = job.stream_snapshot()
+                if stats:
+                    render_stream_update(st.empty(), text, stats)
+            st.button(
+                "⏹️ Cancel", key=f"cancel_job_{job.job_id}",
+                on_click=job_manager.cancel, args=(job.job_id,)
+            )
+
+def render_stream_update(live_output, text, stats):
+    """Shows the streamed response and its speed in the live output area."""
+    with live_output.container():
+        ttft = f"{stats['ttft']:.2f} s" if stats["ttft"] is not None else "waiting..."
+        st.caption(
+            f"⏱️ Time to first token: {ttft} · ⚡ {stats['tokens_per_second']:.1f} tokens/s · "
+            f"🔢 {stats['tokens']} tokens"
+        )
+        answer = _answer_text(text) if "partial_json" not in stats else ""
+        if stats.get("partial_json"):
+            st.json(stats["partial_json"])
+        elif answer:
+            # Plain-text response (follow-up questions): the answer so far, without the reasoning
+            st.markdown(answer)
+        else:
+            # Reasoning phase: show only the tail so the update stays cheap
+            st.code(text[-1500:], language=None)
+
+def _answer_text(text):
+    # Text after the <think> block; empty while the model is still reasoning
+    head = text.lstrip()
+    if head.startswith("<think>"):
+        return text.split("</think>", 1)[1].strip() if "</think>" in text else ""
+    return "" if "<think>".startswith(head) else text.strip()
+
 def _render_save_buttons(result_json):
     """Creates buttons for saving results."""
     st.subheader("💾 Save Results")
@@ -230,7 +579,8 @@ def _render_save_buttons(result_json):
         )
     
     with col_save2:
-        summary_text = result_json.get("summary", str(result_json))
+        summary_result = result_json.get("analyses", {}).get("summary") or result_json
+        summary_text = summary_result.get("summary", json_str)
         st.download_button(
             label="📝 Download Text",
             data=summary_text,
@@ -0,0 +1,59 @@
+import logging
+
+import src.app_logic as app_logic
+from benchmarks.synthetic_pdf import make_pdf
+from src.Utils.document_cache import DocumentCache
+from src.Utils.result_cache import ResultCache
+
+logger = logging.getLogger("test_app_logic")
+
+
+class Upload:
+    """Stands in for Streamlit's UploadedFile."""
+
+    def __init__(self, data, name="report.pdf"):
+        self.data = data
+        self.name = name
+        self.file_id = "upload-1"
+
+    def getvalue(self):
+        return self.data
+
+
+class FakeTree:
+    def summarize_range(self, start, end, status_callback=None, cancel_event=None):
+        return {"summary": f"pages {start + 1}-{end}"}
+
+
+class FakeArchive:
+    def __init__(self):
+        self.results = []
+
+    def add_result(self, result, *args):
+        self.results.append(result)
+
+
+def test_summary_index_result_is_cached_and_archived(tmp_path, monkeypatch):
+    # metrics.prom is written to the working directory
+    monkeypatch.chdir(tmp_path)
+    result_cache = ResultCache(logger, cache_dir=str(tmp_path / "results"))
+    archive = FakeArchive()
+    monkeypatch.setattr(app_logic, "get_result_cache", lambda logger: result_cache)
+    monkeypatch.setattr(app_logic, "get_result_archive", lambda logger: archive)
+    monkeypatch.setattr(app_logic, "_summary_tree", lambda *args: FakeTree())
+
+    def no_analysis(*args, **kwargs):
+        raise AssertionError("the summary should come from the summary index")
+
+    monkeypatch.setattr(app_logic, "_analyze", no_analysis)
+    upload = Upload(make_pdf(16))
+    run = dict(
+        pdf_file=upload, selected_pages=list(range(1, 17)), model_name="stub", prompt_key="summary", logger=logger,
+        status_callback=lambda role, content: None, summary_index=True, document_cache=DocumentCache(logger)
+    )
+    first = app_logic.process_pdf_pipeline(**run)
+    assert first == {"summary": "pages 1-16"}
+    assert archive.results == [first]
+
+    monkeypatch.setattr(app_logic, "_summary_tree", lambda *args: no_analysis())
+    assert app_logic.process_pdf_pipeline(**run) == first
@@ -0,0 +1,38 @@
+import os
+import json
+
+from benchmarks.synthetic_pdf import make_pdf
+from src.batch import build_parser, run_batch
+from src.Utils.stub_model import StubModel
+
+
+def _run(tmp_path, model):
+    args = build_parser().parse_args([
+        str(tmp_path / "pdfs"), "--pages", "1-2", "--output", str(tmp_path / "results.jsonl"),
+        "--model", "stub", "--workers", "1", "--llm-concurrency", "1"
+    ])
+    return run_batch(args, model=model)
+
+
+def test_rerun_resumes_after_finished_documents_and_retries_failures(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pdfs = tmp_path / "pdfs"
+    pdfs.mkdir()
+    for name in ("a", "b"):
+        (pdfs / f"{name}.pdf").write_bytes(make_pdf(3))
+    (pdfs / "broken.pdf").write_bytes(b"not a pdf")
+
+    first = _run(tmp_path, StubModel())
+    assert (first["processed"], first["failed"], first["skipped"]) == (2, 1, 0)
+
+    # Only the failed document is tried again; a changed file counts as new work
+    stat = os.stat(pdfs / "a.pdf")
+    os.utime(pdfs / "a.pdf", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    model = StubModel()
+    second = _run(tmp_path, model)
+    assert (second["processed"], second["failed"], second["skipped"]) == (1, 1, 1)
+    assert model.calls == 1
+
+    with open(tmp_path / "results.jsonl", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert [os.path.basename(row["file"]) for row in rows if row["status"] == "ok"] == ["a.pdf", "b.pdf", "a.pdf"]
@@ -0,0 +1,37 @@
+import logging
+
+import src.Utils.extractors as extractors
+from benchmarks.synthetic_pdf import make_pdf
+from src.Utils.extractors import EngineSelector, FALLBACK_ENGINE, CALIBRATION_MIN_PAGES, get_engine_selector
+from src.Utils.page_store import PageStore
+from src.Utils.pdf_util import PdfUtils
+
+logger = logging.getLogger("test_extractors")
+
+
+def _no_calibration(*args, **kwargs):
+    raise AssertionError("calibrate() should not run")
+
+
+def test_auto_without_hash_uses_fallback_without_calibrating(monkeypatch):
+    monkeypatch.setattr(extractors, "calibrate", _no_calibration)
+    selector = EngineSelector(logger)
+    pages = list(range(CALIBRATION_MIN_PAGES * 2))
+    assert selector.select(None, b"", pages, "auto") == FALLBACK_ENGINE
+
+
+def test_fully_stored_pages_skip_engine_selection(tmp_path, monkeypatch):
+    get_engine_selector(logger).clear()
+    page_store = PageStore(logger, path=str(tmp_path / "pages.sqlite3"))
+    pdf_bytes = make_pdf(CALIBRATION_MIN_PAGES)
+    pages = list(range(CALIBRATION_MIN_PAGES))
+    first = PdfUtils(logger, page_store=page_store, engine="auto").extract_pages(pdf_bytes, pages, max_workers=1, doc_hash="doc")
+
+    get_engine_selector(logger).clear()
+
+    def no_selection(*args, **kwargs):
+        raise AssertionError("select() should not run")
+
+    monkeypatch.setattr(EngineSelector, "select", no_selection)
+    again = PdfUtils(logger, page_store=page_store, engine="auto").extract_pages(pdf_bytes, pages, max_workers=1, doc_hash="doc")
+    assert again == first
@@ -0,0 +1,174 @@
+import re
+import json
+import logging
+import threading
+
+import pytest
+
+from src.Utils.llm_utils import LlmUtils, ANALYSIS_SCHEMAS
+from src.Utils.stub_model import StubModel
+
+logger = logging.getLogger("test_llm_utils")
+
+RESPONSES = [
+    '{"title": "first"} {"title": "second"}',
+    '<think>maybe {"title": "draft"}</think>\n{"title": "first", "keywords": ["a}"]}\nor {"title": "second"}',
+    '{"title": "first"} then {"title": "second"} and invalid {"title": }',
+]
+
+
+@pytest.mark.parametrize("response", RESPONSES)
+@pytest.mark.parametrize("chunk", [1, 7, 1000])
+def test_streaming_and_final_parsing_pick_the_last_valid_object(response, chunk):
+    parser = LlmUtils.StreamingJsonParser()
+    for i in range(0, len(response), chunk):
+        parser.feed(response[i:i + chunk])
+
+    processor = LlmUtils.OutputProcessor(logger)
+    final = processor.extract_json(processor.clean_text(response))
+    assert parser.result == final
+    assert final["title"] == "second"
+
+
+def test_stream_is_read_to_the_end():
+    response = '{"title": "draft"}\n{"title": "final", "summary": "done"}'
+    model = StubModel(response=response)
+    runner = LlmUtils.ModelRunner(model, logger)
+    previews = []
+    raw = runner.run_stream("prompt", token_callback=lambda text, stats: previews.append(stats["partial_json"]))
+
+    assert raw == response
+    assert previews[-1] == {"title": "final", "summary": "done"}
+
+
+def test_streamed_question_answer_is_plain_text():
+    answer = 'Use {"mode": "fast"} first (page 2), then {"mode": "safe"} (page 3).'
+    llm_utils = LlmUtils(logger, StubModel(response="<think>checking</think>\n" + answer), None, "question")
+    updates = []
+    result = llm_utils.run_question(
+        "Which mode?", [(2, "fast"), (3, "safe")], token_callback=lambda text, stats: updates.append(stats)
+    )
+
+    assert result == answer
+    assert updates and all("partial_json" not in stats for stats in updates)
+
+
+class ScriptedModel:
+    # Answers the calls with the given responses in turn
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.prompts = []
+
+    def respond(self, prompt):
+        self.prompts.append(prompt)
+        return self.responses.pop(0)
+
+
+@pytest.mark.parametrize("prompt_key", ["summary", "keywords", "qa"])
+def test_stub_answers_with_the_schema_of_the_prompt(prompt_key):
+    model = StubModel()
+    result = LlmUtils(logger, model, "Some document text.", prompt_key).run_full_pipeline()
+
+    assert not LlmUtils.OutputProcessor.validate(result, ANALYSIS_SCHEMAS[prompt_key])
+    assert model.calls == 1
+
+
+def test_malformed_response_gets_one_repair_call(caplog):
+    repaired = {"keywords": ["pdf"], "topics": ["Parsing"]}
+    model = ScriptedModel('Here you go: {"keywords": ["pdf"], "topics": "Parsing"}', json.dumps(repaired))
+    with caplog.at_level(logging.WARNING, logger=logger.name):
+        result = LlmUtils(logger, model, "Some document text.", "keywords").run_full_pipeline()
+
+    assert result == repaired
+    assert len(model.prompts) == 2
+    # Only the broken response goes back, with the fields the keywords prompt expects
+    assert "Some document text." not in model.prompts[1]
+    assert "topics: list" in model.prompts[1] and "'topics' must be a list" in model.prompts[1]
+    assert "Response to the 'keywords' prompt is not a valid result" in caplog.text
+
+
+def test_valid_response_is_not_repaired():
+    model = ScriptedModel('{"title": "t", "summary": "s", "keywords": [], "sections": {}}')
+    assert LlmUtils(logger, model, "text", "summary").run_full_pipeline()["title"] == "t"
+    assert len(model.prompts) == 1
+
+
+def test_chunks_are_labelled_with_the_pages_of_their_lines():
+    chunker = LlmUtils.TextChunker(max_tokens=5, logger=logger)  # 20 characters
+    parts = [(1, "a" * 9 + "\n" + "b" * 9 + "\n"), (2, "c" * 9 + "\n"), (3, "d" * 45 + "\n")]
+
+    chunks = list(chunker.iter_chunks(parts))
+
+    assert [(first, last) for _, first, last in chunks] == [(1, 1), (2, 2), (3, 3), (3, 3), (3, 3)]
+    assert "".join(text for text, _, _ in chunks) == "".join(text for _, text in parts)
+
+
+class PartsModel:
+    # Summarizes any prompt as the "partN" markers in it, in order, so merges show what they combined
+    def __init__(self):
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def respond(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+        parts = " ".join(re.findall(r"part\d+", prompt))
+        return json.dumps({"title": "Doc", "summary": parts, "keywords": ["k"], "sections": {}})
+
+
+def test_map_reduce_summarizes_every_chunk_once_and_merges_in_document_order():
+    text = "".join(f"part{i} {'x' * 30}\n" for i in range(40))
+    model = PartsModel()
+    result = LlmUtils(logger, model, text, "summary").run_map_reduce(max_chunk_tokens=50, max_concurrency=3)
+
+    assert result["summary"] == " ".join(f"part{i}" for i in range(40))
+    chunk_prompts = [p for p in model.prompts if p.startswith("PDF content:")]
+    merge_prompts = [p for p in model.prompts if not p.startswith("PDF content:")]
+    assert len(chunk_prompts) == 8
+    assert sorted(re.findall(r"part\d+", "".join(chunk_prompts))) == sorted(f"part{i}" for i in range(40))
+    # The partial results do not fit into one merge prompt, so they are merged over several levels
+    assert len(merge_prompts) > 1
+
+
+def test_local_merge_keeps_document_order_and_drops_duplicate_keywords():
+    partials = [
+        {"title": "", "summary": "First.", "keywords": ["PDF", "parsing"], "sections": {"Intro": "a"}},
+        {"title": "Doc", "summary": "Second.", "keywords": ["pdf", "tables"], "sections": {"Intro": "b", "End": "c"}},
+    ]
+    merged = LlmUtils.OutputProcessor(logger).merge_results(partials)
+
+    assert merged == {
+        "title": "Doc", "summary": "First. Second.", "keywords": ["PDF", "parsing", "tables"],
+        "sections": {"Intro": "a", "End": "c"}
+    }
+
+
+def test_analyses_of_one_text_run_back_to_back_and_share_the_document_prefix():
+    text = "Shared document text. " * 50
+    model = StubModel(prefix_cache=True)
+    results = LlmUtils(logger, model, text, "summary").run_analyses(["summary", "keywords", "qa"])
+
+    assert list(results) == ["summary", "keywords", "qa"]
+    assert all(not LlmUtils.OutputProcessor.validate(results[key], ANALYSIS_SCHEMAS[key]) for key in results)
+    # After the first call only the instructions after the document are processed again
+    assert model.calls == 3
+    assert model.prefilled_chars < sum(map(len, model.prompts)) - 2 * len(text)
+
+
+def test_long_text_runs_every_analysis_per_chunk_and_merges_each_one():
+    text = "".join(f"part{i} {'x' * 30}\n" for i in range(20))
+    model = StubModel(think=False)
+    results = LlmUtils(logger, model, text, "summary").run_analyses(
+        ["summary", "keywords", "qa"], map_reduce=True, max_chunk_tokens=50, max_concurrency=1
+    )
+
+    chunk_prompts = [p for p in model.prompts if p.startswith("PDF content:")]
+    assert len(chunk_prompts) == 12
+    # The analyses of one chunk follow each other, so the chunk stays in the server's prompt cache
+    for i in range(0, len(chunk_prompts), 3):
+        assert len({p.split("\n---\n")[0] for p in chunk_prompts[i:i + 3]}) == 1
+    assert all(not LlmUtils.OutputProcessor.validate(results[key], ANALYSIS_SCHEMAS[key]) for key in results)
+    # Keywords and questions have no merge prompt and are combined locally
+    assert results["keywords"] == {"keywords": ["stub", "test"], "topics": ["Stub Topic"]}
+    merge_prompts = [p for p in model.prompts if p not in chunk_prompts]
+    assert merge_prompts and all(p.startswith("The JSON objects below are partial analyses") for p in merge_prompts)
@@ -0,0 +1,33 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from logging.handlers import QueueHandler
+
+from src.Utils.logger_config import get_logger, stop_logging
+
+LOGGER_NAME = "test_pool_logger"
+
+
+def _log_in_worker(message):
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.info(message)
+    # The worker must not write to the parent's rotating file itself
+    return [type(handler) for handler in logger.handlers]
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs the fork start method")
+def test_record_logged_in_pool_worker_reaches_log_file(tmp_path):
+    log_file = tmp_path / "app.log"
+    get_logger(LOGGER_NAME, level="INFO", log_file=str(log_file))
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork")) as pool:
+            assert pool.submit(_log_in_worker, "written by the worker").result() == [QueueHandler]
+        logging.getLogger(LOGGER_NAME).info("written by the parent")
+    finally:
+        stop_logging(LOGGER_NAME)
+    text = log_file.read_text(encoding="utf-8")
+    assert "written by the worker" in text
+    assert "written by the parent" in text
@@ -0,0 +1,78 @@
+import time
+import logging
+import threading
+
+import pytest
+
+from src.Utils.model_pool import ModelPool, READY, UNAVAILABLE
+
+logger = logging.getLogger("test_model_pool")
+
+
+class Handle:
+    def __init__(self):
+        self.healthy = True
+        self.checks = 0
+
+    def get_info(self):
+        self.checks += 1
+        if not self.healthy:
+            raise ConnectionError("server restarted")
+
+
+class CountingPool(ModelPool):
+    # Resolves every model to a new Handle, slowly, and counts the resolutions
+    def __init__(self, **kwargs):
+        super().__init__(logger, **kwargs)
+        self.resolved = []
+        self.attempts = 0
+
+    def _resolve(self, model_name):
+        self.attempts += 1
+        time.sleep(0.05)
+        if model_name == "missing":
+            raise RuntimeError("model not found")
+        handle = Handle()
+        self.resolved.append(handle)
+        return handle
+
+
+def test_handle_is_checked_after_the_interval_and_replaced_when_unhealthy():
+    pool = CountingPool(health_check_seconds=60)
+    handle = pool.acquire("model")
+    assert pool.acquire("model") is handle
+    assert handle.checks == 0
+
+    pool.health_check_seconds = 0
+    assert pool.acquire("model") is handle
+    assert handle.checks == 1
+
+    handle.healthy = False
+    replacement = pool.acquire("model")
+    assert replacement is not handle
+    assert pool.status("model") == READY
+
+
+def test_concurrent_requests_for_a_cold_model_resolve_it_once():
+    pool = CountingPool()
+    handles = []
+    threads = [threading.Thread(target=lambda: handles.append(pool.acquire("model"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(pool.resolved) == 1
+    assert all(handle is pool.resolved[0] for handle in handles)
+
+
+def test_failed_warm_up_is_not_retried_right_away():
+    pool = CountingPool()
+    pool.warm_up("missing", background=False)
+    assert pool.status("missing") == UNAVAILABLE
+
+    pool.warm_up("missing", background=False)
+    assert pool.status("missing") == UNAVAILABLE
+    assert pool.attempts == 1
+    with pytest.raises(RuntimeError):
+        pool.acquire("missing")
@@ -0,0 +1,69 @@
+import logging
+import sqlite3
+
+from benchmarks.synthetic_pdf import make_pdf
+from src.Utils.page_store import PageStore
+from src.Utils.pdf_util import PdfUtils
+
+logger = logging.getLogger("test_page_store")
+
+
+def test_pages_of_different_extractor_versions_are_kept_side_by_side(tmp_path):
+    store = PageStore(logger, path=str(tmp_path / "pages.sqlite3"))
+    store.put_pages("doc", [(0, "old text", None), (1, "", None)], "pypdf2:1")
+    store.put_pages("doc", [(0, "new text", None)], "pymupdf:1")
+
+    assert store.stored_versions("doc") == {"pypdf2:1", "pymupdf:1"}
+    assert store.get_pages("doc", [0, 1], "pypdf2:1") == {0: ("old text", None), 1: ("", None)}
+    assert store.get_pages("doc", [0, 1], "pymupdf:1") == {0: ("new text", None)}
+
+
+def test_store_of_the_old_schema_is_rebuilt(tmp_path):
+    path = str(tmp_path / "pages.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "CREATE TABLE pages (doc_hash TEXT NOT NULL, page_index INTEGER NOT NULL, extractor_version TEXT NOT NULL, "
+        "status TEXT NOT NULL, text TEXT NOT NULL, error TEXT, updated REAL NOT NULL, PRIMARY KEY (doc_hash, page_index));"
+        "INSERT INTO pages VALUES ('doc', 0, 'pypdf2:1', 'ok', 'text', NULL, 0);"
+    )
+    conn.close()
+
+    store = PageStore(logger, path=path)
+    assert store.stored_versions("doc") == set()
+    store.put_pages("doc", [(0, "a", None)], "pypdf2:1")
+    store.put_pages("doc", [(0, "b", None)], "pymupdf:1")
+    assert store.stats()["pages"] == 2
+
+
+def test_failed_version_lookup_counts_as_nothing_stored(tmp_path):
+    store = PageStore(logger, path=str(tmp_path / "pages.sqlite3"))
+    store.put_pages("doc", [(0, "text", None)], "pypdf2:1")
+    store._conn.execute("DROP TABLE pages")
+
+    assert store.stored_versions("doc") == set()
+
+
+def _stored_pages(store, page_indices):
+    stored = store.get_pages("doc", page_indices, next(iter(store.stored_versions("doc"))))
+    return [(i, *stored[i]) for i in page_indices]
+
+
+def test_only_pages_missing_from_the_store_are_extracted(tmp_path, monkeypatch):
+    store = PageStore(logger, path=str(tmp_path / "pages.sqlite3"))
+    pdf_bytes = make_pdf(10)
+    pdf_utils = PdfUtils(logger, page_store=store, engine="pypdf2")
+    extracted = []
+    extract = pdf_utils._extract
+
+    def spy(source, page_indices, *args):
+        extracted.append(list(page_indices))
+        return extract(source, page_indices, *args)
+
+    monkeypatch.setattr(pdf_utils, "_extract", spy)
+    pdf_utils.extract_pages(pdf_bytes, range(0, 5), max_workers=1, doc_hash="doc")
+    pages = pdf_utils.extract_pages(pdf_bytes, range(2, 9), max_workers=1, doc_hash="doc")
+    batches = list(pdf_utils.iter_pages(pdf_bytes, range(0, 9), max_workers=1, doc_hash="doc", batch_pages=4))
+
+    assert extracted == [[0, 1, 2, 3, 4], [5, 6, 7, 8]]
+    assert pages == PdfUtils(logger, engine="pypdf2").extract_pages(pdf_bytes, range(2, 9), max_workers=1)
+    assert [page for batch in batches for page in batch] == _stored_pages(store, range(0, 9))
@@ -0,0 +1,52 @@
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import pytest
+
+import src.Utils.pdf_util as pdf_util
+from benchmarks.synthetic_pdf import make_pdf
+from src.Utils.extractors import SharedPdf
+from src.Utils.pdf_util import PdfUtils, PARALLEL_MIN_PAGES
+
+logger = logging.getLogger("test_pdf_util")
+
+
+class RecordingPool:
+    # Worker processes that keep the source each task was sent
+    def __init__(self):
+        self.executor = ProcessPoolExecutor(max_workers=2)
+        self.sources = []
+
+    def submit(self, func, engine, source, page_indices):
+        self.sources.append(source)
+        return self.executor.submit(func, engine, source, page_indices)
+
+
+def test_workers_get_a_shared_memory_block_instead_of_the_pdf_bytes(monkeypatch, tmp_path):
+    pool = RecordingPool()
+    monkeypatch.setattr(pdf_util, "_get_process_pool", lambda: pool)
+    monkeypatch.setattr(pdf_util.os, "cpu_count", lambda: 2)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    pdf_bytes = make_pdf(PARALLEL_MIN_PAGES)
+    pages = list(range(PARALLEL_MIN_PAGES))
+    pdf_utils = PdfUtils(logger, engine="pypdf2")
+
+    try:
+        expected = pdf_utils._extract_serial(pdf_bytes, pages, None, "pypdf2")
+        assert pdf_utils.extract_pages(pdf_bytes, pages, max_workers=2) == expected
+        streamed = [page for batch in pdf_utils.iter_pages(pdf_bytes, pages, max_workers=2) for page in batch]
+        assert streamed == expected
+    finally:
+        pool.executor.shutdown()
+
+    assert len(pool.sources) > 2
+    assert all(isinstance(source, SharedPdf) for source in pool.sources)
+    names = {source.name for source in pool.sources}
+    assert len(names) == 2
+    # Nothing was spooled to disk and the blocks are released
+    assert not list(tmp_path.iterdir())
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
@@ -0,0 +1,27 @@
+import time
+import logging
+
+from benchmarks.synthetic_pdf import make_pdf
+from src.Utils.document_cache import DocumentHandle
+from src.Utils.extractors import engine_version
+from src.Utils.page_store import PageStore
+from src.Utils.prefetch import Prefetcher, DONE, RUNNING
+
+logger = logging.getLogger("test_prefetch")
+
+
+def test_prefetch_stores_every_page_from_the_worker_processes(tmp_path):
+    page_store = PageStore(logger, path=str(tmp_path / "pages.sqlite3"))
+    document = DocumentHandle("upload", make_pdf(20))
+    prefetcher = Prefetcher(logger, page_store, cpu_share=1.0, engine="pypdf2")
+    prefetcher.start(document.file_id, document, selected_pages=[10])
+    deadline = time.monotonic() + 60
+    while prefetcher.status(document.file_id)["state"] == RUNNING and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert prefetcher.status(document.file_id) == {
+        "state": DONE, "pages": 20, "total_pages": 20, "extracted_pages": 20
+    }
+    stored = page_store.get_pages(document.doc_hash, range(20), engine_version("pypdf2"))
+    assert sorted(stored) == list(range(20))
+    assert all(text for text, error in stored.values())
@@ -0,0 +1,66 @@
+import logging
+
+import pytest
+
+import src.Utils.result_archive as result_archive_module
+from src.Utils.result_archive import ResultArchive
+
+logger = logging.getLogger("test_result_archive")
+
+
+@pytest.fixture(params=[True, False], ids=["fts5", "like"])
+def archive(request, tmp_path, monkeypatch):
+    if not request.param:
+        # Like an SQLite build without FTS5
+        monkeypatch.setattr(result_archive_module, "_FTS_SCHEMA", "CREATE VIRTUAL TABLE results_fts USING missing(x);")
+    archive = ResultArchive(logger, path=str(tmp_path / "archive.sqlite3"))
+    assert archive.full_text is request.param
+    return archive
+
+
+def _add(archive, file_name, result, prompt_key="summary"):
+    return archive.add_result(result, file_name, "hash-" + file_name, [1, 2, 3, 7], "model", prompt_key)
+
+
+def test_search_matches_every_word_as_a_prefix(archive):
+    _add(archive, "pumps.pdf", {"title": "Pump manual", "summary": "Maintaining centrifugal pumps.", "keywords": ["seals"]})
+    _add(archive, "tanks.pdf", {"title": "Tank guide", "summary": "Water tanks and pumps.", "keywords": []})
+    _add(archive, "qa.pdf", {"questions": [{"question": "How often?", "answer": "Check seals monthly."}]}, "qa")
+
+    assert {row["file_name"] for row in archive.search("pump")} == {"pumps.pdf", "tanks.pdf"}
+    assert [row["file_name"] for row in archive.search("pump seal")] == ["pumps.pdf"]
+    assert [row["file_name"] for row in archive.search("monthly")] == ["qa.pdf"]
+    assert archive.search("boiler") == []
+    # Quotes and FTS syntax in the query are not parsed
+    assert [row["file_name"] for row in archive.search('tank" * (')] == ["tanks.pdf"]
+
+
+def test_empty_query_lists_newest_results_first(archive):
+    for name in ("a.pdf", "b.pdf", "c.pdf"):
+        _add(archive, name, {"title": name, "summary": "text", "keywords": []})
+
+    rows = archive.search("", limit=2)
+    assert [row["file_name"] for row in rows] == ["c.pdf", "b.pdf"]
+    assert rows[0]["pages"] == "1-3, 7"
+    assert archive.get_result(rows[0]["id"]) == {"title": "c.pdf", "summary": "text", "keywords": []}
+
+
+def test_title_matches_rank_first_with_full_text(tmp_path):
+    archive = ResultArchive(logger, path=str(tmp_path / "archive.sqlite3"))
+    if not archive.full_text:
+        pytest.skip("SQLite without FTS5")
+    _add(archive, "body.pdf", {"title": "Guide", "summary": "A note on turbines.", "keywords": []})
+    _add(archive, "title.pdf", {"title": "Turbines", "summary": "A note.", "keywords": []})
+
+    assert [row["file_name"] for row in archive.search("turbine")] == ["title.pdf", "body.pdf"]
+    assert "**" in archive.search("turbine")[1]["snippet"]
+
+
+def test_messages_are_paged_per_client(archive):
+    archive.add_messages("tab", [{"role": "user", "content": str(i), "timestamp": "12:00"} for i in range(5)])
+    archive.add_messages("other", [{"role": "user", "content": "x", "timestamp": "12:00"}])
+
+    assert archive.count_messages("tab") == 5
+    assert [m["content"] for m in archive.get_messages("tab", 1, 3)] == ["1", "2", "3"]
+    archive.clear_messages("tab")
+    assert archive.stats()["messages"] == 1
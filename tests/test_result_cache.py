@@ -0,0 +1,61 @@
+import os
+import time
+import logging
+
+import src.Utils.result_cache as result_cache_module
+from src.Utils.result_cache import ResultCache
+
+logger = logging.getLogger("test_result_cache")
+
+
+def _cache(tmp_path, **kwargs):
+    return ResultCache(logger, cache_dir=str(tmp_path / "results"), **kwargs)
+
+
+def test_key_depends_on_every_input():
+    base = ("pdf", [1, 2], "model", "summary", "template", {"compact": True})
+    key = ResultCache.make_key(*base)
+    assert key == ResultCache.make_key(*base)
+    for i, changed in enumerate(("other", [1, 3], "other", "keywords", "other", {"compact": False})):
+        assert ResultCache.make_key(*base[:i], changed, *base[i + 1:]) != key
+
+
+def test_disk_entry_expires_from_its_creation_even_when_read(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache_module.time, "time", lambda: now[0])
+    cache = _cache(tmp_path, ttl_seconds=100, max_memory_entries=0)
+    cache.put("key", {"summary": "x"})
+    for now[0] in (1060.0, 1090.0):
+        assert cache.get("key") == {"summary": "x"}
+    now[0] = 1110.0
+    assert cache.get("key") is None
+    assert not os.listdir(tmp_path / "results")
+
+
+def test_memory_lru_and_disk_limit_evict_least_recently_used(tmp_path):
+    cache = _cache(tmp_path, max_memory_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, {"value": key})
+    assert list(cache._memory) == ["b", "c"]
+
+    # Entries differ by a few bytes in their "created" time; room for two, not three
+    entry_bytes = os.path.getsize(tmp_path / "results" / "a.json")
+    cache = _cache(tmp_path, max_memory_entries=0, max_disk_bytes=entry_bytes * 2 + entry_bytes // 2)
+    os.utime(tmp_path / "results" / "a.json", (time.time() - 30, time.time() - 30))
+    os.utime(tmp_path / "results" / "b.json", (time.time() - 20, time.time() - 20))
+    os.utime(tmp_path / "results" / "c.json", (time.time() - 10, time.time() - 10))
+    # Reading "a" makes it the most recently used entry, so "b" goes first
+    assert cache.get("a") == {"value": "a"}
+    cache.put("d", {"value": "d"})
+    assert sorted(os.listdir(tmp_path / "results")) == ["a.json", "d.json"]
+
+
+def test_stats_do_not_list_the_directory_again(tmp_path, monkeypatch):
+    cache = _cache(tmp_path)
+    cache.put("a", {"value": "a"})
+    cache.get("a")
+    cache.get("missing")
+    monkeypatch.setattr(result_cache_module.os, "listdir", None)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["disk_entries"]) == (1, 1, 1)
+    assert stats["disk_bytes"] == os.path.getsize(tmp_path / "results" / "a.json")
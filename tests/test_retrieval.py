@@ -0,0 +1,71 @@
+import math
+import logging
+
+import pytest
+
+from src.Utils.retrieval import BM25Index, RetrievalIndexCache, page_chunks, tokenize
+
+logger = logging.getLogger("test_retrieval")
+
+PAGES = {
+    1: "The pump moves water into the tank.",
+    2: "Maintenance: check the pump seal and the pump bearings every month.",
+    3: "The tank holds ten cubic meters of water.",
+    4: "Safety notes for the electrical cabinet.",
+}
+
+
+def _reference_scores(chunks, query, k1=1.5, b=0.75):
+    # Textbook BM25, one chunk at a time
+    documents = [tokenize(text) for _, text in chunks]
+    average_length = sum(map(len, documents)) / len(documents)
+    scores = []
+    for tokens in documents:
+        score = 0.0
+        for term in set(tokenize(query)):
+            frequency = tokens.count(term)
+            if not frequency:
+                continue
+            containing = sum(term in document for document in documents)
+            idf = math.log(1 + (len(documents) - containing + 0.5) / (containing + 0.5))
+            score += idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * len(tokens) / average_length))
+        scores.append(score)
+    return scores
+
+
+@pytest.mark.parametrize("query", ["pump", "water tank", "pump seal water", "cabinet", "unknown words"])
+def test_scores_match_the_bm25_formula(query):
+    chunks = page_chunks(PAGES)
+    assert list(BM25Index(chunks).scores(query)) == pytest.approx(_reference_scores(chunks, query), rel=1e-5)
+
+
+def test_search_ranks_best_matches_first_and_skips_pages_without_query_terms():
+    results = BM25Index(page_chunks(PAGES)).search("pump water", top_k=4)
+
+    assert [page for page, _, _ in results] == [1, 2, 3]
+    assert results[0][2] > results[1][2] > results[2][2] > 0
+
+
+def test_long_page_is_indexed_as_several_chunks():
+    text = "".join(f"line {i} about pumps\n" for i in range(100))
+    chunks = page_chunks({7: text}, max_chars=200)
+
+    assert len(chunks) > 1 and all(page == 7 and len(chunk) <= 200 for page, chunk in chunks)
+    assert "".join(chunk for _, chunk in chunks) == text
+
+
+def test_index_cache_reuses_indexes_and_drops_the_least_recently_used():
+    cache = RetrievalIndexCache(logger, max_indexes=2)
+    builds = []
+
+    def load(name):
+        return lambda: builds.append(name) or PAGES
+
+    first = cache.get_or_build("doc-a", [1, 2, 3, 4], load("a"))
+    assert cache.get_or_build("doc-a", [1, 2, 3, 4], load("a")) is first
+    cache.get_or_build("doc-b", [1, 2], load("b"))
+    cache.get_or_build("doc-a", [1, 2, 3, 4], load("a"))
+    cache.get_or_build("doc-c", [1], load("c"))
+    cache.get_or_build("doc-b", [1, 2], load("b"))
+
+    assert builds == ["a", "b", "c", "b"]
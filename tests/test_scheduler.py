@@ -0,0 +1,128 @@
+import time
+import logging
+import threading
+
+import pytest
+
+from src.Utils.scheduler import ModelScheduler, AnalysisCancelled, caller_context
+
+logger = logging.getLogger("test_scheduler")
+
+
+def test_queue_notice_is_sent_without_holding_the_scheduler_lock():
+    scheduler = ModelScheduler(logger, max_concurrent=1)
+    notices = []
+    granted = threading.Event()
+
+    def notify(role, content):
+        # Another session reading the scheduler must not wait for this callback
+        reader = threading.Thread(target=scheduler.stats)
+        reader.start()
+        reader.join(timeout=2)
+        notices.append((content, reader.is_alive()))
+
+    def waiting_call():
+        with caller_context("waiting", notify=notify):
+            with scheduler.slot():
+                granted.set()
+
+    with scheduler.slot():
+        waiter = threading.Thread(target=waiting_call)
+        waiter.start()
+        while not notices:
+            granted.wait(0.05)
+    waiter.join(timeout=5)
+
+    assert granted.is_set()
+    assert len(notices) == 1
+    content, blocked = notices[0]
+    assert "number 1 in the queue" in content
+    assert not blocked
+    assert scheduler.stats()["running"] == 0
+
+
+def _wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_waiting_calls_are_served_round_robin_by_client():
+    scheduler = ModelScheduler(logger, max_concurrent=1)
+    served = []
+
+    def call(client_id, name):
+        with caller_context(client_id):
+            with scheduler.slot():
+                served.append(name)
+
+    threads = []
+    with scheduler.slot():
+        # One client queues three calls before another client queues its first
+        for client_id, name in [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1")]:
+            threads.append(threading.Thread(target=call, args=(client_id, name)))
+            threads[-1].start()
+            _wait_until(lambda: scheduler.stats()["waiting"] == len(threads))
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert served == ["a1", "b1", "a2", "a3"]
+
+
+def test_identical_calls_in_flight_go_to_the_model_once():
+    scheduler = ModelScheduler(logger, max_concurrent=2)
+    release = threading.Event()
+    calls = []
+    results = []
+    tokens = {"leader": [], "follower": []}
+
+    def model_call(token_callback):
+        calls.append(1)
+        release.wait(5)
+        token_callback("answer", {})
+        return "answer"
+
+    def call(name):
+        results.append(scheduler.call("prompt", model_call, lambda text, stats: tokens[name].append(text)))
+
+    leader = threading.Thread(target=call, args=("leader",))
+    leader.start()
+    _wait_until(lambda: calls)
+    follower = threading.Thread(target=call, args=("follower",))
+    follower.start()
+    _wait_until(lambda: scheduler._flights["prompt"].token_callbacks)
+    release.set()
+    leader.join(timeout=5)
+    follower.join(timeout=5)
+
+    assert results == ["answer", "answer"]
+    assert len(calls) == 1
+    assert tokens == {"leader": ["answer"], "follower": ["answer"]}
+    assert scheduler.stats()["coalesced"] == 1
+
+
+def test_waiting_caller_runs_the_call_again_when_the_leader_is_cancelled():
+    scheduler = ModelScheduler(logger, max_concurrent=2)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def cancelled_call(token_callback):
+        calls.append("leader")
+        started.set()
+        release.wait(5)
+        raise AnalysisCancelled("Analysis cancelled by user.")
+
+    def leader():
+        with pytest.raises(AnalysisCancelled):
+            scheduler.call("prompt", cancelled_call)
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    started.wait(5)
+    threading.Timer(0.1, release.set).start()
+
+    assert scheduler.call("prompt", lambda token_callback: calls.append("follower") or "answer") == "answer"
+    thread.join(timeout=5)
+    assert calls == ["leader", "follower"]
@@ -0,0 +1,34 @@
+import logging
+
+from src import session
+from src.jobs import JobManager, DEFAULT_DONE_MESSAGE
+from src.Utils.result_archive import ResultArchive
+
+logger = logging.getLogger("test_session")
+
+
+class SessionState(dict):
+    __getattr__ = dict.__getitem__
+    __setattr__ = dict.__setitem__
+
+
+def test_reloaded_page_does_not_copy_archived_job_messages_again(tmp_path, monkeypatch):
+    archive = ResultArchive(logger, path=str(tmp_path / "archive.sqlite3"))
+    job_manager = JobManager(logger)
+    monkeypatch.setattr(session, "get_result_archive", lambda _logger: archive)
+    monkeypatch.setattr(session, "get_job_manager", lambda _logger: job_manager)
+    monkeypatch.setattr(session, "get_client_id", lambda: "tab")
+    monkeypatch.setattr(session, "MAX_SESSION_MESSAGES", 2)
+    job_id = job_manager.submit("tab", "question", lambda **kwargs: {"summary": "done"})
+    job_manager.get(job_id).future.result()
+    job_manager.get(job_id).add_message("bot", "late note")
+
+    for _ in range(2):
+        # A page reload starts a new session of the same browser tab
+        monkeypatch.setattr(session.st, "session_state", SessionState())
+        session.init_session_state()
+        session.sync_job_updates(job_manager, "tab")
+
+    # "question", the done message and "late note": one copy each, the oldest in the archive
+    messages, _ = session.get_chat_page(0)
+    assert [m["content"] for m in messages] == ["question", DEFAULT_DONE_MESSAGE, "late note"]
@@ -0,0 +1,65 @@
+import logging
+
+import pytest
+
+from src.Utils.summary_tree import SummaryNodeStore, SummaryTree
+
+logger = logging.getLogger("test_summary_tree")
+
+PAGE_COUNT = 24
+BLANK_PAGES = range(8, 16)
+
+
+def _tree(tmp_path, summarized, max_concurrency=1, failing_page=None):
+    store = SummaryNodeStore(logger, path=str(tmp_path / "tree.sqlite3"))
+
+    def load_text(page_indices):
+        return "".join(f"page {i}\n" for i in page_indices if i not in BLANK_PAGES)
+
+    def summarize(text):
+        if not text.strip():
+            return None
+        if f"page {failing_page}\n" in text:
+            raise RuntimeError("model failed")
+        summarized.append(text)
+        return {"summary": text.split()[1]}
+
+    def merge(results):
+        return {"summary": "+".join(result["summary"] for result in results)}
+
+    return SummaryTree(logger, store, "doc", PAGE_COUNT, "model", "variant", load_text, summarize, merge,
+                       max_concurrency=max_concurrency)
+
+
+def test_blank_leaf_is_stored_empty_and_skipped_in_merges(tmp_path):
+    summarized = []
+    tree = _tree(tmp_path, summarized)
+    assert tree.build() == {"summary": "0+16"}
+    assert tree.coverage() == (5, 5)
+    assert tree.summarize_range(8, 16) is None
+    assert tree.summarize_range(0, 16) == {"summary": "0"}
+
+    # The empty node is stored too, a new tree over the same store summarizes nothing again
+    again = _tree(tmp_path, summarized)
+    count = len(summarized)
+    assert again.summarize_range(8, 24) == {"summary": "16"}
+    assert len(summarized) == count
+
+
+def test_coverage_counts_nodes_without_reading_them(tmp_path):
+    tree = _tree(tmp_path, [])
+    tree.build()
+    tree.store.get_nodes = None
+    assert tree.coverage() == (5, 5)
+
+
+def test_finished_siblings_of_a_failed_node_are_stored(tmp_path):
+    summarized = []
+    tree = _tree(tmp_path, summarized, max_concurrency=3, failing_page=0)
+    with pytest.raises(RuntimeError):
+        tree.build()
+    # The blank leaf and the leaf of pages 17-24 are kept, only pages 1-8 are summarized again
+    assert tree.coverage() == (2, 5)
+    count = len(summarized)
+    assert _tree(tmp_path, summarized).build() == {"summary": "0+16"}
+    assert len(summarized) == count + 1
@@ -0,0 +1,42 @@
+import logging
+
+from src.Utils.text_compactor import TextCompactor
+
+logger = logging.getLogger("test_text_compactor")
+
+
+BODIES = ["Revenue grew.", "Costs fell.", "Staff doubled.", "Debt was repaid.", "A plant opened.", "Sales slowed."]
+
+
+def page(i):
+    return f"ACME Annual Report\n{BODIES[i]}\nPage {i + 1} of 20"
+
+
+def test_repeated_headers_page_numbers_and_hyphen_breaks_are_removed():
+    places = ["Oslo", "Lima", "Kyiv", "Perth"]
+    pages = [page(i).replace(BODIES[i], f"{BODIES[i]} The in-\nvestment in   {places[i]}   grew.") for i in range(4)]
+    compactor = TextCompactor(logger)
+    text = compactor.compact_pages(pages)
+
+    assert text == "".join(f"{BODIES[i]} The investment in {places[i]} grew.\n" for i in range(4))
+    assert compactor.last_stats["removed_lines"] == 8
+    assert compactor.last_stats["saved_tokens"] > 0
+
+
+def test_body_lines_and_short_documents_are_kept():
+    # Two pages are too few to tell a running header from body text
+    pages = [page(0), page(1)]
+    assert TextCompactor(logger).compact_pages(pages) == "".join(
+        f"ACME Annual Report\n{BODIES[i]}\n" for i in range(2)
+    )
+
+
+def test_stream_finds_headers_repeated_across_small_batches():
+    batches = [[(i, page(i), None)] for i in range(6)]
+
+    pages = list(TextCompactor(logger).compact_stream(batches))
+
+    assert [i for i, _ in pages] == list(range(6))
+    # The first two batches have too few pages to tell a header from body text
+    assert all("ACME" not in text for _, text in pages[2:])
+    assert all(text == BODIES[i] + "\n" for i, text in pages[2:])